@@ -0,0 +1,504 @@
+"""
+Benchmark the ADBC hot paths used by the app.
+
+Generates a synthetic table into a local DuckDB file (and a local Postgres),
+then times:
+    - fetch_arrow_table vs fetch_record_batch vs fetchall
+    - adbc_ingest vs Parquet staging into DuckDB
+    - the stream_postgres_to_duckdb pipeline
+    - Postgres batch size hints, COPY vs row-by-row transfer and adaptive tuning
+    - duckdb_to_postgres write-back with 1..N partition writers
+    - CDC catch-up from a logical replication slot (needs wal_level=logical)
+    - dashboard aggregates, histograms and samples, cold and cached
+    - repeated parameterized lookups: a connection per query vs a pooled
+      connection vs a pooled prepared statement
+    - parallel BigQuery stream reads merged into a DuckDB ingest, against a
+      local stand-in for the Storage Read API
+    - the overhead of validating every column of the stream during ingest
+and checks that the QueryResult path to the UI keeps the fetched Arrow
+buffers (no copies) and dtypes.
+
+Run from the adbc-streamlit-demo directory:
+    python -m benchmarks.bench_fetch --rows 1000000 --width 20 --postgres container
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from adbc_driver_manager import dbapi
+
+from benchmarks.harness import (
+    COLUMN_TYPES,
+    Report,
+    Result,
+    create_synthetic_duckdb,
+    load_postgres,
+    local_postgres,
+    measure,
+)
+from tests.mock_streams import MockStreamOpener
+
+BENCH_TABLE = "bench_data"
+FETCH_METHODS = ("fetch_arrow_table", "fetch_record_batch", "fetchall")
+SUITES = ("fetch", "ingest", "pipeline", "batching", "export", "cdc", "dashboard", "statements", "bigquery_streams", "validation")
+# Point lookups per run of the statements suite
+LOOKUPS = 200
+# Rows per batch fed to the validation suite, as an ADBC driver would deliver them
+BATCH_ROWS = 65_536
+
+
+########################
+# Cases
+########################
+
+def fetch_case(driver: str, db_kwargs: dict, table_name: str, method: str, reference_bytes: int):
+    """Return a callable that reads the whole table with one fetch method."""
+    def run():
+        with dbapi.connect(driver=driver, db_kwargs=db_kwargs) as conn, conn.cursor() as cursor:
+            cursor.execute(f"SELECT * FROM {table_name}")
+            if method == "fetch_arrow_table":
+                table = cursor.fetch_arrow_table()
+                return table.num_rows, table.nbytes
+            if method == "fetch_record_batch":
+                rows = nbytes = 0
+                for batch in cursor.fetch_record_batch():
+                    rows += batch.num_rows
+                    nbytes += batch.nbytes
+                return rows, nbytes
+            # Python tuples have no meaningful byte size, so report the Arrow size of the same data
+            return len(cursor.fetchall()), reference_bytes
+    return run
+
+
+def adbc_ingest_case(table, work_dir: str):
+    def run():
+        db_path = os.path.join(work_dir, "ingest_adbc.duckdb")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        with dbapi.connect(driver="duckdb", db_kwargs={"path": db_path}) as conn, conn.cursor() as cursor:
+            cursor.adbc_ingest(BENCH_TABLE, table)
+            conn.commit()
+        return table.num_rows, table.nbytes
+    return run
+
+
+def parquet_staging_case(table, work_dir: str):
+    import pyarrow.parquet as pq
+
+    def run():
+        db_path = os.path.join(work_dir, "ingest_parquet.duckdb")
+        parquet_path = os.path.join(work_dir, "staging.parquet")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        pq.write_table(table, parquet_path)
+        with dbapi.connect(driver="duckdb", db_kwargs={"path": db_path}) as conn, conn.cursor() as cursor:
+            cursor.execute(f"CREATE TABLE {BENCH_TABLE} AS SELECT * FROM read_parquet('{parquet_path}')")
+            conn.commit()
+        return table.num_rows, table.nbytes
+    return run
+
+
+def pipeline_case(pg_table: str, work_dir: str, reference_bytes: int):
+    from functions.ingestion import stream_postgres_to_duckdb
+
+    def run():
+        db_path = os.path.join(work_dir, "pipeline.duckdb")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        rows = stream_postgres_to_duckdb(db_path, pg_table, "streamed_data")
+        return rows, reference_bytes
+    return run
+
+
+def pg_batching_case(uri: str, table_name: str, batch_size_hint_bytes: int | None, use_copy: bool, batches: list):
+    """Return a callable that reads the whole Postgres table with the given transfer options."""
+    from functions.pg_batching import configure_statement
+
+    def run():
+        with dbapi.connect(driver="postgresql", db_kwargs={"uri": uri}) as conn, conn.cursor() as cursor:
+            configure_statement(cursor, batch_size_hint_bytes, use_copy)
+            cursor.execute(f"SELECT * FROM {table_name}")
+            rows = nbytes = count = 0
+            for batch in cursor.fetch_record_batch():
+                rows += batch.num_rows
+                nbytes += batch.nbytes
+                count += 1
+            batches.append(count)
+            return rows, nbytes
+    return run
+
+
+def bench_pg_batching(report: Report, uri: str, table_name: str, hints_mb: list[int], repeat: int):
+    """
+    Sweep batch size hints over the COPY path, compare with row-by-row
+    transfer, check on the server that COPY is really used and let the
+    adaptive tuner converge over repeated reads.
+    """
+    from functions.pg_batching import MB, BatchSizeTuner, configure_statement, verify_copy_transfer
+
+    query = f"SELECT * FROM {table_name}"
+    assert verify_copy_transfer(uri, query), "the driver did not read the result with COPY"
+    assert not verify_copy_transfer(uri, query, use_copy=False), "use_copy=false still read the result with COPY"
+
+    for hint_mb in hints_mb:
+        batches = []
+        result = measure(f"copy_hint_{hint_mb}mb", "postgres", pg_batching_case(uri, table_name, hint_mb * MB, True, batches), repeat)
+        result.extra.update(batch_size_hint_bytes=hint_mb * MB, batches=batches[-1], copy_verified=True)
+        report.add(result)
+
+    batches = []
+    result = measure("row_by_row", "postgres", pg_batching_case(uri, table_name, None, False, batches), repeat)
+    result.extra.update(batches=batches[-1])
+    report.add(result)
+
+    # Adaptive: repeated reads of the same table, as the Stream page does
+    tuner = BatchSizeTuner(initial=min(hints_mb) * MB)
+    hints = []
+
+    def adaptive_run():
+        with dbapi.connect(driver="postgresql", db_kwargs={"uri": uri}) as conn, conn.cursor() as cursor:
+            hint = tuner.hint(table_name)
+            hints.append(hint)
+            configure_statement(cursor, hint)
+            cursor.execute(query)
+            rows = nbytes = 0
+            for batch in tuner.observe_reader(table_name, hint, cursor.fetch_record_batch()):
+                rows += batch.num_rows
+                nbytes += batch.nbytes
+            return rows, nbytes
+
+    for _ in range(max(repeat, 6)):
+        result = measure("copy_adaptive", "postgres", adaptive_run)
+    result.extra.update(hints_tried=hints, tuner=tuner.state()[table_name])
+    report.add(result)
+
+
+def export_case(db_path: str, table_name: str, partitions: int):
+    from functions.export import duckdb_to_postgres
+
+    def run():
+        report = duckdb_to_postgres(db_path, table_name, f"{table_name}_export", mode="replace", partitions=partitions)
+        return report["rows"], report["bytes"]
+    return run
+
+
+def check_cdc(uri: str, work_dir: str, table_name: str, changes: int) -> Result:
+    """
+    Snapshot the Postgres table into DuckDB through a CdcFollower, make
+    `changes` updates plus deletes and inserts on the source, then time
+    how long the follower takes to apply them and check both sides match.
+    """
+    from functions.cdc import CdcFollower
+
+    with dbapi.connect(driver="postgresql", db_kwargs={"uri": uri}) as conn, conn.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {table_name} ADD PRIMARY KEY (id)")
+        conn.commit()
+
+    db_path = os.path.join(work_dir, "cdc.duckdb")
+    follower = CdcFollower(db_path, {table_name: ["id"]}, slot_name="bench_cdc")
+    try:
+        follower.setup()
+        with dbapi.connect(driver="postgresql", db_kwargs={"uri": uri}) as conn, conn.cursor() as cursor:
+            cursor.execute(f"UPDATE {table_name} SET c0_int = c0_int + 1 WHERE id < {changes}")
+            cursor.execute(f"DELETE FROM {table_name} WHERE id >= {changes} AND id < {changes * 2}")
+            cursor.execute(f"INSERT INTO {table_name} (id) SELECT -g FROM generate_series(1, {changes}) g")
+            conn.commit()
+            cursor.execute(f"SELECT count(*), sum(c0_int) FROM {table_name}")
+            expected = cursor.fetchone()
+
+        started = time.perf_counter()
+        applied = 0
+        while True:
+            polled = follower.poll()
+            applied += polled["changes"]
+            if not polled["transactions"]:
+                break
+        seconds = time.perf_counter() - started
+
+        actual = follower.database.cursor().execute(f"SELECT count(*), sum(c0_int) FROM {table_name}").fetchone()
+        assert tuple(actual) == tuple(expected), f"mirror {actual} does not match source {expected}"
+        return Result("cdc_catch_up", "postgres", applied, 0, seconds, extra={
+            "lag_bytes_after": follower.lag_bytes(),
+            "checkpoint": polled["lsn"],
+        })
+    finally:
+        follower.drop()
+        follower.close()
+
+
+def bench_dashboard(report: Report, db_path: str, table_name: str, repeat: int):
+    """Time each chart query against the shared database, once uncached and then from the cache."""
+    from functions import dashboard
+    from functions.duckdb_manager import close_database
+
+    numeric = dashboard.numeric_columns(db_path, table_name)
+    text = [c for c, t in dashboard.column_types(db_path, table_name).items() if t == "VARCHAR"]
+    queries = {
+        "histogram": lambda: dashboard.histogram(db_path, table_name, numeric[-1], 50),
+        "reservoir_sample": lambda: dashboard.sample(db_path, table_name, 2_000, "reservoir"),
+        "system_sample": lambda: dashboard.sample(db_path, table_name, 2_000, "system"),
+    }
+    if text:
+        queries["aggregate"] = lambda: dashboard.aggregate(db_path, table_name, [text[0]], {numeric[-1]: "avg"}, limit=50)
+
+    try:
+        for name, query in queries.items():
+            def cold():
+                dashboard.clear_cache()
+                table = query()
+                return table.num_rows, table.nbytes
+
+            def cached():
+                table = query()
+                return table.num_rows, table.nbytes
+
+            report.add(measure(f"dashboard_{name}", "duckdb", cold, repeat))
+            report.add(measure(f"dashboard_{name}_cached", "duckdb", cached, repeat))
+    finally:
+        # Release the file for the other suites, which open it through ADBC
+        close_database(db_path)
+
+
+def bench_statements(report: Report, driver: str, db_kwargs: dict, table_name: str, rows: int, repeat: int):
+    """Time LOOKUPS point queries by id, reconnecting, on a pooled connection and on its prepared statement."""
+    from functions.statements import ConnectionPool
+
+    sql = f"SELECT * FROM {table_name} WHERE id = $1"
+    ids = [(i * 7919) % max(rows, 1) for i in range(LOOKUPS)]
+    source = "postgres" if driver == "postgresql" else driver
+    pool = ConnectionPool(driver, db_kwargs, size=1)
+
+    def reconnect():
+        nbytes = 0
+        for i in ids:
+            with dbapi.connect(driver=driver, db_kwargs=db_kwargs) as conn, conn.cursor() as cursor:
+                cursor.execute(sql, [i])
+                nbytes += cursor.fetch_arrow_table().nbytes
+        return len(ids), nbytes
+
+    def pooled():
+        nbytes = 0
+        with pool.connection() as pooled_conn, pooled_conn.conn.cursor() as cursor:
+            for i in ids:
+                # A different SQL text each time, as with values formatted into the query
+                cursor.execute(sql.replace("$1", str(i)))
+                nbytes += cursor.fetch_arrow_table().nbytes
+        return len(ids), nbytes
+
+    def prepared():
+        nbytes = 0
+        with pool.connection() as pooled_conn:
+            for i in ids:
+                nbytes += pooled_conn.execute(sql, [i]).fetch_arrow_table().nbytes
+        return len(ids), nbytes
+
+    try:
+        report.add(measure("lookups_reconnect", source, reconnect, repeat))
+        report.add(measure("lookups_pooled", source, pooled, repeat))
+        result = measure("lookups_pooled_prepared", source, prepared, repeat)
+        result.extra.update(pool.stats())
+        report.add(result)
+    finally:
+        pool.close()
+
+
+def bench_bigquery_streams(report: Report, table, work_dir: str, repeat: int, latency: float):
+    """
+    Ingest the table from 8 mock read streams into DuckDB with 1, 4 and 8
+    streams read at once, checking that every row arrives exactly once.
+    """
+    from functions.bigquery_streams import read_parallel
+    from functions.duckdb_manager import close_database, get_database
+
+    db_path = os.path.join(work_dir, "bigquery_streams.duckdb")
+    opener = MockStreamOpener(table, streams=8, latency=latency)
+    expected = (table.num_rows, pc.sum(table.column("id")).as_py())
+    try:
+        for max_streams in (1, 4, 8):
+            def run():
+                reader = read_parallel(None, "", max_streams, buffer_batches=8, opener=opener)
+                database = get_database(db_path)
+                database.ingest("bigquery_mirror", reader, "replace")
+                rows, id_sum = database.cursor().execute("SELECT count(*), sum(id) FROM bigquery_mirror").fetchone()
+                assert (rows, id_sum) == expected, f"merged streams lost or duplicated rows: {(rows, id_sum)} != {expected}"
+                return rows, table.nbytes
+
+            result = measure(f"bigquery_streams_x{max_streams}", "mock", run, repeat)
+            result.extra.update(streams=opener.streams, latency_ms=latency * 1000)
+            report.add(result)
+    finally:
+        close_database(db_path)
+
+
+# Most validation CPU time the validation suite accepts, as a share of the
+# plain ingest, on every table size
+VALIDATION_SHARE_LIMIT = 0.05
+
+
+def validation_rules(table):
+    """Rules touching every column: null limits everywhere, ranges on the numeric and timestamp columns, id unique."""
+    from functions.validation import ValidationRules
+
+    bounds = {"int": (0, 1_000_003), "float": (0.0, 1000.0), "timestamp": (datetime(2024, 1, 1), None)}
+    return ValidationRules(
+        max_null_rate={name: 0.0 for name in table.column_names},
+        ranges={"id": (0, None)} | {name: bounds[name.rsplit("_", 1)[1]] for name in table.column_names if name.rsplit("_", 1)[-1] in bounds},
+        unique=("id",),
+    )
+
+
+def bench_validation(report: Report, table, work_dir: str, repeat: int):
+    """
+    Ingest the table into DuckDB in ADBC-sized batches, plain and through a
+    StreamValidator, and report the validation time as a share of the plain
+    ingest. Fails when the validating thread's CPU time is over
+    VALIDATION_SHARE_LIMIT of it. The wall-clock share is reported too; on a
+    single core it also counts the database's own ingest threads, which run
+    while a batch is being validated.
+    """
+    from functions.duckdb_manager import close_database, get_database
+    from functions.validation import StreamValidator
+
+    db_path = os.path.join(work_dir, "validation.duckdb")
+    rules = validation_rules(table)
+    validators = []
+
+    def case(validate: bool):
+        def run():
+            reader = pa.RecordBatchReader.from_batches(table.schema, table.to_batches(max_chunksize=BATCH_ROWS))
+            if validate:
+                validators.append(StreamValidator(rules))
+                reader = validators[-1].wrap(reader)
+            get_database(db_path).ingest("validated", reader, "replace")
+            if validate:
+                assert validators[-1].report.passed, validators[-1].report.problems
+            return table.num_rows, table.nbytes
+        return run
+
+    try:
+        plain = measure("ingest_plain", "duckdb", case(False), repeat)
+        report.add(plain)
+        validated = measure("ingest_validated", "duckdb", case(True), repeat)
+        validation_seconds = sorted(v.report.seconds for v in validators)[len(validators) // 2]
+        cpu_seconds = sorted(v.report.cpu_seconds for v in validators)[len(validators) // 2]
+        validated.extra.update(
+            validation_ms=round(validation_seconds * 1000, 2),
+            validation_share=f"{validation_seconds / plain.seconds:.1%}",
+            validation_cpu_ms=round(cpu_seconds * 1000, 2),
+            validation_cpu_share=f"{cpu_seconds / plain.seconds:.1%}",
+            wall_overhead=f"{validated.seconds / plain.seconds - 1:.1%}",
+            checks=len(rules.max_null_rate) + len(rules.ranges) + len(rules.unique),
+        )
+        report.add(validated)
+        print(
+            f"{'':<10} validation took {validated.extra['validation_cpu_share']} of the plain ingest time in CPU, "
+            f"{validated.extra['validation_share']} in wall-clock time",
+            flush=True,
+        )
+        assert cpu_seconds / plain.seconds <= VALIDATION_SHARE_LIMIT, (
+            f"validation took {validated.extra['validation_cpu_share']} of the ingest, over the {VALIDATION_SHARE_LIMIT:.0%} limit"
+        )
+    finally:
+        close_database(db_path)
+
+
+########################
+# Main
+########################
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ADBC fetch, ingest and streaming paths.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows in the synthetic table")
+    parser.add_argument("--width", type=int, default=10, help="Number of data columns besides id")
+    parser.add_argument("--types", default=",".join(COLUMN_TYPES), help=f"Comma separated column types from {COLUMN_TYPES}")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the median is reported")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"Comma separated suites from {SUITES}")
+    parser.add_argument(
+        "--postgres", choices=["none", "uri", "container", "pg_ctl"], default="none",
+        help="How to get a local Postgres: none, an existing --pg-uri, a docker container or a pg_ctl temp instance",
+    )
+    parser.add_argument("--pg-uri", help="Postgres URI when --postgres=uri")
+    parser.add_argument("--pg-hints", default="1,4,16,64", help="Comma separated batch size hints in MB for the batching suite")
+    parser.add_argument("--cdc-changes", type=int, default=10_000, help="Rows updated, deleted and inserted by the cdc suite")
+    parser.add_argument("--stream-latency-ms", type=float, default=5.0, help="Simulated read latency per batch in the bigquery_streams suite")
+    parser.add_argument("--output", default="bench_report.json", help="Where to write the JSON report")
+    args = parser.parse_args(argv)
+
+    types = tuple(t.strip() for t in args.types.split(",") if t.strip())
+    unknown = set(types) - set(COLUMN_TYPES)
+    if unknown:
+        parser.error(f"Unknown column types: {sorted(unknown)}")
+    suites = {s.strip() for s in args.suites.split(",") if s.strip()}
+    output = os.path.abspath(args.output)
+
+    report = Report(rows=args.rows, width=args.width, types=list(types), repeat=args.repeat, postgres=args.postgres)
+
+    with tempfile.TemporaryDirectory(prefix="adbc-bench-") as work_dir:
+        duck_path = os.path.join(work_dir, "source.duckdb")
+        print(f"Generating {args.rows:,} rows x {args.width} columns into {duck_path}", flush=True)
+        table = create_synthetic_duckdb(duck_path, BENCH_TABLE, args.rows, args.width, types)
+
+        if "fetch" in suites:
+            for method in FETCH_METHODS:
+                report.add(measure(method, "duckdb", fetch_case("duckdb", {"path": duck_path}, BENCH_TABLE, method, table.nbytes), args.repeat))
+
+        if "dashboard" in suites:
+            bench_dashboard(report, duck_path, BENCH_TABLE, args.repeat)
+
+        if "ingest" in suites:
+            report.add(measure("adbc_ingest", "duckdb", adbc_ingest_case(table, work_dir), args.repeat))
+            report.add(measure("parquet_staging", "duckdb", parquet_staging_case(table, work_dir), args.repeat))
+
+        if "statements" in suites:
+            bench_statements(report, "duckdb", {"path": duck_path}, BENCH_TABLE, args.rows, args.repeat)
+
+        if "bigquery_streams" in suites:
+            bench_bigquery_streams(report, table, work_dir, args.repeat, args.stream_latency_ms / 1000)
+
+        if "validation" in suites:
+            bench_validation(report, table, work_dir, args.repeat)
+
+        if args.postgres != "none":
+            # The cdc suite needs replication slots, so start Postgres with wal_level=logical
+            with local_postgres(args.postgres, args.pg_uri, logical="cdc" in suites) as pg_uri:
+                print(f"Loading {args.rows:,} rows into Postgres", flush=True)
+                load_postgres(pg_uri, BENCH_TABLE, table)
+
+                if "fetch" in suites:
+                    for method in FETCH_METHODS:
+                        report.add(measure(method, "postgres", fetch_case("postgresql", {"uri": pg_uri}, BENCH_TABLE, method, table.nbytes), args.repeat))
+
+                if "statements" in suites:
+                    bench_statements(report, "postgresql", {"uri": pg_uri}, BENCH_TABLE, args.rows, args.repeat)
+
+                if "batching" in suites:
+                    hints_mb = [int(h) for h in args.pg_hints.split(",") if h.strip()]
+                    bench_pg_batching(report, pg_uri, BENCH_TABLE, hints_mb, args.repeat)
+
+                if suites & {"pipeline", "export", "cdc"}:
+                    # The ingestion, export and cdc functions read secrets.toml from the working directory
+                    with open(os.path.join(work_dir, "secrets.toml"), "w") as f:
+                        f.write(f'postgres_connection_string = "{pg_uri}"\npostgres_table_name = "{BENCH_TABLE}"\n')
+                    cwd = os.getcwd()
+                    os.chdir(work_dir)
+                    try:
+                        if "pipeline" in suites:
+                            report.add(measure("stream_postgres_to_duckdb", "postgres", pipeline_case(BENCH_TABLE, work_dir, table.nbytes), args.repeat))
+                        if "export" in suites:
+                            for partitions in (1, 4):
+                                report.add(measure(f"duckdb_to_postgres_x{partitions}", "postgres", export_case(duck_path, BENCH_TABLE, partitions), args.repeat))
+                        if "cdc" in suites:
+                            # Runs last: it adds a primary key and modifies the source table
+                            report.add(check_cdc(pg_uri, work_dir, BENCH_TABLE, min(args.cdc_changes, args.rows // 3)))
+                    finally:
+                        os.chdir(cwd)
+
+    report.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark the cold start of each Streamlit page.
+
+Every run executes a page script in a fresh interpreter (Streamlit bare
+mode, no button pressed) and reports the median wall time and which heavy
+modules got imported. Each page runs twice:
+    - lazy:  as shipped, drivers and heavy modules load on first use
+    - eager: with adbc_driver_manager.dbapi, duckdb and pyarrow.compute
+             imported up front, as the pages did before lazy loading
+so the difference is the cold start saved on pages that never connect.
+
+Run from the adbc-streamlit-demo directory:
+    python -m benchmarks.bench_import --repeat 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.harness import PROJECT_ROOT, Report, Result
+
+PAGES = ["Start_Here.py"] + sorted(f"pages/{name}" for name in os.listdir(PROJECT_ROOT / "pages") if name.endswith(".py"))
+HEAVY_MODULES = ("adbc_driver_manager.dbapi", "duckdb", "pyarrow.compute", "pyarrow.dataset", "pandas", "polars")
+EAGER_IMPORTS = ("adbc_driver_manager.dbapi", "duckdb", "pyarrow.compute")
+
+# Runs one page and prints its timing; executed with `python -c`
+_RUNNER = """
+import json, runpy, sys, time
+started = time.perf_counter()
+for name in {eager!r}:
+    __import__(name)
+runpy.run_path({page!r}, run_name="__main__")
+print(json.dumps({{
+    "seconds": time.perf_counter() - started,
+    "modules": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_page(page: str, work_dir: str, eager: bool) -> dict:
+    """Execute one page in a new interpreter and return its timing and loaded heavy modules."""
+    code = _RUNNER.format(eager=EAGER_IMPORTS if eager else (), page=str(PROJECT_ROOT / page), heavy=HEAVY_MODULES)
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(PROJECT_ROOT), os.environ.get("PYTHONPATH")])),
+        "STREAMLIT_GLOBAL_SHOW_WARNING_ON_DIRECT_EXECUTION": "false",
+    }
+    completed = subprocess.run(
+        [sys.executable, "-c", code], cwd=work_dir, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def bench_page(report: Report, page: str, work_dir: str, repeat: int):
+    medians = {}
+    for mode in ("eager", "lazy"):
+        runs = [run_page(page, work_dir, eager=mode == "eager") for _ in range(repeat)]
+        medians[mode] = statistics.median(r["seconds"] for r in runs)
+        result = Result(f"{os.path.basename(page)}:{mode}", "import", seconds=medians[mode], extra={"modules": runs[-1]["modules"]})
+        if mode == "lazy":
+            result.extra["saved_ms"] = round((medians["eager"] - medians["lazy"]) * 1000, 1)
+        report.add(result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of each Streamlit page.")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per page and mode; the median is reported")
+    parser.add_argument("--pages", default=",".join(PAGES), help="Comma separated page scripts, relative to the project root")
+    parser.add_argument("--secrets", default=str(PROJECT_ROOT / "secrets.toml.example"), help="secrets.toml the pages read")
+    parser.add_argument("--output", default="bench_import.json", help="Where to write the JSON report")
+    args = parser.parse_args(argv)
+
+    pages = [p.strip() for p in args.pages.split(",") if p.strip()]
+    report = Report(repeat=args.repeat, pages=pages)
+    with tempfile.TemporaryDirectory(prefix="adbc-bench-import-") as work_dir:
+        shutil.copy(args.secrets, os.path.join(work_dir, "secrets.toml"))
+        for page in pages:
+            bench_page(report, page, work_dir, args.repeat)
+    report.write(os.path.abspath(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import queue
+import threading
+
+import pyarrow as pa
+
+from functions.lazy import lazy_import
+from functions.tracing import span
+
+dbapi = lazy_import("adbc_driver_manager.dbapi")
+
+# Statement options of the ADBC BigQuery driver: read streams of the Storage
+# Read API consumed concurrently, and batches buffered ahead of the consumer
+PREFETCH_CONCURRENCY_OPTION = "adbc.bigquery.sql.query.prefetch_concurrency"
+RESULT_BUFFER_SIZE_OPTION = "adbc.bigquery.sql.query.result_buffer_size"
+
+_DONE = object()
+
+
+########################
+# Opening read streams
+########################
+
+def storage_streams(cursor, query: str, max_streams: int):
+    """
+    Execute a query and return its result as separately readable streams.
+
+    Uses adbc_execute_partitions when the driver hands out one partition per
+    Storage Read API stream; each is read on its own cursor. Drivers without
+    partitioned execution run the query once with the driver's own stream
+    concurrency (prefetch_concurrency) set to max_streams instead.
+
+    Returns:
+        tuple[pa.Schema, list]: The result schema and one callable per stream
+            that opens it as a RecordBatchReader
+    """
+    try:
+        with span("execute_partitions") as partitions_span:
+            partitions, schema = cursor.adbc_execute_partitions(query)
+            if partitions_span is not None:
+                partitions_span.attributes.update(partitions=len(partitions))
+    except dbapi.NotSupportedError:
+        cursor.adbc_statement.set_options(**{
+            PREFETCH_CONCURRENCY_OPTION: str(max_streams),
+            RESULT_BUFFER_SIZE_OPTION: str(max_streams * 50),
+        })
+        with span("execute", prefetch_concurrency=max_streams):
+            cursor.execute(query)
+        reader = cursor.fetch_record_batch()
+        return reader.schema, [lambda: reader]
+
+    connection = cursor.connection
+
+    def opener(partition: bytes):
+        def open_partition():
+            partition_cursor = connection.cursor()
+            partition_cursor.adbc_read_partition(partition)
+            reader = partition_cursor.fetch_record_batch()
+
+            def batches():
+                try:
+                    yield from reader
+                finally:
+                    partition_cursor.close()
+
+            return pa.RecordBatchReader.from_batches(reader.schema, batches())
+        return open_partition
+
+    streams = [opener(p) for p in partitions]
+    if schema is None:
+        # Some drivers only report the schema with the data
+        first = streams[0]() if streams else None
+        schema = first.schema if first is not None else pa.schema([])
+        if first is not None:
+            streams[0] = lambda: first
+    return schema, streams
+
+
+########################
+# Merging
+########################
+
+def merge_streams(schema: pa.Schema, streams: list, max_streams: int, buffer_batches: int) -> pa.RecordBatchReader:
+    """
+    Read streams concurrently and merge them into one RecordBatchReader.
+
+    Up to `max_streams` threads each open the next unread stream and drain it
+    into a shared queue of `buffer_batches` batches per thread, so readers
+    run ahead of the consumer (e.g. DuckDB ingest) without buffering the
+    whole table. Batches arrive in completion order, not table order. An
+    error in any stream is raised to the consumer, and a consumer that stops
+    early stops the readers.
+    """
+    workers = max(1, min(max_streams, len(streams)))
+    batches: queue.Queue = queue.Queue(maxsize=buffer_batches * workers)
+    pending = iter(streams)
+    pending_lock = threading.Lock()
+    cancelled = threading.Event()
+
+    def put(item) -> bool:
+        while not cancelled.is_set():
+            try:
+                batches.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def work():
+        try:
+            while not cancelled.is_set():
+                with pending_lock:
+                    open_stream = next(pending, None)
+                if open_stream is None:
+                    break
+                for batch in open_stream():
+                    if not put(batch):
+                        return
+        except Exception as e:
+            put(e)
+        finally:
+            put(_DONE)
+
+    def merged():
+        threads = [threading.Thread(target=work, name=f"bigquery-stream-{i}", daemon=True) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+        running = len(threads)
+        try:
+            while running:
+                item = batches.get()
+                if item is _DONE:
+                    running -= 1
+                elif isinstance(item, BaseException):
+                    raise item
+                else:
+                    yield item
+        finally:
+            cancelled.set()
+
+    return pa.RecordBatchReader.from_batches(schema, merged())
+
+
+def read_parallel(cursor, query: str, max_streams: int = 4, buffer_batches: int = 8, opener=storage_streams) -> pa.RecordBatchReader:
+    """
+    Run a BigQuery query and read its result over up to max_streams parallel streams.
+
+    Args:
+        cursor: ADBC BigQuery cursor
+        query (str): Query to run, typically SELECT * of a whole table
+        max_streams (int): Streams read at the same time
+        buffer_batches (int): Batches each stream may read ahead of the consumer
+        opener: Callable (cursor, query, max_streams) -> (schema, stream openers);
+            storage_streams for BigQuery, or a local stand-in for benchmarks
+
+    Returns:
+        pa.RecordBatchReader: The merged result stream
+    """
+    schema, streams = opener(cursor, query, max_streams)
+    return merge_streams(schema, streams, max_streams, buffer_batches)
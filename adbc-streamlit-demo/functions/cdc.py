@@ -0,0 +1,433 @@
+import json
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+
+import pyarrow as pa
+
+from functions.config import get_config
+from functions.duckdb_manager import get_database, merge_into
+from functions.lazy import lazy_import
+from functions.statements import identifier
+from functions.tracing import span, trace
+
+# The driver manager is loaded when a follower starts, not when a page imports this module
+dbapi = lazy_import("adbc_driver_manager.dbapi")
+
+PLUGINS = ("pgoutput", "wal2json")
+CHECKPOINT_TABLE = "_cdc_checkpoints"
+
+
+########################
+# Changes
+########################
+
+@dataclass
+class Change:
+    """One decoded row change. Values are Postgres text representations (None for NULL)."""
+    table: str
+    action: str  # "I", "U", "D" or "T" (truncate)
+    values: dict = field(default_factory=dict)
+    # Old key/identity columns of an update or delete
+    old: dict = field(default_factory=dict)
+
+
+@dataclass
+class Transaction:
+    commit_lsn: int
+    changes: list[Change] = field(default_factory=list)
+
+
+def parse_lsn(text: str) -> int:
+    high, low = text.split("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+def format_lsn(lsn: int) -> str:
+    return f"{lsn >> 32:X}/{lsn & 0xFFFFFFFF:X}"
+
+
+########################
+# Decoders
+########################
+
+class _Buffer:
+    """Cursor over one pgoutput message."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def read(self, fmt: str):
+        values = struct.unpack_from("!" + fmt, self.data, self.pos)
+        self.pos += struct.calcsize("!" + fmt)
+        return values[0] if len(values) == 1 else values
+
+    def string(self) -> str:
+        end = self.data.index(b"\0", self.pos)
+        value = self.data[self.pos:end].decode()
+        self.pos = end + 1
+        return value
+
+    def tuple_data(self, columns: list[str]) -> dict:
+        values = {}
+        for name in columns[:self.read("h")]:
+            kind = self.read("c")
+            if kind == b"n":
+                values[name] = None
+            elif kind == b"t":
+                length = self.read("i")
+                values[name] = self.data[self.pos:self.pos + length].decode()
+                self.pos += length
+            # b"u": unchanged TOASTed value, left out so the local value is kept
+        return values
+
+
+def decode_pgoutput(rows):
+    """
+    Decode (lsn, data) rows from pg_logical_slot_peek_binary_changes with
+    the pgoutput plugin (proto_version 1) into committed transactions.
+    """
+    relations: dict[int, tuple[str, list[str]]] = {}
+    current = None
+    for _, data in rows:
+        buf = _Buffer(bytes(data))
+        kind = buf.read("c")
+        if kind == b"B":
+            current = Transaction(0)
+        elif kind == b"C":
+            _flags, _commit_lsn, end_lsn, _ts = buf.read("bqqq")
+            if current is not None:
+                current.commit_lsn = end_lsn
+                yield current
+            current = None
+        elif kind == b"R":
+            relid = buf.read("i")
+            namespace, name = buf.string(), buf.string()
+            _identity, ncols = buf.read("bh")
+            columns = []
+            for _ in range(ncols):
+                buf.read("b")
+                columns.append(buf.string())
+                buf.read("ii")
+            relations[relid] = (f"{namespace}.{name}", columns)
+        elif kind in (b"I", b"U", b"D") and current is not None:
+            table, columns = relations[buf.read("i")]
+            change = Change(table, kind.decode())
+            marker = buf.read("c")
+            if marker in (b"K", b"O"):
+                change.old = buf.tuple_data(columns)
+                marker = buf.read("c") if kind == b"U" else None
+            if marker == b"N":
+                change.values = buf.tuple_data(columns)
+            current.changes.append(change)
+        elif kind == b"T" and current is not None:
+            nrels, _options = buf.read("ib")
+            for _ in range(nrels):
+                current.changes.append(Change(relations[buf.read("i")][0], "T"))
+        # Origin ("O") and type ("Y") messages carry nothing the mirror needs
+
+
+def decode_wal2json(rows):
+    """
+    Decode (lsn, data) rows from pg_logical_slot_peek_changes with wal2json
+    (format-version 2) into committed transactions.
+    """
+    current = None
+    for lsn, data in rows:
+        message = json.loads(data)
+        action = message["action"]
+        if action == "B":
+            current = Transaction(0)
+        elif action == "C":
+            if current is not None:
+                current.commit_lsn = parse_lsn(lsn)
+                yield current
+            current = None
+        elif action in ("I", "U", "D", "T") and current is not None:
+            change = Change(f"{message['schema']}.{message['table']}", action)
+            change.values = {
+                c["name"]: None if c["value"] is None else _text(c["value"]) for c in message.get("columns", [])
+            }
+            change.old = {
+                c["name"]: None if c["value"] is None else _text(c["value"]) for c in message.get("identity", [])
+            }
+            current.changes.append(change)
+
+
+def _text(value) -> str:
+    # wal2json sends numbers and booleans as JSON values; the mirror casts from text
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+########################
+# Follower
+########################
+
+class CdcFollower:
+    """
+    Keeps DuckDB copies of Postgres tables in sync from a logical replication slot.
+
+    Each poll peeks the slot's pending transactions, collapses them to the
+    final state of each key and applies them, together with the checkpoint
+    LSN, in one DuckDB transaction. Only then is the slot advanced, so a crash
+    in between replays the same transactions (at-least-once); transactions at
+    or below the stored checkpoint are skipped on replay.
+
+    Usage:
+        follower = CdcFollower("streaming_data.duckdb", {"public.orders": ["id"]})
+        follower.setup()
+        follower.run(stop_event)
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        tables: dict[str, list[str]],
+        slot_name: str = "duckdb_mirror",
+        plugin: str = "pgoutput",
+        secret: str = "postgres_connection_string",
+        max_changes: int = 10_000,
+    ):
+        if plugin not in PLUGINS:
+            raise ValueError(f"Unknown plugin '{plugin}', expected one of {PLUGINS}")
+        self.db_path = db_path
+        # Source tables are schema qualified; local tables use the bare name
+        self.tables = {identifier(t if "." in t else f"public.{t}", max_parts=2): keys for t, keys in tables.items()}
+        self.slot_name = identifier(slot_name, max_parts=1)
+        self.plugin = plugin
+        self.publication = f"{slot_name}_pub"
+        self.max_changes = max_changes
+        self.database = get_database(db_path)
+        self._conn = dbapi.connect(driver="postgresql", db_kwargs=get_config().postgres_db_kwargs(secret), autocommit=True)
+
+    ########################
+    # Setup
+    ########################
+
+    def setup(self, snapshot: bool = True):
+        """
+        Create the publication (pgoutput), the replication slot and the
+        checkpoint table if missing, then copy the current tables into DuckDB.
+
+        The slot is created before the snapshot, so changes made while copying
+        are replayed on top of it; replay is idempotent because changes are
+        merged on the primary key.
+        """
+        from functions.ingestion import stream_postgres_to_duckdb
+
+        with self._conn.cursor() as cursor:
+            if self.plugin == "pgoutput":
+                cursor.execute("SELECT count(*) FROM pg_publication WHERE pubname = $1", parameters=(self.publication,))
+                if not cursor.fetchone()[0]:
+                    cursor.execute(f"CREATE PUBLICATION {self.publication} FOR TABLE {', '.join(self.tables)}")
+            cursor.execute("SELECT count(*) FROM pg_replication_slots WHERE slot_name = $1", parameters=(self.slot_name,))
+            created = not cursor.fetchone()[0]
+            if created:
+                cursor.execute("SELECT pg_create_logical_replication_slot($1, $2)", parameters=(self.slot_name, self.plugin))
+                cursor.fetchall()
+
+        with self.database.writer() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} "
+                "(slot_name VARCHAR PRIMARY KEY, lsn UBIGINT, applied_at TIMESTAMP, changes BIGINT)"
+            )
+            if created:
+                cursor.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE slot_name = ?", [self.slot_name])
+
+        if snapshot:
+            for source, keys in self.tables.items():
+                stream_postgres_to_duckdb(self.db_path, source, self._local(source), mode="replace")
+
+    def drop(self):
+        """Drop the slot (and publication) so Postgres stops retaining WAL for it."""
+        with self._conn.cursor() as cursor:
+            cursor.execute("SELECT pg_drop_replication_slot($1)", parameters=(self.slot_name,))
+            if self.plugin == "pgoutput":
+                cursor.execute(f"DROP PUBLICATION IF EXISTS {self.publication}")
+
+    ########################
+    # Polling
+    ########################
+
+    def poll(self) -> dict:
+        """
+        Apply the slot's pending transactions to DuckDB once.
+
+        Returns:
+            dict: Transactions and changes applied, the new checkpoint LSN and timing
+        """
+        started = time.perf_counter()
+        with trace("cdc_poll", slot=self.slot_name):
+            checkpoint = self.checkpoint()
+            with span("peek"):
+                rows = self._peek()
+            decode = decode_pgoutput if self.plugin == "pgoutput" else decode_wal2json
+            decoded = list(decode(rows))
+            transactions = [t for t in decoded if t.commit_lsn > checkpoint]
+            changes = [c for t in transactions for c in t.changes if c.table in self.tables]
+
+            if transactions:
+                lsn = transactions[-1].commit_lsn
+                with span("apply", changes=len(changes)), self.database.writer() as cursor:
+                    for table in dict.fromkeys(c.table for c in changes):
+                        self._apply(cursor, table, [c for c in changes if c.table == table])
+                    cursor.execute(
+                        f"INSERT OR REPLACE INTO {CHECKPOINT_TABLE} VALUES (?, ?, now()::TIMESTAMP, ?)",
+                        [self.slot_name, lsn, len(changes)],
+                    )
+                self._advance(lsn)
+                checkpoint = lsn
+            elif decoded:
+                # Everything peeked was applied before a crash kept the slot from advancing;
+                # without catching the slot up, every peek returns the same applied batch
+                self._advance(checkpoint)
+
+        return {
+            "transactions": len(transactions),
+            "changes": len(changes),
+            "lsn": format_lsn(checkpoint),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+    def run(self, stop_event: threading.Event | None = None, poll_interval: float = 1.0):
+        """Poll until stop_event is set, sleeping only when the slot had nothing to apply."""
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            result = self.poll()
+            if not result["transactions"]:
+                stop_event.wait(poll_interval)
+
+    def checkpoint(self) -> int:
+        """LSN of the last transaction applied to DuckDB for this slot (0 if none)."""
+        row = self.database.cursor().execute(
+            f"SELECT lsn FROM {CHECKPOINT_TABLE} WHERE slot_name = ?", [self.slot_name]
+        ).fetchone()
+        return row[0] if row else 0
+
+    def lag_bytes(self) -> int:
+        """WAL bytes the mirror is behind the primary."""
+        with self._conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_current_wal_lsn() - confirmed_flush_lsn FROM pg_replication_slots WHERE slot_name = $1",
+                parameters=(self.slot_name,),
+            )
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] is not None else 0
+
+    def close(self):
+        self._conn.close()
+
+    ########################
+    # Internals
+    ########################
+
+    @staticmethod
+    def _local(source: str) -> str:
+        return source.split(".", 1)[1]
+
+    def _peek(self) -> list:
+        if self.plugin == "pgoutput":
+            query = (
+                f"SELECT lsn::text, data FROM pg_logical_slot_peek_binary_changes("
+                f"'{self.slot_name}', NULL, {int(self.max_changes)}, "
+                f"'proto_version', '1', 'publication_names', '{self.publication}')"
+            )
+        else:
+            query = (
+                f"SELECT lsn::text, data FROM pg_logical_slot_peek_changes("
+                f"'{self.slot_name}', NULL, {int(self.max_changes)}, "
+                f"'format-version', '2', 'add-tables', '{','.join(self.tables)}')"
+            )
+        with self._conn.cursor() as cursor:
+            cursor.execute(query)
+            table = cursor.fetch_arrow_table()
+        return zip(table.column("lsn").to_pylist(), table.column("data").to_pylist())
+
+    def _advance(self, lsn: int):
+        with span("advance"), self._conn.cursor() as cursor:
+            cursor.execute("SELECT pg_replication_slot_advance($1, $2::pg_lsn)", parameters=(self.slot_name, format_lsn(lsn)))
+            cursor.fetchall()
+
+    def _apply(self, cursor, source: str, changes: list[Change]):
+        """Collapse one table's changes to the final state per key and write them."""
+        local = self._local(source)
+        keys = self.tables[source]
+        state, truncated = collapse_changes(changes, keys)
+
+        types = dict(cursor.execute(
+            "SELECT column_name, data_type FROM duckdb_columns() "
+            "WHERE table_name = ? AND database_name = current_database()",
+            [local],
+        ).fetchall())
+
+        if truncated:
+            cursor.execute(f"DELETE FROM {local}")
+
+        deleted = [dict(zip(keys, key)) for key, values in state.items() if values is None]
+        if deleted:
+            cursor.register("_cdc_keys", pa.Table.from_pylist(deleted))
+            match = " AND ".join(f"{local}.{_quote(k)} = {_cast('k.' + _quote(k), types[k])}" for k in keys)
+            cursor.execute(f"DELETE FROM {local} WHERE EXISTS (SELECT 1 FROM _cdc_keys k WHERE {match})")
+            cursor.unregister("_cdc_keys")
+
+        # Rows with unchanged TOASTed columns lack those columns; merge each column set separately
+        groups: dict[tuple, list[dict]] = {}
+        for values in state.values():
+            if values is not None:
+                groups.setdefault(tuple(values), []).append(values)
+        for columns, rows in groups.items():
+            text = pa.Table.from_pylist(rows, schema=pa.schema([(c, pa.string()) for c in columns]))
+            cursor.register("_cdc_rows", text)
+            projection = ", ".join(f"{_cast(_quote(c), types[c])} AS {_quote(c)}" for c in columns if c in types)
+            typed = cursor.execute(f"SELECT {projection} FROM _cdc_rows").fetch_arrow_table()
+            cursor.unregister("_cdc_rows")
+            merge_into(cursor, local, typed, keys)
+
+
+def collapse_changes(changes: list[Change], keys: list[str]) -> tuple[dict, bool]:
+    """
+    Collapse one table's changes, in commit order, to the final row per key.
+
+    Returns:
+        tuple: key tuple -> final row values (None once deleted), and whether
+            the table was truncated (only changes after the last truncate are kept)
+    """
+    # key -> latest row values, or None once deleted
+    state: dict[tuple, dict | None] = {}
+    truncated = False
+    for change in changes:
+        if change.action == "T":
+            state, truncated = {}, True
+            continue
+        new_key = tuple(change.values.get(k) for k in keys)
+        old_key = tuple(change.old.get(k) for k in keys) if change.old else new_key
+        if change.action == "D":
+            state[old_key] = None
+            continue
+        # Columns an update leaves out (unchanged TOAST values) keep the batch's earlier value
+        previous = state.get(old_key)
+        if old_key != new_key:
+            state[old_key] = None
+        state[new_key] = {**previous, **change.values} if previous else change.values
+    return state, truncated
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _cast(expression: str, duckdb_type: str) -> str:
+    """Cast a Postgres text value to a DuckDB column type."""
+    if duckdb_type.endswith("[]"):
+        # Postgres arrays are {a,b}; DuckDB lists are [a, b]
+        expression = f"translate({expression}, '{{}}', '[]')"
+    elif duckdb_type == "BLOB":
+        # bytea is sent hex-encoded as \x0102...
+        return f"from_hex(substr({expression}, 3))"
+    return f"CAST({expression} AS {duckdb_type})"
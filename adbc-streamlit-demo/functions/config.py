@@ -0,0 +1,431 @@
+import functools
+import os
+import tempfile
+import threading
+import tomllib
+import types
+import typing
+from dataclasses import dataclass, field, fields
+from urllib.parse import quote, unquote, urlencode, urlsplit, urlunsplit
+
+SECRETS_PATH = "secrets.toml"
+MB = 1024 * 1024
+SPILL_CODECS = ("lz4", "zstd", "none")
+ROUTING_MODES = ("auto", "local", "remote")
+JOB_SOURCES = ("postgres", "motherduck", "bigquery")
+# Keys of a [[scheduler.jobs]] entry
+JOB_KEYS = ("name", "source", "table", "database", "local_table", "interval_seconds")
+
+
+class ConfigError(ValueError):
+    """secrets.toml has options of the wrong type or out of range."""
+
+    def __init__(self, problems: list[str]):
+        self.problems = problems
+        super().__init__("Invalid secrets.toml:\n  " + "\n  ".join(problems))
+
+
+########################
+# Raw file
+########################
+
+@functools.lru_cache(maxsize=8)
+def _parse(path: str, mtime_ns: int) -> dict:
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def load_secrets(path: str = SECRETS_PATH, required: bool = True) -> dict:
+    """
+    Settings from secrets.toml, parsed once and shared by every module and page.
+
+    The file is only re-read when its modification time changes, so calling
+    this on every use (rather than at import time) costs one stat().
+    Treat the returned dict as read-only; it is shared.
+
+    Args:
+        path (str): Path to the TOML file, relative to the working directory
+        required (bool): Raise FileNotFoundError if the file is missing;
+            otherwise return an empty dict
+
+    Returns:
+        dict: The parsed settings
+    """
+    path = os.path.abspath(path)
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        if required:
+            raise
+        return {}
+    return _parse(path, mtime_ns)
+
+
+########################
+# Typed sections
+########################
+
+def libpq_query(query: str) -> dict:
+    """Parse a URI query string the way libpq does: percent-decoding only, so "+" stays a "+"."""
+    pairs = (part.partition("=") for part in query.split("&") if part)
+    return {unquote(key): unquote(value) for key, _, value in pairs}
+
+
+@dataclass(frozen=True)
+class PostgresConfig:
+    connection_string: str = ""
+    table_name: str = "streaming_data"
+    # Arrow batch size the driver aims for; None keeps the driver default
+    batch_size_hint_mb: int | None = None
+    use_copy: bool = True
+    adaptive_batching: bool = False
+    # Server-side limit for every statement; None for no limit
+    statement_timeout_ms: int | None = None
+    export_partitions: int = 4
+    # Connections kept open per connection string for repeated queries
+    pool_size: int = 4
+
+    @property
+    def batch_size_hint_bytes(self) -> int | None:
+        return self.batch_size_hint_mb * MB if self.batch_size_hint_mb else None
+
+    def db_kwargs(self, uri: str | None = None) -> dict:
+        """ADBC db_kwargs for a Postgres URI (the configured one by default), with the statement timeout applied."""
+        uri = uri or self.connection_string
+        if self.statement_timeout_ms:
+            # libpq applies "options" to every session opened from the URI
+            parts = urlsplit(uri)
+            query = libpq_query(parts.query)
+            query["options"] = f"{query.get('options', '')} -c statement_timeout={self.statement_timeout_ms}".strip()
+            # libpq only percent-decodes, so spaces must be %20 rather than urlencode's default "+"
+            encoded = urlencode(query, quote_via=quote)
+            if libpq_query(encoded) != query:
+                raise ConfigError([f"connection string query {parts.query!r} can't be re-encoded for libpq"])
+            uri = urlunsplit(parts._replace(query=encoded))
+        return {"uri": uri}
+
+    def problems(self) -> list[str]:
+        problems = []
+        if self.batch_size_hint_mb is not None and not 1 <= self.batch_size_hint_mb <= 256:
+            problems.append("batch_size_hint_mb must be between 1 and 256")
+        if self.statement_timeout_ms is not None and self.statement_timeout_ms < 0:
+            problems.append("statement_timeout_ms must not be negative")
+        if self.export_partitions < 1 or self.pool_size < 1:
+            problems.append("export_partitions and pool_size must be at least 1")
+        return problems
+
+
+@dataclass(frozen=True)
+class MotherDuckConfig:
+    db_name: str = ""
+    table_name: str = ""
+    pool_size: int = 2
+
+    def problems(self) -> list[str]:
+        return ["pool_size must be at least 1"] if self.pool_size < 1 else []
+
+
+@dataclass(frozen=True)
+class BigQueryConfig:
+    project_id: str = ""
+    dataset_id: str = ""
+    table_id: str = ""
+    # Read results over several Storage Read API streams at once
+    parallel_read: bool = False
+    max_streams: int = 4
+    buffer_batches: int = 8
+
+    def problems(self) -> list[str]:
+        problems = []
+        if not 1 <= self.max_streams <= 64:
+            problems.append("max_streams must be between 1 and 64")
+        if self.buffer_batches < 1:
+            problems.append("buffer_batches must be at least 1")
+        return problems
+
+
+@dataclass(frozen=True)
+class DuckDBConfig:
+    database: str = "streaming_data.duckdb"
+    table_name: str = "default_table"
+    # Applied when the local database is opened; None keeps DuckDB's defaults
+    threads: int | None = None
+    memory_limit: str | None = None
+
+    def connect_options(self) -> dict:
+        options = {"threads": self.threads, "memory_limit": self.memory_limit}
+        return {k: v for k, v in options.items() if v is not None}
+
+    def problems(self) -> list[str]:
+        return ["threads must be at least 1"] if self.threads is not None and self.threads < 1 else []
+
+
+@dataclass(frozen=True)
+class SessionConfig:
+    budget_mb: float = 256
+    global_budget_mb: float = 1024
+    spill: bool = True
+    spill_dir: str = ""
+    # "none" keeps spill files memory-mappable; a compressed spill is read back into memory
+    spill_compression: str = "none"
+
+    @property
+    def budget_bytes(self) -> int:
+        return int(self.budget_mb * MB)
+
+    @property
+    def global_budget_bytes(self) -> int:
+        return int(self.global_budget_mb * MB)
+
+    @property
+    def spill_path(self) -> str:
+        return self.spill_dir or os.path.join(tempfile.gettempdir(), "adbc-streamlit-spill")
+
+    def problems(self) -> list[str]:
+        problems = []
+        if self.budget_mb <= 0 or self.global_budget_mb <= 0:
+            problems.append("budget_mb and global_budget_mb must be positive")
+        if self.spill_compression not in SPILL_CODECS:
+            problems.append(f"spill_compression must be one of {SPILL_CODECS}")
+        return problems
+
+
+@dataclass(frozen=True)
+class DashboardConfig:
+    cache_entries: int = 256
+    # Also expire cached chart results after this long, e.g. when another process writes the file
+    cache_ttl_seconds: float | None = None
+    max_result_rows: int = 10_000
+
+    def problems(self) -> list[str]:
+        problems = []
+        if self.cache_entries < 0:
+            problems.append("cache_entries must not be negative")
+        if self.cache_ttl_seconds is not None and self.cache_ttl_seconds <= 0:
+            problems.append("cache_ttl_seconds must be positive")
+        if self.max_result_rows < 1:
+            problems.append("max_result_rows must be at least 1")
+        return problems
+
+
+@dataclass(frozen=True)
+class ReplicationConfig:
+    workers: int = 4
+    retries: int = 3
+    retry_delay: float = 1.0
+    buffer_batches: int = 8
+
+    def problems(self) -> list[str]:
+        problems = []
+        if self.workers < 1 or self.buffer_batches < 1:
+            problems.append("workers and buffer_batches must be at least 1")
+        if self.retries < 0 or self.retry_delay < 0:
+            problems.append("retries and retry_delay must not be negative")
+        return problems
+
+
+@dataclass(frozen=True)
+class RoutingConfig:
+    # auto: the local mirror when it is fresh enough; local: the mirror whenever
+    # there is one; remote: always the source
+    mode: str = "auto"
+    max_age_seconds: float = 900
+
+    def problems(self) -> list[str]:
+        problems = []
+        if self.mode not in ROUTING_MODES:
+            problems.append(f"mode must be one of {ROUTING_MODES}")
+        if self.max_age_seconds < 0:
+            problems.append("max_age_seconds must not be negative")
+        return problems
+
+
+@dataclass(frozen=True)
+class ProfilingConfig:
+    # Reuse a table profile for this long before gathering it again
+    cache_ttl_seconds: float = 3600
+    # Pick Postgres batch sizes, export writers and BigQuery streams from the
+    # table profile when they aren't set explicitly
+    auto_plan: bool = True
+    # Rows BigQuery column statistics are sampled from, to limit bytes billed
+    sample_rows: int = 100_000
+
+    def problems(self) -> list[str]:
+        problems = []
+        if self.cache_ttl_seconds < 0:
+            problems.append("cache_ttl_seconds must not be negative")
+        if self.sample_rows < 1:
+            problems.append("sample_rows must be at least 1")
+        return problems
+
+
+@dataclass(frozen=True)
+class SchedulerConfig:
+    # Start the background refresh thread with the app
+    enabled: bool = False
+    # [[scheduler.jobs]] tables: name, source, table, database, local_table, interval_seconds
+    jobs: list = field(default_factory=list)
+
+    def problems(self) -> list[str]:
+        problems = []
+        for i, job in enumerate(self.jobs):
+            where = f"jobs[{i}]"
+            if not isinstance(job, dict):
+                problems.append(f"{where} must be a table")
+                continue
+            problems += [f"{where} unknown option '{key}'" for key in job if key not in JOB_KEYS]
+            if job.get("source") not in JOB_SOURCES:
+                problems.append(f"{where} source must be one of {JOB_SOURCES}")
+            if not isinstance(job.get("local_table"), str) or not job.get("local_table"):
+                problems.append(f"{where} needs a local_table")
+            interval = job.get("interval_seconds", 3600)
+            if isinstance(interval, bool) or not isinstance(interval, (int, float)) or interval <= 0:
+                problems.append(f"{where} interval_seconds must be a positive number")
+        names = [job.get("name") or job.get("local_table") for job in self.jobs if isinstance(job, dict)]
+        if len(names) != len(set(names)):
+            problems.append("job names (or local tables) must be unique")
+        return problems
+
+
+@dataclass(frozen=True)
+class AppConfig:
+    postgres: PostgresConfig = field(default_factory=PostgresConfig)
+    motherduck: MotherDuckConfig = field(default_factory=MotherDuckConfig)
+    bigquery: BigQueryConfig = field(default_factory=BigQueryConfig)
+    duckdb: DuckDBConfig = field(default_factory=DuckDBConfig)
+    session: SessionConfig = field(default_factory=SessionConfig)
+    dashboard: DashboardConfig = field(default_factory=DashboardConfig)
+    replication: ReplicationConfig = field(default_factory=ReplicationConfig)
+    routing: RoutingConfig = field(default_factory=RoutingConfig)
+    profiling: ProfilingConfig = field(default_factory=ProfilingConfig)
+    scheduler: SchedulerConfig = field(default_factory=SchedulerConfig)
+    # The parsed file, for keys outside the typed sections (e.g. extra connection strings)
+    raw: dict = field(default_factory=dict, repr=False)
+
+    def secret(self, key: str) -> str:
+        """A top-level value of secrets.toml, e.g. an alternative connection string."""
+        if key not in self.raw:
+            raise KeyError(f"'{key}' is not set in secrets.toml")
+        return self.raw[key]
+
+    def postgres_db_kwargs(self, secret: str = "postgres_connection_string") -> dict:
+        """
+        Postgres db_kwargs for a connection string key: the [postgres] one for
+        postgres_connection_string, any other top-level key as is. The
+        [postgres] statement timeout applies to both.
+        """
+        uri = self.postgres.connection_string if secret == "postgres_connection_string" else self.secret(secret)
+        return self.postgres.db_kwargs(uri)
+
+
+# Section -> (class, field -> top-level key it was configured with before sections existed)
+_SECTIONS = {
+    "postgres": (PostgresConfig, {"connection_string": "postgres_connection_string", "table_name": "postgres_table_name"}),
+    "motherduck": (MotherDuckConfig, {"db_name": "motherduck_db_name", "table_name": "motherduck_table_name"}),
+    "bigquery": (BigQueryConfig, {"project_id": "project_id", "dataset_id": "dataset_id", "table_id": "table_id"}),
+    "duckdb": (DuckDBConfig, {"database": "duckdb_database", "table_name": "duckdb_table_name"}),
+    "session": (SessionConfig, {
+        "budget_mb": "session_budget_mb",
+        "global_budget_mb": "global_budget_mb",
+        "spill": "session_spill",
+        "spill_dir": "session_spill_dir",
+        "spill_compression": "session_spill_compression",
+    }),
+    "dashboard": (DashboardConfig, {}),
+    "replication": (ReplicationConfig, {}),
+    "routing": (RoutingConfig, {}),
+    "profiling": (ProfilingConfig, {}),
+    "scheduler": (SchedulerConfig, {}),
+}
+
+
+def _type_ok(value, annotation) -> bool:
+    if isinstance(annotation, types.UnionType):
+        return any(_type_ok(value, option) for option in typing.get_args(annotation))
+    if annotation is type(None):
+        return value is None
+    if annotation is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if annotation is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    return isinstance(value, annotation)
+
+
+def parse_config(raw: dict) -> AppConfig:
+    """
+    Build the typed config from a parsed secrets.toml.
+
+    Each source reads its `[section]` table; the flat top-level keys used
+    before sections existed (postgres_connection_string, project_id, ...)
+    still work and are overridden by the section.
+
+    Raises:
+        ConfigError: Listing every unknown option, wrong type and out-of-range value
+    """
+    problems, sections = [], {}
+    for name, (cls, legacy) in _SECTIONS.items():
+        values = {attr: raw[key] for attr, key in legacy.items() if key in raw}
+        section = raw.get(name, {})
+        if not isinstance(section, dict):
+            problems.append(f"[{name}] must be a table")
+            section = {}
+        hints = typing.get_type_hints(cls)
+        known = {f.name for f in fields(cls)}
+        problems += [f"[{name}] unknown option '{key}'" for key in section if key not in known]
+        values.update({key: value for key, value in section.items() if key in known})
+        wrong = [
+            f"[{name}] {key} = {value!r} should be {getattr(hints[key], '__name__', hints[key])}"
+            for key, value in values.items()
+            if not _type_ok(value, hints[key])
+        ]
+        if wrong:
+            problems += wrong
+            continue
+        sections[name] = cls(**values)
+        problems += [f"[{name}] {problem}" for problem in sections[name].problems()]
+    if problems:
+        raise ConfigError(problems)
+    return AppConfig(**sections, raw=raw)
+
+
+########################
+# Loading
+########################
+
+_configs: dict[str, tuple[dict, AppConfig]] = {}
+_configs_lock = threading.Lock()
+
+
+def get_config(path: str = SECRETS_PATH, required: bool = True) -> AppConfig:
+    """
+    The validated config, rebuilt only when secrets.toml changes on disk.
+
+    Call it where a value is used rather than keeping it at import time:
+    editing secrets.toml then takes effect on the next call (hot reload)
+    without restarting the app. Options read once at startup, like the
+    local DuckDB threads, need a reopen of the database.
+
+    Args:
+        path (str): Path to the TOML file
+        required (bool): If False, a missing file gives the defaults
+
+    Raises:
+        ConfigError: If the file has invalid options
+    """
+    raw = load_secrets(path, required)
+    key = os.path.abspath(path)
+    with _configs_lock:
+        cached = _configs.get(key)
+        if cached is not None and cached[0] is raw:
+            return cached[1]
+    config = parse_config(raw)
+    with _configs_lock:
+        _configs[key] = (raw, config)
+    return config
+
+
+def reload_config():
+    """Forget the parsed files, so the next get_config() re-reads them even if their mtime is unchanged."""
+    _parse.cache_clear()
+    with _configs_lock:
+        _configs.clear()
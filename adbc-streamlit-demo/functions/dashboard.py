@@ -0,0 +1,222 @@
+import threading
+import time
+from collections import OrderedDict
+
+import pyarrow as pa
+
+from functions.config import get_config
+from functions.duckdb_manager import get_database
+from functions.statements import identifier
+from functions.tracing import span
+
+AGGREGATES = ("count", "sum", "avg", "min", "max", "median", "approx_count_distinct")
+SAMPLE_METHODS = ("reservoir", "system", "bernoulli")
+# Rows per DuckDB vector, the unit "system" sampling keeps or skips
+VECTOR_SIZE = 2048
+
+_NUMERIC_TYPES = (
+    "TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT",
+    "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT", "UHUGEINT",
+    "FLOAT", "DOUBLE", "DECIMAL",
+)
+
+# Key -> (result, time it was cached)
+_cache: "OrderedDict[tuple, tuple[pa.Table, float]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _max_rows(rows: int) -> int:
+    """Clamp a requested size to [dashboard] max_result_rows, the most rows any chart query returns."""
+    return max(1, min(rows, get_config(required=False).dashboard.max_result_rows))
+
+
+########################
+# Cached queries
+########################
+
+def cached_query(db_path: str, sql: str, params: list | None = None) -> pa.Table:
+    """
+    Run a read query on the shared local database and cache its Arrow result.
+
+    Results are keyed by (database file, database version, query), and the
+    version changes on every write committed through DuckDBDatabase.writer(),
+    so a cached chart is reused until the mirror is refreshed and never
+    served stale afterwards. The [dashboard] section of secrets.toml sets
+    how many results are kept (least recently used go first) and an
+    optional TTL for files that other processes write to.
+    """
+    settings = get_config(required=False).dashboard
+    database = get_database(db_path)
+    key = (database.path, database.version, sql, tuple(params or ()))
+    with _cache_lock:
+        table, cached_at = _cache.get(key, (None, 0.0))
+        if table is not None and settings.cache_ttl_seconds and time.monotonic() - cached_at > settings.cache_ttl_seconds:
+            table = None
+        if table is not None:
+            _cache.move_to_end(key)
+    with span("dashboard_query", cached=table is not None) as query_span:
+        if table is None:
+            table = database.cursor().execute(sql, params or []).fetch_arrow_table()
+            with _cache_lock:
+                _cache[key] = (table, time.monotonic())
+                while len(_cache) > settings.cache_entries:
+                    _cache.popitem(last=False)
+        if query_span is not None:
+            query_span.attributes.update(rows=table.num_rows)
+    return table
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def column_types(db_path: str, table_name: str) -> dict[str, str]:
+    """Column name -> DuckDB type of a local table."""
+    table = cached_query(
+        db_path,
+        "SELECT column_name, data_type FROM duckdb_columns() "
+        "WHERE table_name = ? AND database_name = current_database() ORDER BY column_index",
+        [table_name],
+    )
+    return dict(zip(table.column("column_name").to_pylist(), table.column("data_type").to_pylist()))
+
+
+def numeric_columns(db_path: str, table_name: str) -> list[str]:
+    return [
+        name for name, data_type in column_types(db_path, table_name).items()
+        if data_type.split("(")[0] in _NUMERIC_TYPES
+    ]
+
+
+########################
+# Reductions
+########################
+
+def aggregate(
+    db_path: str,
+    table_name: str,
+    group_by: list[str],
+    measures: dict[str, str],
+    limit: int = 1000,
+) -> pa.Table:
+    """
+    Group a local table inside DuckDB and return only the aggregated rows.
+
+    Args:
+        db_path (str): Path to the local DuckDB database file
+        table_name (str): Table to aggregate
+        group_by (list[str]): Grouping columns; empty for one row over the whole table
+        measures (dict): Column -> aggregate from AGGREGATES, output as "<aggregate>_<column>"
+        limit (int): Largest groups to return (by row count), capped at [dashboard] max_result_rows
+
+    Returns:
+        pa.Table: A "rows" count plus one column per measure, per group
+    """
+    for function in measures.values():
+        if function not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate '{function}', expected one of {AGGREGATES}")
+    table_name = identifier(table_name)
+    keys = ", ".join(map(_quote, group_by))
+    selections = [keys] if keys else []
+    selections.append("count(*) AS rows")
+    selections += [f"{function}({_quote(column)}) AS {_quote(f'{function}_{column}')}" for column, function in measures.items()]
+    sql = f"SELECT {', '.join(selections)} FROM {table_name}"
+    if keys:
+        sql += f" GROUP BY {keys} ORDER BY rows DESC, {keys} LIMIT {_max_rows(limit)}"
+    return cached_query(db_path, sql)
+
+
+def histogram(db_path: str, table_name: str, column: str, bins: int = 30) -> pa.Table:
+    """
+    Equal-width histogram of a numeric column, computed in one scan inside DuckDB.
+
+    Returns:
+        pa.Table: bin, bin_start, bin_end and count per non-empty bin
+    """
+    table_name = identifier(table_name)
+    bins = _max_rows(bins)
+    value = f"CAST({_quote(column)} AS DOUBLE)"
+    sql = f"""
+        WITH bounds AS (
+            SELECT min({value}) AS lo, max({value}) AS hi FROM {table_name}
+        ), binned AS (
+            SELECT least(CAST(floor(({value} - lo) / greatest((hi - lo) / {bins}, 1e-300)) AS INTEGER), {bins - 1}) AS bin, lo, hi
+            FROM {table_name}, bounds
+            WHERE {_quote(column)} IS NOT NULL
+        )
+        SELECT bin,
+               any_value(lo) + bin * (any_value(hi) - any_value(lo)) / {bins} AS bin_start,
+               any_value(lo) + (bin + 1) * (any_value(hi) - any_value(lo)) / {bins} AS bin_end,
+               count(*) AS count
+        FROM binned GROUP BY bin ORDER BY bin
+    """
+    return cached_query(db_path, sql)
+
+
+def sample(
+    db_path: str,
+    table_name: str,
+    rows: int = 1000,
+    method: str = "reservoir",
+    columns: list[str] | None = None,
+    seed: int | None = 42,
+) -> pa.Table:
+    """
+    Random sample of a local table for scatter plots and previews.
+
+    "reservoir" draws exactly `rows` rows uniformly but scans the table;
+    "system" (TABLESAMPLE by vector chunk) and "bernoulli" (per row) sample
+    a percentage sized from the row count, so they skip work on large tables
+    at the cost of an approximate size. A fixed seed keeps the sample, and
+    with it the cache entry, stable across reruns.
+
+    Returns:
+        pa.Table: At most `rows` rows, capped at [dashboard] max_result_rows
+    """
+    if method not in SAMPLE_METHODS:
+        raise ValueError(f"Unknown sample method '{method}', expected one of {SAMPLE_METHODS}")
+    table_name = identifier(table_name)
+    rows = _max_rows(rows)
+    projection = ", ".join(map(_quote, columns)) if columns else "*"
+    seed_option = f", {seed}" if seed is not None else ""
+    if method == "reservoir":
+        clause = f"{rows} ROWS (reservoir{seed_option})"
+    else:
+        total = cached_query(db_path, f"SELECT count(*) AS n FROM {table_name}").column("n")[0].as_py()
+        # Oversample so the LIMIT, not the sampler, usually sets the size; system
+        # sampling keeps whole vectors, so ask for at least a few of them
+        wanted = rows * 1.2 if method == "bernoulli" else max(rows * 1.2, 8 * VECTOR_SIZE)
+        percent = min(100.0, 100.0 * wanted / max(total, 1))
+        clause = f"{percent:.6f}% ({method}{seed_option})"
+    return cached_query(db_path, f"SELECT {projection} FROM {table_name} USING SAMPLE {clause} LIMIT {rows}")
+
+
+def preview(db_path: str, sql: str, max_rows: int | None = None) -> tuple[pa.Table, bool]:
+    """
+    Run an ad-hoc query and keep only its first max_rows rows, reading the
+    result batch by batch so a query over the whole table never materializes
+    in full.
+
+    Returns:
+        tuple[pa.Table, bool]: The rows read and whether the result was truncated
+    """
+    max_rows = _max_rows(max_rows or get_config(required=False).dashboard.max_result_rows)
+    reader = get_database(db_path).cursor().execute(sql).fetch_record_batch()
+    batches, rows = [], 0
+    truncated = False
+    for batch in reader:
+        if rows >= max_rows:
+            truncated = True
+            break
+        batches.append(batch.slice(0, max_rows - rows))
+        rows += batches[-1].num_rows
+        if batches[-1].num_rows < batch.num_rows:
+            truncated = True
+            break
+    reader.close()
+    return pa.Table.from_batches(batches, reader.schema), truncated
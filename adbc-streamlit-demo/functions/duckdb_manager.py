@@ -0,0 +1,341 @@
+import contextlib
+import itertools
+import os
+import re
+import threading
+
+from functions.config import get_config
+from functions.lazy import lazy_import
+
+# Loaded when the first database is opened
+duckdb = lazy_import("duckdb")
+pa = lazy_import("pyarrow")
+
+INGEST_MODES = ("create", "append", "replace", "merge", "swap")
+# Suffix of the table a swap builds before renaming it over the target
+SHADOW_SUFFIX = "__shadow"
+# One part of a dotted table name: a double-quoted identifier or a plain one
+_NAME_PART = re.compile(r'"((?:[^"]|"")*)"|([^".]+)')
+
+
+class SwapVerificationError(RuntimeError):
+    """A swap's shadow table failed verification; the target table was left unchanged."""
+
+    def __init__(self, table_name: str, problems: list[str]):
+        self.table_name = table_name
+        self.problems = problems
+        super().__init__(f"Kept the previous '{table_name}', the rebuilt copy failed verification:\n  " + "\n  ".join(problems))
+
+# One DuckDBDatabase per file for the whole process
+_databases: dict[str, "DuckDBDatabase"] = {}
+_databases_lock = threading.Lock()
+# Process-wide counter, so a reopened file never reuses an earlier version
+_versions = itertools.count(1)
+
+
+class DuckDBDatabase:
+    """
+    A local DuckDB file opened once per process and shared by every page.
+
+    DuckDB allows a single read-write instance per file, and the ADBC DuckDB
+    driver opens its own instance, so opening the file from both paths (or
+    once per rerun) either fails or sees stale data. This class owns the only
+    instance: readers get a cursor per thread and can run concurrently, and
+    writes go through writer(), which admits one writer at a time.
+    """
+
+    def __init__(self, path: str, config: dict | None = None):
+        self.path = path
+        # Instance options such as threads and memory_limit; fixed until the file is reopened
+        self._con = duckdb.connect(path, config=config or {})
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        # Changes on every committed write; caches of query results key on it
+        self.version = next(_versions)
+
+    def cursor(self) -> "duckdb.DuckDBPyConnection":
+        """Return this thread's cursor, creating it on first use."""
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._local.cursor = self._con.cursor()
+        return cursor
+
+    @contextlib.contextmanager
+    def writer(self):
+        """
+        Run writes in a single transaction, one writer at a time.
+
+        Readers keep seeing the last committed data until the block commits;
+        any exception rolls the whole block back.
+        """
+        with self._write_lock:
+            cursor = self._con.cursor()
+            try:
+                cursor.execute("BEGIN TRANSACTION")
+                try:
+                    yield cursor
+                except BaseException:
+                    cursor.execute("ROLLBACK")
+                    raise
+                cursor.execute("COMMIT")
+                self.version = next(_versions)
+            finally:
+                cursor.close()
+
+    def ingest(
+        self,
+        table_name: str,
+        reader,
+        mode: str = "create",
+        primary_key: list[str] | None = None,
+        delete_missing: bool = False,
+        before_write=None,
+    ) -> dict:
+        """
+        Write an Arrow record batch stream (e.g. an ADBC cursor's
+        fetch_record_batch()) into a table, consuming it batch by batch.
+
+        Args:
+            table_name (str): Table to write
+            reader: Arrow RecordBatchReader
+            mode (str): "create" (fail if the table exists), "append",
+                "replace", "merge" (upsert on primary_key) or "swap" (build
+                a shadow table, then swap it in, see swap_table())
+            primary_key (list[str]): Key columns matched by merge
+            delete_missing (bool): In merge mode, also delete rows whose key
+                is no longer in the stream
+            before_write: Called with the writer cursor before the data is
+                written (in swap mode, before the swap), so related changes
+                commit or roll back with the write
+
+        Returns:
+            dict: Rows inserted/updated/deleted by a merge, rows verified by a
+                swap; empty for other modes
+        """
+        if mode not in INGEST_MODES:
+            raise ValueError(f"Unknown ingest mode '{mode}', expected one of {INGEST_MODES}")
+        if mode == "merge" and not primary_key:
+            raise ValueError("Merge mode needs a primary_key")
+        if mode == "swap":
+            return self._build_and_swap(table_name, reader, before_write)
+
+        with self.writer() as cursor:
+            if before_write is not None:
+                before_write(cursor)
+            cursor.register("_ingest_stream", reader)
+            try:
+                exists = table_exists(cursor, table_name)
+                if mode == "create" or (mode in ("append", "merge") and not exists):
+                    cursor.execute(f"CREATE TABLE {table_name} AS SELECT * FROM _ingest_stream")
+                elif mode == "replace":
+                    cursor.execute(f"CREATE OR REPLACE TABLE {table_name} AS SELECT * FROM _ingest_stream")
+                elif mode == "append":
+                    cursor.execute(f"INSERT INTO {table_name} BY NAME SELECT * FROM _ingest_stream")
+                else:
+                    return self._merge(cursor, table_name, reader.schema.names, primary_key, delete_missing)
+            finally:
+                cursor.unregister("_ingest_stream")
+        return {}
+
+    def swap_table(
+        self,
+        shadow: str,
+        target: str,
+        expected_rows: int | None = None,
+        columns: list[str] | None = None,
+        before_write=None,
+    ):
+        """
+        Replace `target` with the already built table `shadow` in one short
+        transaction. The shadow table is committed first, so the long write
+        never touches `target`; readers see the old table until the rename
+        commits and the new one after, never a missing or partial table.
+
+        Before the swap the shadow is checked, in the same transaction:
+
+        - it holds `expected_rows` rows, when given (the rows the stream delivered)
+        - its columns are `columns`, when given
+        - it is not empty while `target` has rows, which usually means a broken
+          source query rather than an emptied table (use mode "replace" for that)
+
+        Raises:
+            SwapVerificationError: If a check fails; the shadow is dropped and
+                `target` is left as it was
+        """
+        with self.writer() as cursor:
+            rows = cursor.execute(f"SELECT count(*) FROM {shadow}").fetchone()[0]
+            problems = []
+            if expected_rows is not None and rows != expected_rows:
+                problems.append(f"{rows:,} rows written but the stream delivered {expected_rows:,}")
+            if columns is not None:
+                written = [row[0] for row in cursor.execute(f"DESCRIBE {shadow}").fetchall()]
+                if written != list(columns):
+                    problems.append(f"columns {written} differ from the stream's {list(columns)}")
+            if rows == 0 and self._has_rows(cursor, target):
+                problems.append(f"the rebuilt copy is empty but '{target}' has rows")
+            if problems:
+                cursor.execute(f"DROP TABLE {shadow}")
+            else:
+                if before_write is not None:
+                    before_write(cursor)
+                cursor.execute(f"DROP TABLE IF EXISTS {target}")
+                # RENAME TO takes the bare name; the table stays in the shadow's schema
+                cursor.execute(f"ALTER TABLE {shadow} RENAME TO {_quote(table_name_parts(target)[-1])}")
+        if problems:
+            raise SwapVerificationError(target, problems)
+        return rows
+
+    def _build_and_swap(self, table_name: str, reader, before_write=None) -> dict:
+        """Write the stream into the shadow table, then verify it and swap it in."""
+        # Next to the target, in the same schema: "main.events" is built as "main"."events__shadow"
+        parts = table_name_parts(table_name)
+        shadow = ".".join(map(_quote, parts[:-1] + [parts[-1] + SHADOW_SUFFIX]))
+        counts = {"rows": 0}
+
+        def counted():
+            for batch in reader:
+                counts["rows"] += batch.num_rows
+                yield batch
+
+        try:
+            self.ingest(shadow, pa.RecordBatchReader.from_batches(reader.schema, counted()), "replace")
+            rows = self.swap_table(shadow, table_name, counts["rows"], reader.schema.names, before_write)
+        except BaseException:
+            # The shadow was committed on its own; don't leave it behind when the
+            # stream or the swap fails. The target only changes if the swap commits
+            with self.writer() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {shadow}")
+            raise
+        return {"verified_rows": rows}
+
+    @staticmethod
+    def _has_rows(cursor, table_name: str) -> bool:
+        return table_exists(cursor, table_name) and cursor.execute(f"SELECT count(*) FROM (SELECT 1 FROM {table_name} LIMIT 1)").fetchone()[0] > 0
+
+    @staticmethod
+    def _merge(cursor, table_name: str, columns: list[str], primary_key: list[str], delete_missing: bool) -> dict:
+        """Stage the registered stream and MERGE it into table_name on primary_key."""
+        def quote(name):
+            return '"' + name.replace('"', '""') + '"'
+
+        missing = set(primary_key) - set(columns)
+        if missing:
+            raise ValueError(f"Primary key columns {sorted(missing)} are not in the stream")
+
+        # A failed merge rolls back with the writer's transaction, staging table included
+        cursor.execute("CREATE OR REPLACE TEMP TABLE _merge_staging AS SELECT * FROM _ingest_stream")
+        on = " AND ".join(f"{table_name}.{quote(k)} = _merge_staging.{quote(k)}" for k in primary_key)
+        updates = ", ".join(f"{quote(c)} = _merge_staging.{quote(c)}" for c in columns if c not in primary_key)
+        clauses = [f"WHEN MATCHED THEN UPDATE SET {updates}"] if updates else []
+        clauses.append(
+            f"WHEN NOT MATCHED THEN INSERT ({', '.join(map(quote, columns))}) "
+            f"VALUES ({', '.join('_merge_staging.' + quote(c) for c in columns)})"
+        )
+        if delete_missing:
+            clauses.append("WHEN NOT MATCHED BY SOURCE THEN DELETE")
+        staged = cursor.execute("SELECT count(*) FROM _merge_staging").fetchone()[0]
+        matched = cursor.execute(
+            f"SELECT count(*) FROM _merge_staging WHERE EXISTS (SELECT 1 FROM {table_name} WHERE {on})"
+        ).fetchone()[0]
+        deleted = cursor.execute(
+            f"SELECT count(*) FROM {table_name} WHERE NOT EXISTS (SELECT 1 FROM _merge_staging WHERE {on})"
+        ).fetchone()[0] if delete_missing else 0
+        cursor.execute(f"MERGE INTO {table_name} USING _merge_staging ON {on} {' '.join(clauses)}")
+        cursor.execute("DROP TABLE _merge_staging")
+        return {"inserted": staged - matched, "updated": matched if updates else 0, "deleted": deleted}
+
+    def close(self):
+        self._con.close()
+
+
+def table_name_parts(table_name: str) -> list[str]:
+    """
+    Split a dotted table name into its parts, e.g. 'main."Order Items"' into
+    ["main", "Order Items"], unquoting double-quoted parts.
+
+    Raises:
+        ValueError: If the name is empty or not dot-separated names
+    """
+    parts, pos = [], 0
+    while True:
+        match = _NAME_PART.match(table_name, pos)
+        if match is None:
+            raise ValueError(f"Invalid table name {table_name!r}")
+        parts.append(match[2] if match[1] is None else match[1].replace('""', '"'))
+        pos = match.end()
+        if pos == len(table_name):
+            return parts
+        if table_name[pos] != ".":
+            raise ValueError(f"Invalid table name {table_name!r}")
+        pos += 1
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def table_exists(cursor, table_name: str) -> bool:
+    """
+    Whether `table_name` names a table, resolved the way DuckDB resolves it
+    in a query: "t" in the current schema, "s.t" in schema s (or in database
+    s's main schema), "d.s.t" fully qualified. Parts may be double-quoted,
+    and matching ignores case, as DuckDB's identifiers do.
+
+    A lookup in duckdb_tables() rather than a probing SELECT, since a failed
+    statement would abort an open writer() transaction.
+    """
+    parts = table_name_parts(table_name)
+    if len(parts) == 1:
+        where = "database_name = current_database() AND schema_name = current_schema()"
+    elif len(parts) == 2:
+        where = (
+            "((database_name = current_database() AND lower(schema_name) = lower($2))"
+            " OR (lower(database_name) = lower($2) AND schema_name = 'main'))"
+        )
+    elif len(parts) == 3:
+        where = "lower(database_name) = lower($3) AND lower(schema_name) = lower($2)"
+    else:
+        raise ValueError(f"Invalid table name {table_name!r}: at most database.schema.table")
+    found = cursor.execute(
+        f"SELECT count(*) FROM duckdb_tables() WHERE lower(table_name) = lower($1) AND {where}",
+        list(reversed(parts)),
+    ).fetchone()[0]
+    return found > 0
+
+
+def merge_into(cursor, table_name: str, data, primary_key: list[str], delete_missing: bool = False) -> dict:
+    """
+    MERGE an Arrow table or record batch stream into an existing table on
+    primary_key, using a cursor from an open writer() block so the merge
+    commits together with the block's other writes.
+
+    Returns:
+        dict: Rows inserted/updated/deleted
+    """
+    cursor.register("_ingest_stream", data)
+    try:
+        return DuckDBDatabase._merge(cursor, table_name, data.schema.names, primary_key, delete_missing)
+    finally:
+        cursor.unregister("_ingest_stream")
+
+
+def get_database(path: str) -> DuckDBDatabase:
+    """
+    Return the process-wide DuckDBDatabase for a file, opening it on first
+    use with the [duckdb] threads and memory_limit from secrets.toml.
+    """
+    key = os.path.abspath(path)
+    with _databases_lock:
+        database = _databases.get(key)
+        if database is None:
+            options = get_config(required=False).duckdb.connect_options()
+            database = _databases[key] = DuckDBDatabase(key, options)
+        return database
+
+
+def close_database(path: str):
+    """Close a file's shared DuckDBDatabase, e.g. before deleting or replacing the file."""
+    with _databases_lock:
+        database = _databases.pop(os.path.abspath(path), None)
+    if database is not None:
+        database.close()
@@ -0,0 +1,201 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+
+from functions.config import get_config
+from functions.duckdb_manager import get_database
+from functions.lazy import lazy_import
+from functions.profiling import planned_export_partitions
+from functions.statements import identifier
+from functions.tracing import span, traced
+
+dbapi = lazy_import("adbc_driver_manager.dbapi")
+
+EXPORT_MODES = ("create", "append", "replace")
+MB = 1024 * 1024
+
+
+########################
+# Helpers
+########################
+
+def _rowid_ranges(cursor, table_name: str, partitions: int) -> list[tuple[int, int]]:
+    """Split a DuckDB table into up to `partitions` contiguous rowid ranges."""
+    low, high = cursor.execute(f"SELECT min(rowid), max(rowid) FROM {table_name}").fetchone()
+    if low is None:
+        return [(0, -1)]
+    partitions = max(1, min(partitions, high - low + 1))
+    step = -(-(high - low + 1) // partitions)
+    return [(start, min(start + step - 1, high)) for start in range(low, high + 1, step)]
+
+
+def _counting_reader(reader, counts: dict):
+    """Wrap a RecordBatchReader to count the rows and bytes that pass through it."""
+    def batches():
+        for batch in reader:
+            counts["rows"] += batch.num_rows
+            counts["bytes"] += batch.nbytes
+            yield batch
+    return pa.RecordBatchReader.from_batches(reader.schema, batches())
+
+
+def _table_exists(cursor, table_name: str) -> bool:
+    cursor.execute("SELECT to_regclass($1) IS NOT NULL", parameters=(table_name,))
+    return bool(cursor.fetchone()[0])
+
+
+def _drop_staging(conn, cursor, staging: str):
+    """Discard a failed write's open transaction and its committed staging table."""
+    conn.rollback()
+    cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+    conn.commit()
+
+
+def _split_target(target: str) -> tuple[str, dict]:
+    """
+    The bare table name of a Postgres target and the adbc_ingest options that
+    place it in its schema: adbc_ingest quotes the name as one identifier, so
+    "public.orders" would otherwise become a table literally named that.
+    """
+    schema, _, name = target.rpartition(".")
+    return name, {"db_schema_name": schema} if schema else {}
+
+
+def _write_partition(uri: str, db_path: str, table_name: str, target: str, rowids: tuple[int, int], index: int) -> dict:
+    """Append one rowid range of the DuckDB table to `target` on its own Postgres connection."""
+    started = time.perf_counter()
+    counts = {"rows": 0, "bytes": 0}
+    source = get_database(db_path).cursor()
+    reader = source.execute(
+        f"SELECT * FROM {table_name} WHERE rowid BETWEEN {rowids[0]} AND {rowids[1]}"
+    ).fetch_record_batch()
+    with dbapi.connect(driver="postgresql", db_kwargs={"uri": uri}) as conn, conn.cursor() as cursor:
+        name, options = _split_target(target)
+        cursor.adbc_ingest(name, _counting_reader(reader, counts), mode="append", **options)
+        conn.commit()
+    return {"partition": index, **counts, "seconds": round(time.perf_counter() - started, 3)}
+
+
+########################
+# DuckDB to Postgres
+########################
+
+@traced
+def duckdb_to_postgres(
+    db_path: str,
+    table_name: str,
+    target_table: str | None = None,
+    mode: str = "create",
+    partitions: int | None = None,
+    secret: str = "postgres_connection_string",
+) -> dict:
+    """
+    Push a local DuckDB table into Postgres with adbc_ingest (COPY under the hood).
+
+    The table is split into `partitions` rowid ranges written in parallel, each
+    on its own Postgres connection. Unless the write is a single-connection
+    append, data lands in a staging table first and is swapped in with one
+    transaction, so the target never shows a partial or missing table.
+
+    Args:
+        db_path (str): Path to the local DuckDB database file
+        table_name (str): Table to export from DuckDB
+        target_table (str): Table to write in Postgres, e.g. "orders" (on the search_path) or
+            "public.orders"; defaults to table_name without its schema
+        mode (str): "create" (fail if the target exists), "append" or "replace"
+        partitions (int): Number of parallel partition writers; None plans one per million rows
+            ([profiling] auto_plan), up to [postgres] export_partitions
+        secret (str): Key of the Postgres connection string in secrets.toml
+
+    Returns:
+        dict: Rows, bytes, seconds and throughput overall and per partition
+    """
+    if mode not in EXPORT_MODES:
+        raise ValueError(f"Unknown export mode '{mode}', expected one of {EXPORT_MODES}")
+    config = get_config()
+    uri = config.postgres_db_kwargs(secret)["uri"]
+    table_name = identifier(table_name)
+    if partitions is None:
+        partitions = planned_export_partitions(db_path, table_name, config.postgres.export_partitions)
+    # Schema-qualified targets are fine; the local name's schema (e.g. main.t) isn't carried over
+    target = identifier(target_table or table_name.rsplit(".", 1)[-1], max_parts=2)
+    staging = f"{target}__staging"
+    # RENAME TO takes a bare name; the table stays in its schema
+    target_name, ingest_options = _split_target(target)
+    staging_name = f"{target_name}__staging"
+    started = time.perf_counter()
+
+    source = get_database(db_path).cursor()
+    ranges = _rowid_ranges(source, table_name, partitions)
+    direct = mode == "append" and len(ranges) == 1
+
+    with dbapi.connect(driver="postgresql", db_kwargs={"uri": uri}) as conn, conn.cursor() as cursor:
+        exists = _table_exists(cursor, target)
+        if mode == "create" and exists:
+            raise ValueError(f"Table '{target}' already exists in Postgres; use mode='append' or 'replace'")
+        if mode == "append" and not exists:
+            raise ValueError(f"Table '{target}' does not exist in Postgres; use mode='create'")
+
+        if len(ranges) == 1:
+            # One writer: ingest and swap on this connection, all in one transaction
+            counts = {"rows": 0, "bytes": 0}
+            reader = source.execute(f"SELECT * FROM {table_name}").fetch_record_batch()
+            partition_started = time.perf_counter()
+            with span("ingest", target=target, partitions=1):
+                if not direct:
+                    cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+                cursor.adbc_ingest(
+                    target_name if direct else staging_name,
+                    _counting_reader(reader, counts),
+                    mode="append" if direct else "create",
+                    **ingest_options,
+                )
+            partition_reports = [{"partition": 0, **counts, "seconds": round(time.perf_counter() - partition_started, 3)}]
+        else:
+            # Create the empty staging table, then let the partition writers append to it
+            empty = source.execute(f"SELECT * FROM {table_name} LIMIT 0").fetch_arrow_table()
+            cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+            cursor.adbc_ingest(staging_name, empty, mode="create", **ingest_options)
+            conn.commit()
+            try:
+                with span("ingest", target=target, partitions=len(ranges)), ThreadPoolExecutor(len(ranges)) as pool:
+                    futures = [
+                        pool.submit(_write_partition, uri, db_path, table_name, staging, rowids, i)
+                        for i, rowids in enumerate(ranges)
+                    ]
+                    partition_reports = [f.result() for f in futures]
+            except Exception:
+                _drop_staging(conn, cursor, staging)
+                raise
+
+        try:
+            with span("swap", mode=mode):
+                if mode == "append" and not direct:
+                    cursor.execute(f"INSERT INTO {target} SELECT * FROM {staging}")
+                    cursor.execute(f"DROP TABLE {staging}")
+                elif mode != "append":
+                    cursor.execute(f"DROP TABLE IF EXISTS {target}")
+                    cursor.execute(f"ALTER TABLE {staging} RENAME TO {target_name}")
+                conn.commit()
+        except Exception:
+            # The multi-writer staging table was committed before the writers ran
+            if not direct:
+                _drop_staging(conn, cursor, staging)
+            raise
+
+    seconds = time.perf_counter() - started
+    rows = sum(p["rows"] for p in partition_reports)
+    nbytes = sum(p["bytes"] for p in partition_reports)
+    return {
+        "table": table_name,
+        "target": target,
+        "mode": mode,
+        "partitions": len(partition_reports),
+        "rows": rows,
+        "bytes": nbytes,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows / seconds) if seconds else 0,
+        "mb_per_second": round(nbytes / MB / seconds, 2) if seconds else 0,
+        "partition_reports": partition_reports,
+    }
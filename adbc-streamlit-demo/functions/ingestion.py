@@ -1,141 +1,420 @@
-from adbc_driver_manager import dbapi
-import tomllib
+import contextlib
+import time
 
-# Load connection string from secrets.toml
-with open("secrets.toml", "rb") as f:
-    secrets = tomllib.load(f)
+from functions.bigquery_streams import read_parallel
+from functions.config import get_config
+from functions.duckdb_manager import get_database
+from functions.lazy import lazy_import
+from functions.optimize import optimize_result
+from functions.pg_batching import postgres_reader
+from functions.profiling import planned_bigquery_streams, planned_postgres_batch_size
+from functions.results import QueryResult
+from functions.routing import forget_mirror, motherduck_pool, motherduck_table, record_mirror
+from functions.schema_sync import reconcile
+from functions.statements import bigquery_table, get_pool, identifier
+from functions.tracing import Span, add_span, span, timed_reader, traced
+
+# The driver manager is loaded on the first connection, not when a page imports this module
+dbapi = lazy_import("adbc_driver_manager.dbapi")
+
+
+def _connect(driver: str, db_kwargs: dict):
+    """Open an ADBC connection, timing the handshake as the 'connect' span."""
+    with span("connect", driver=driver):
+        return dbapi.connect(driver=driver, db_kwargs=db_kwargs)
+
+
+def _fetch_arrow_table(cursor):
+    """fetch_arrow_table() with the first batch and the full read timed separately."""
+    return timed_reader(cursor.fetch_record_batch()).read_all()
+
+
+def _postgres_options(batch_size_hint_bytes: int | None, use_copy: bool | None, adaptive: bool | None) -> tuple:
+    """Transfer options left as None fall back to the [postgres] section of secrets.toml."""
+    postgres = get_config().postgres
+    return (
+        postgres.batch_size_hint_bytes if batch_size_hint_bytes is None else batch_size_hint_bytes,
+        postgres.use_copy if use_copy is None else use_copy,
+        postgres.adaptive_batching if adaptive is None else adaptive,
+    )
+
+
+def _bigquery_reader(cursor, query: str, parallel: bool | None, max_streams: int | None):
+    """
+    Execute a BigQuery query and return its result stream, read over parallel
+    Storage Read API streams when asked; None falls back to [bigquery]
+    parallel_read and max_streams.
+    """
+    settings = get_config().bigquery
+    if not (settings.parallel_read if parallel is None else parallel):
+        with span("execute"):
+            cursor.execute(query)
+        return cursor.fetch_record_batch()
+    return read_parallel(cursor, query, max_streams or settings.max_streams, settings.buffer_batches)
+
+
+def _maybe_optimize(result: QueryResult, optimize: bool) -> QueryResult:
+    """Shrink a fetched result in memory when asked, timed as the 'optimize' span."""
+    if not optimize:
+        return result
+    with span("optimize") as optimize_span:
+        result = optimize_result(result)
+        if optimize_span is not None:
+            optimize_span.attributes.update(
+                before_bytes=result.optimization["before_bytes"], after_bytes=result.optimization["after_bytes"]
+            )
+    return result
+
+
+def _ingest_and_count(
+    db_path: str,
+    local_table_name: str,
+    reader,
+    mode: str = "create",
+    primary_key: list[str] | None = None,
+    delete_missing: bool = False,
+    casts: dict | None = None,
+    validator=None,
+) -> int:
+    """
+    Ingest a record batch stream into the shared local DuckDB database
+    (committed as one transaction) and return the table's row count.
+
+    The stream's schema is reconciled with the target table first: planned
+    casts are applied batch by batch and new or wider columns are added to
+    the table in the ingest's transaction, so a failed write leaves the
+    table's schema unchanged too. Incompatible changes raise
+    SchemaMismatchError before any data is written. A StreamValidator, if given, checks the cast
+    batches on their way in; in strict mode a broken rule rolls the write
+    back and raises its ValidationError.
+    """
+    local_table_name = identifier(local_table_name)
+    database = get_database(db_path)
+    with span("schema") as schema_span:
+        plan = reconcile(database, local_table_name, reader.schema, mode, casts)
+        if schema_span is not None:
+            schema_span.attributes.update({k: v for k, v in plan.summary().items() if v})
+    reader = plan.cast_reader(reader)
+    if validator is not None:
+        reader = validator.wrap(reader)
+
+    def before_write(cursor):
+        plan.alter_target(cursor)
+        # Whatever the table mirrored before, it doesn't once this write commits;
+        # _record_copy records it again after a full copy
+        forget_mirror(cursor, local_table_name)
+
+    with span("ingest", table=local_table_name, mode=mode) as ingest_span:
+        try:
+            merged = database.ingest(local_table_name, timed_reader(reader), mode, primary_key, delete_missing, before_write=before_write)
+        except Exception as e:
+            # DuckDB reports it as a failed scan; raise the validation failure itself
+            if validator is not None and validator.error is not None:
+                raise validator.error from e
+            raise
+        finally:
+            if ingest_span is not None and validator is not None and validator.report is not None:
+                add_span(Span("validate", ingest_span.offset, validator.report.seconds, validator.report.summary()))
+        if ingest_span is not None:
+            ingest_span.attributes.update(merged)
+
+    with span("count"):
+        count_result = database.cursor().execute(f"SELECT COUNT(*) FROM {local_table_name}").fetchall()
+    return count_result[0][0] if count_result else 0
+
+
+def _record_copy(
+    db_path: str,
+    local_table_name: str,
+    source: str,
+    source_table: str,
+    rows: int,
+    mode: str,
+    delete_missing: bool,
+    started_at: float,
+):
+    """
+    Record the local table as a mirror of the source table (for functions.routing),
+    unless the write left rows the source doesn't have (append, or merge
+    without delete_missing). The ingest already dropped any earlier record
+    of the table in its own transaction, so such writes leave it unrecorded.
+
+    `started_at` (time.time()) is taken before the source is read, so the
+    mirror's age includes the transfer time.
+    """
+    if mode == "append" or (mode == "merge" and not delete_missing):
+        return
+    with span("record_mirror"):
+        record_mirror(db_path, local_table_name, source, source_table, rows, started_at)
+
+
+def _reconciles(validator) -> bool:
+    return validator is not None and validator.rules.reconcile_count
+
+
+def _count_source(cursor, table_sql: str, validator, consistent: bool = False):
+    """
+    Take the source's COUNT(*) before the stream starts, when the validator
+    reconciles row counts. `consistent` says the count runs in the stream's
+    own snapshot, so a mismatch fails the stream rather than warning.
+    """
+    if not _reconciles(validator):
+        return
+    with span("source_count", consistent=consistent):
+        cursor.execute(f"SELECT count(*) FROM {table_sql}")
+        validator.expected_rows = cursor.fetchone()[0]
+    validator.count_consistent = consistent
+
+
+def _postgres_snapshot(conn, cursor, validator):
+    """
+    Start a fresh REPEATABLE READ transaction on a (non-autocommit) Postgres
+    connection when the count is reconciled, so the count and the stream's
+    SELECT read the same snapshot.
+    """
+    if _reconciles(validator):
+        conn.rollback()
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+
+
+@contextlib.contextmanager
+def _duckdb_snapshot(cursor, validator):
+    """
+    Hold one transaction open on an autocommit DuckDB (MotherDuck) connection
+    while the source is counted and streamed, when the count is reconciled.
+    DuckDB transactions read one snapshot, so both see the same rows.
+    """
+    if not _reconciles(validator):
+        yield
+        return
+    cursor.execute("BEGIN TRANSACTION")
+    try:
+        yield
+    except BaseException:
+        # Don't hide the stream's error behind a failed rollback
+        with contextlib.suppress(Exception):
+            cursor.execute("ROLLBACK")
+        raise
+    cursor.execute("ROLLBACK")
+
+
+def _precheck_schema(conn, table_name: str, db_path: str, local_table_name: str, mode: str, casts: dict | None, **filters):
+    """
+    Before running the source query, check the source table's schema
+    (adbc_get_table_schema) against the existing local table, so an
+    incompatible append or merge fails before any data is transferred.
+    """
+    if mode not in ("append", "merge"):
+        return
+    try:
+        with span("get_table_schema"):
+            source_schema = conn.adbc_get_table_schema(table_name, **filters)
+    except dbapi.Error:
+        # The driver can't describe the table; the stream's own schema is still checked before ingest
+        return
+    reconcile(get_database(db_path), local_table_name, source_schema, mode, casts)
 
 ########################
 # Postgres functions
 ########################
 
-def pg_select_data(secret: str, table_name: str, row_limit: int):
+@traced
+def pg_select_data(
+    secret: str,
+    table_name: str,
+    row_limit: int,
+    batch_size_hint_bytes: int | None = None,
+    use_copy: bool | None = None,
+    adaptive: bool | None = None,
+    optimize: bool = False,
+):
     """
-    Connect to PostgreSQL using ADBC, open a cursor, 
-    and execute SELECT ALL on streaming_data table.
+    Run SELECT ALL on a PostgreSQL table over a pooled ADBC connection.
+
+    The query is prepared once per pooled connection and reused by later
+    calls with the same table and limit.
+    
+    Args:
+        secret (str): Key of the connection string in secrets.toml
+        table_name (str): The name of the table to query
+        row_limit (int): Maximum number of rows to return
+        batch_size_hint_bytes (int): Target Arrow batch size; None uses [postgres] batch_size_hint_mb
+        use_copy (bool): Transfer the result with binary COPY; None uses [postgres] use_copy
+        adaptive (bool): Tune the batch size per table from earlier reads; None uses [postgres] adaptive_batching
+        optimize (bool): Dictionary-encode and downcast the result, see functions.optimize
     
     Returns:
-        tuple: (column_names, results) where column_names is a list of column names
-               and results is a list of tuples containing the row data.
+        QueryResult: The Arrow result; column names are available as result.column_names.
     """
-    with (
-        dbapi.connect(
-            driver="postgresql",
-            db_kwargs={"uri": secrets[secret]},
-        ) as postgres_conn,
-        postgres_conn.cursor() as pg_cursor
-    ):
-        # Execute SELECT ALL query on streaming_data table
-        pg_cursor.execute(f"SELECT * FROM {table_name} LIMIT {row_limit}")
-        
-        # Get column names from cursor description
-        column_names = [desc[0] for desc in pg_cursor.description]
+    # The limit is inlined as an integer: with a bound parameter the driver can't use COPY
+    query = f"SELECT * FROM {identifier(table_name)} LIMIT {int(row_limit)}"
+    pool = get_pool("postgresql", get_config().postgres_db_kwargs(secret))
+    with pool.connection() as pooled:
+        # Execute SELECT ALL query on the prepared statement
+        reader = postgres_reader(
+            pooled.prepared(query),
+            query,
+            table_name,
+            *_postgres_options(batch_size_hint_bytes, use_copy, adaptive),
+        )
         
         # Fetch all results
-        results = pg_cursor.fetch_arrow_table()
+        results = timed_reader(reader).read_all()
         
-        return column_names, results
+    return _maybe_optimize(QueryResult(results, source="postgres"), optimize)
 
 
 ########################
 # MotherDuck functions
 ########################
 
-# Get and print the MotherDuck token
+@traced
 def md_select_data(database_name: str, table_name: str, row_limit: int):
-    with dbapi.connect(
-        driver="duckdb",
-        db_kwargs={
-            "path": f"md:{database_name}"
-        }
-    ) as con, con.cursor() as md_cursor:
-        # Get the token
-        md_cursor.execute("PRAGMA PRINT_MD_TOKEN;")
-        token_result = md_cursor.fetch_arrow_table()
-        print("Your MotherDuck token:")
-        print(token_result)
-        
-        # Now run your actual query
-        md_cursor.execute(f"SELECT * FROM {database_name}.{table_name} LIMIT {row_limit};")
+    """
+    Select rows from a MotherDuck table over a cached, already authenticated session.
+
+    Args:
+        database_name (str): MotherDuck database; empty for the default database
+        table_name (str): The name of the table to query
+        row_limit (int): Maximum number of rows to return
+
+    Returns:
+        QueryResult: Arrow result of the query
+    """
+    query = f"SELECT * FROM {motherduck_table(database_name, table_name)} LIMIT $1"
+    with motherduck_pool(database_name).connection() as pooled:
+        # One round trip: the query, prepared once per pooled connection
+        md_cursor = pooled.execute(query, [int(row_limit)])
         
         # Fetch all data as arrow table
-        table = md_cursor.fetch_arrow_table()
+        table = _fetch_arrow_table(md_cursor)
         
-        # Return both token_result and table
-        return token_result, table
+    return QueryResult(table, source="motherduck")
+
+
+@traced
+def md_token_status(database_name: str = "") -> dict:
+    """
+    Diagnostic: check that the MotherDuck session is authenticated.
+
+    Runs PRAGMA PRINT_MD_TOKEN on a pooled session. Only a masked form of
+    the token is returned and nothing is printed, so the credential never
+    reaches logs.
+
+    Returns:
+        dict: "authenticated" and the token masked to its first and last 4 characters
+    """
+    with motherduck_pool(database_name).connection() as pooled, pooled.conn.cursor() as cursor:
+        with span("token"):
+            cursor.execute("PRAGMA PRINT_MD_TOKEN;")
+            row = cursor.fetchone()
+    token = row[0] if row and row[0] else ""
+    masked = f"{token[:4]}...{token[-4:]}" if len(token) > 16 else "***" if token else ""
+    return {"authenticated": bool(token), "token": masked}
 
 ########################
 # DuckDB functions
 ########################
 
-def duckdb_select_data(table_name: str, row_limit: int):
+@traced
+def duckdb_select_data(table_name: str, row_limit: int, db_path: str | None = None):
     """
-    Connect to DuckDB and execute SELECT query on specified table.
+    Execute SELECT query on specified table of the local DuckDB database.
     
     Args:
         table_name (str): The name of the table to query
         row_limit (int): Maximum number of rows to return
+        db_path (str): DuckDB file to read; defaults to [duckdb] database in secrets.toml
     
     Returns:
-        Arrow table containing the query results
+        QueryResult: Arrow result of the query
     """
-    with dbapi.connect(
-        driver="duckdb",
-        db_kwargs={"path": ":memory:"}
-    ) as con, con.cursor() as cursor:
-        cursor.execute(f"SELECT * FROM {table_name} LIMIT {row_limit};")
-        table = cursor.fetch_arrow_table()
-        return table
+    database = get_database(db_path or get_config().duckdb.database)
+    cursor = database.cursor()
+    with span("execute"):
+        cursor.execute(f"SELECT * FROM {identifier(table_name)} LIMIT $1", [int(row_limit)])
+    table = timed_reader(cursor.fetch_record_batch()).read_all()
+    return QueryResult(table, source="duckdb")
 
 ########################
 # BigQuery functions
 ########################
 
 
-def bigquery_select_data(row_limit: int = 5):
+@traced
+def bigquery_select_data(
+    row_limit: int = 5,
+    optimize: bool = False,
+    parallel: bool | None = None,
+    max_streams: int | None = None,
+):
     """
     Query BigQuery using credentials from secrets.toml.
 
     Args:
         row_limit (int): Maximum number of rows to return
+        optimize (bool): Dictionary-encode and downcast the result, see functions.optimize
+        parallel (bool): Read the result over parallel streams; None uses [bigquery] parallel_read
+        max_streams (int): Streams read at once in parallel mode; None uses [bigquery] max_streams
 
     Returns:
-        Arrow table containing the query results
+        QueryResult: Arrow result of the query
     """
-    # Load BigQuery credentials from secrets.toml
-    with open("secrets.toml", "rb") as f:
-        secrets = tomllib.load(f)
-    project_id = secrets["project_id"]
-    dataset_id = secrets["dataset_id"]
-    table_id = secrets["table_id"]
-
-    with dbapi.connect(
-        driver="bigquery",
-        db_kwargs={
+    bigquery = get_config().bigquery
+    project_id, dataset_id, table_id = bigquery.project_id, bigquery.dataset_id, bigquery.table_id
+
+    with _connect(
+        "bigquery",
+        {
             "adbc.bigquery.sql.project_id": project_id,
             "adbc.bigquery.sql.dataset_id": dataset_id
         },
     ) as con, con.cursor() as cursor:
-        cursor.execute(f"""
-          SELECT * FROM `{project_id}.{dataset_id}.{table_id}` LIMIT {row_limit};
-        """)
-        table = cursor.fetch_arrow_table()
+        reader = _bigquery_reader(
+            cursor,
+            f"SELECT * FROM {bigquery_table(project_id, dataset_id, table_id)} LIMIT {int(row_limit)}",
+            parallel,
+            max_streams,
+        )
+        table = timed_reader(reader).read_all()
 
-    return table
+    return _maybe_optimize(QueryResult(table, source="bigquery"), optimize)
 
 
 ########################
 # Streaming to Local DuckDB
 ########################
 
-def stream_postgres_to_duckdb(db_path: str, table_name: str, local_table_name: str):
+@traced
+def stream_postgres_to_duckdb(
+    db_path: str,
+    table_name: str,
+    local_table_name: str,
+    batch_size_hint_bytes: int | None = None,
+    use_copy: bool | None = None,
+    adaptive: bool | None = None,
+    mode: str = "create",
+    primary_key: list[str] | None = None,
+    delete_missing: bool = False,
+    casts: dict | None = None,
+    validator=None,
+):
     """
-    Stream data from PostgreSQL directly to local DuckDB using ADBC ingest.
+    Stream data from PostgreSQL directly to local DuckDB.
     
     Args:
         db_path (str): Path to the local DuckDB database file
         table_name (str): Table name in PostgreSQL to stream
         local_table_name (str): Name of the table to create in DuckDB
+        batch_size_hint_bytes (int): Target Arrow batch size; None uses [postgres] batch_size_hint_mb, else
+            a size planned from the table's statistics ([profiling] auto_plan)
+        use_copy (bool): Transfer the result with binary COPY; None uses [postgres] use_copy
+        adaptive (bool): Tune the batch size per table from earlier streams; None uses [postgres] adaptive_batching
+        mode (str): "create", "append", "replace", "merge" or "swap" (build, verify, then rename over) into local_table_name
+        primary_key (list[str]): Key columns for merge mode
+        delete_missing (bool): In merge mode, delete local rows missing from the source
+        casts (dict): Column name -> Arrow type casts applied to the stream
+        validator (StreamValidator): Checks the stream against ValidationRules; its report is set when the stream ends
     
     Returns:
         int: Total number of rows written
@@ -143,131 +422,161 @@ def stream_postgres_to_duckdb(db_path: str, table_name: str, local_table_name: s
     total_rows = 0
     
     with (
-        dbapi.connect(
-            driver="postgresql",
-            db_kwargs={"uri": secrets["postgres_connection_string"]},
-        ) as pg_conn,
+        _connect("postgresql", get_config().postgres.db_kwargs()) as pg_conn,
         pg_conn.cursor() as pg_cursor,
-        dbapi.connect(
-            driver="duckdb",
-            db_kwargs={"path": db_path},
-        ) as duck_conn,
-        duck_conn.cursor() as duck_cursor,
     ):
-        # Execute query on PostgreSQL
-        pg_cursor.execute(f"SELECT * FROM {table_name}")
-        
-        # Fetch record batch from PostgreSQL
-        reader = pg_cursor.fetch_record_batch()
-        
-        # Ingest directly into DuckDB
-        duck_cursor.adbc_ingest(local_table_name, reader)
-        
-        # Commit the transaction
-        duck_conn.commit()
+        _precheck_schema(pg_conn, table_name, db_path, local_table_name, mode, casts)
+
+        # The copy holds the source as of its snapshot, taken from here on
+        started_at = time.time()
+        _postgres_snapshot(pg_conn, pg_cursor, validator)
+        _count_source(pg_cursor, identifier(table_name), validator, consistent=True)
+
+        # With no batch size configured, size batches from the table's statistics
+        hint, use_copy, adaptive = _postgres_options(batch_size_hint_bytes, use_copy, adaptive)
+        if hint is None:
+            hint = planned_postgres_batch_size(table_name)
+
+        # Execute query on PostgreSQL and get its record batch stream
+        reader = postgres_reader(pg_cursor, f"SELECT * FROM {identifier(table_name)}", table_name, hint, use_copy, adaptive)
         
-        # Get row count
-        duck_cursor.execute(f"SELECT COUNT(*) FROM {local_table_name}")
-        count_result = duck_cursor.fetchall()
-        total_rows = count_result[0][0] if count_result else 0
+        # Ingest into DuckDB, commit and count the rows written
+        total_rows = _ingest_and_count(db_path, local_table_name, reader, mode, primary_key, delete_missing, casts, validator)
+        _record_copy(db_path, local_table_name, "postgres", table_name, total_rows, mode, delete_missing, started_at)
     
     return total_rows
 
 
-def stream_motherduck_to_duckdb(db_path: str, database_name: str, table_name: str, local_table_name: str):
+@traced
+def stream_motherduck_to_duckdb(
+    db_path: str,
+    database_name: str,
+    table_name: str,
+    local_table_name: str,
+    mode: str = "create",
+    primary_key: list[str] | None = None,
+    delete_missing: bool = False,
+    casts: dict | None = None,
+    validator=None,
+):
     """
-    Stream data from MotherDuck directly to local DuckDB using ADBC ingest.
+    Stream data from MotherDuck directly to local DuckDB.
     
     Args:
         db_path (str): Path to the local DuckDB database file
         database_name (str): MotherDuck database name
         table_name (str): Table name in MotherDuck to stream
         local_table_name (str): Name of the table to create in DuckDB
+        mode (str): "create", "append", "replace", "merge" or "swap" (build, verify, then rename over) into local_table_name
+        primary_key (list[str]): Key columns for merge mode
+        delete_missing (bool): In merge mode, delete local rows missing from the source
+        casts (dict): Column name -> Arrow type casts applied to the stream
+        validator (StreamValidator): Checks the stream against ValidationRules; its report is set when the stream ends
     
     Returns:
         int: Total number of rows written
     """
     total_rows = 0
-    
+    # The copy holds the source as of its snapshot, taken after this
+    started_at = time.time()
+
     with (
-        dbapi.connect(
-            driver="duckdb",
-            db_kwargs={"path": f"md:{database_name}"}
-        ) as md_conn,
-        md_conn.cursor() as md_cursor,
-        dbapi.connect(
-            driver="duckdb",
-            db_kwargs={"path": db_path},
-        ) as duck_conn,
-        duck_conn.cursor() as duck_cursor,
+        motherduck_pool(database_name).connection() as pooled,
+        pooled.conn.cursor() as md_cursor,
+        _duckdb_snapshot(md_cursor, validator),
     ):
+        _precheck_schema(pooled.conn, table_name, db_path, local_table_name, mode, casts, catalog_filter=database_name or None)
+
+        _count_source(md_cursor, motherduck_table(database_name, table_name), validator, consistent=True)
+
         # Execute query on MotherDuck
-        md_cursor.execute(f"SELECT * FROM {database_name}.{table_name}")
+        with span("execute"):
+            md_cursor.execute(f"SELECT * FROM {motherduck_table(database_name, table_name)}")
         
         # Fetch record batch from MotherDuck
         reader = md_cursor.fetch_record_batch()
         
-        # Ingest directly into local DuckDB
-        duck_cursor.adbc_ingest(local_table_name, reader)
-        
-        # Commit the transaction
-        duck_conn.commit()
-        
-        # Get row count
-        duck_cursor.execute(f"SELECT COUNT(*) FROM {local_table_name}")
-        count_result = duck_cursor.fetchall()
-        total_rows = count_result[0][0] if count_result else 0
+        # Ingest into DuckDB, commit and count the rows written
+        total_rows = _ingest_and_count(db_path, local_table_name, reader, mode, primary_key, delete_missing, casts, validator)
+        _record_copy(
+            db_path, local_table_name, "motherduck", motherduck_table(database_name, table_name),
+            total_rows, mode, delete_missing, started_at,
+        )
     
     return total_rows
 
 
-def stream_bigquery_to_duckdb(db_path: str, local_table_name: str):
+@traced
+def stream_bigquery_to_duckdb(
+    db_path: str,
+    local_table_name: str,
+    mode: str = "create",
+    primary_key: list[str] | None = None,
+    delete_missing: bool = False,
+    casts: dict | None = None,
+    parallel: bool | None = None,
+    max_streams: int | None = None,
+    validator=None,
+):
     """
-    Stream data from BigQuery directly to local DuckDB using ADBC ingest.
+    Stream data from BigQuery directly to local DuckDB.
+
+    In parallel mode the table is read over several Storage Read API streams
+    at once, merged into the single DuckDB ingest as batches arrive.
     
     Args:
         db_path (str): Path to the local DuckDB database file
         local_table_name (str): Name of the table to create in DuckDB
+        mode (str): "create", "append", "replace", "merge" or "swap" (build, verify, then rename over) into local_table_name
+        primary_key (list[str]): Key columns for merge mode
+        delete_missing (bool): In merge mode, delete local rows missing from the source
+        casts (dict): Column name -> Arrow type casts applied to the stream
+        validator (StreamValidator): Checks the stream against ValidationRules; its report is set when the stream ends
+        parallel (bool): Read over parallel streams; None uses [bigquery] parallel_read, or
+            turns them on when the planned stream count is above one
+        max_streams (int): Streams read at once in parallel mode; None plans them from the table
+            size ([profiling] auto_plan), capped at [bigquery] max_streams
     
     Returns:
         int: Total number of rows written
     """
-    project_id = secrets["project_id"]
-    dataset_id = secrets["dataset_id"]
-    table_id = secrets["table_id"]
+    bigquery = get_config().bigquery
+    project_id, dataset_id, table_id = bigquery.project_id, bigquery.dataset_id, bigquery.table_id
     
     total_rows = 0
     
     with (
-        dbapi.connect(
-            driver="bigquery",
-            db_kwargs={
+        _connect(
+            "bigquery",
+            {
                 "adbc.bigquery.sql.project_id": project_id,
                 "adbc.bigquery.sql.dataset_id": dataset_id
             },
         ) as bq_conn,
         bq_conn.cursor() as bq_cursor,
-        dbapi.connect(
-            driver="duckdb",
-            db_kwargs={"path": db_path},
-        ) as duck_conn,
-        duck_conn.cursor() as duck_cursor,
     ):
-        # Execute query on BigQuery
-        bq_cursor.execute(f"SELECT * FROM `{project_id}.{dataset_id}.{table_id}`")
-        
-        # Fetch record batch from BigQuery
-        reader = bq_cursor.fetch_record_batch()
-        
-        # Ingest directly into local DuckDB
-        duck_cursor.adbc_ingest(local_table_name, reader)
-        
-        # Commit the transaction
-        duck_conn.commit()
+        _precheck_schema(bq_conn, table_id, db_path, local_table_name, mode, casts, db_schema_filter=dataset_id)
+
+        # Taken before the count and the query, so the copy is never newer than recorded
+        started_at = time.time()
+        _count_source(bq_cursor, bigquery_table(project_id, dataset_id, table_id), validator)
+
+        # With no stream count given, read as many streams as the table's size calls for
+        if max_streams is None:
+            max_streams = planned_bigquery_streams(bigquery.max_streams)
+            if parallel is None and max_streams is not None:
+                parallel = bigquery.parallel_read or max_streams > 1
+
+        # Execute query on BigQuery and get its (possibly merged) record batch stream
+        reader = _bigquery_reader(
+            bq_cursor, f"SELECT * FROM {bigquery_table(project_id, dataset_id, table_id)}", parallel, max_streams
+        )
         
-        # Get row count
-        duck_cursor.execute(f"SELECT COUNT(*) FROM {local_table_name}")
-        count_result = duck_cursor.fetchall()
-        total_rows = count_result[0][0] if count_result else 0
+        # Ingest into DuckDB, commit and count the rows written
+        total_rows = _ingest_and_count(db_path, local_table_name, reader, mode, primary_key, delete_missing, casts, validator)
+        _record_copy(
+            db_path, local_table_name, "bigquery", f"{project_id}.{dataset_id}.{table_id}",
+            total_rows, mode, delete_missing, started_at,
+        )
     
     return total_rows
\ No newline at end of file
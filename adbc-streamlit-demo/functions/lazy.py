@@ -0,0 +1,29 @@
+import importlib
+import sys
+import types
+
+
+class _LazyModule(types.ModuleType):
+    """Stand-in bound in place of a module; imports it on first attribute access."""
+
+    def __getattr__(self, attr):
+        # Only called for attributes not set yet, i.e. until the first access
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Return a module that is only imported on first attribute access.
+
+    adbc_driver_manager.dbapi pulls in pyarrow.dataset, pandas and polars
+    (over half a second), and duckdb and pyarrow.compute add more, while
+    most page loads never open a connection. Modules bound with this are
+    imported when a source is first used instead of when a page is imported.
+
+    The stand-in is not registered in sys.modules, so tools that scan every
+    loaded module (inspect.getmodule, Streamlit's file watcher) don't
+    trigger the import; an already imported module is returned as is.
+    """
+    return sys.modules.get(name) or _LazyModule(name)
@@ -0,0 +1,121 @@
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from functions.lazy import lazy_import
+from functions.results import QueryResult
+
+pc = lazy_import("pyarrow.compute")
+
+# Dictionary-encode string columns with at most this share of distinct values...
+DICTIONARY_THRESHOLD = 0.5
+# ...and at most this many distinct values
+MAX_DICTIONARY_SIZE = 65_536
+
+_SIGNED = [pa.int8(), pa.int16(), pa.int32(), pa.int64()]
+_UNSIGNED = [pa.uint8(), pa.uint16(), pa.uint32(), pa.uint64()]
+
+
+########################
+# Column optimizations
+########################
+
+def _is_string(t: pa.DataType) -> bool:
+    return pa.types.is_string(t) or pa.types.is_large_string(t)
+
+
+def _smallest_integer(column: pa.ChunkedArray) -> pa.DataType | None:
+    """The narrowest integer type of the same signedness that holds every value, if narrower."""
+    bounds = pc.min_max(column).as_py()
+    if bounds["min"] is None:
+        return None
+    for candidate in (_SIGNED if pa.types.is_signed_integer(column.type) else _UNSIGNED):
+        if candidate.bit_width >= column.type.bit_width:
+            return None
+        low, high = _integer_range(candidate)
+        if low <= bounds["min"] and bounds["max"] <= high:
+            return candidate
+    return None
+
+
+def _integer_range(t: pa.DataType) -> tuple[int, int]:
+    if pa.types.is_signed_integer(t):
+        return -(1 << (t.bit_width - 1)), (1 << (t.bit_width - 1)) - 1
+    return 0, (1 << t.bit_width) - 1
+
+
+def optimize_table(
+    table: pa.Table,
+    dictionary_threshold: float = DICTIONARY_THRESHOLD,
+    max_dictionary_size: int = MAX_DICTIONARY_SIZE,
+    downcast_integers: bool = True,
+) -> tuple[pa.Table, dict]:
+    """
+    Shrink a fetched table in memory.
+
+    Low-cardinality string columns are dictionary-encoded (one dictionary
+    per column, so the table can still be written to an Arrow IPC file), and
+    integer columns are downcast to the narrowest type of the same
+    signedness that holds their actual min and max.
+
+    Args:
+        table (pa.Table): Table to optimize
+        dictionary_threshold (float): Max distinct/rows ratio for dictionary encoding
+        max_dictionary_size (int): Max distinct values for dictionary encoding
+        downcast_integers (bool): Narrow integer columns when safe
+
+    Returns:
+        tuple[pa.Table, dict]: The optimized table and a report with
+            before/after bytes and what happened to each column
+    """
+    columns, changes = [], {}
+    for field, column in zip(table.schema, table.columns):
+        new = column
+        if _is_string(field.type) and table.num_rows:
+            distinct = pc.count_distinct(column, mode="all").as_py()
+            if distinct <= max_dictionary_size and distinct / table.num_rows <= dictionary_threshold:
+                new = pc.dictionary_encode(column)
+                changes[field.name] = f"dictionary ({distinct:,} values)"
+        elif downcast_integers and pa.types.is_integer(field.type):
+            narrow = _smallest_integer(column)
+            if narrow is not None:
+                new = column.cast(narrow)
+                changes[field.name] = f"{field.type} -> {narrow}"
+        columns.append(new)
+
+    optimized = pa.Table.from_arrays(
+        columns,
+        schema=pa.schema(
+            [pa.field(f.name, c.type, f.nullable, f.metadata) for f, c in zip(table.schema, columns)],
+            metadata=table.schema.metadata,
+        ),
+    )
+    if changes:
+        optimized = optimized.unify_dictionaries()
+    report = {
+        "before_bytes": table.nbytes,
+        "after_bytes": optimized.nbytes,
+        "saved_ratio": round(1 - optimized.nbytes / table.nbytes, 3) if table.nbytes else 0.0,
+        "columns": changes,
+    }
+    return optimized, report
+
+
+def optimize_result(result: QueryResult, **options) -> QueryResult:
+    """optimize_table() for a QueryResult; the report is kept on result.optimization."""
+    table, report = optimize_table(result.to_arrow(), **options)
+    return QueryResult(table, source=result.source, optimization=report)
+
+
+########################
+# IPC compression
+########################
+
+def ipc_write_options(compression: str | None) -> ipc.IpcWriteOptions:
+    """
+    IPC write options for cached/spilled copies: "lz4" (fast), "zstd"
+    (smaller) or None. Falls back to uncompressed if the codec is missing
+    from this pyarrow build.
+    """
+    if compression and compression != "none" and pa.Codec.is_available(compression):
+        return ipc.IpcWriteOptions(compression=compression)
+    return ipc.IpcWriteOptions()
@@ -0,0 +1,233 @@
+import threading
+import time
+from dataclasses import dataclass, field
+
+from functions.lazy import lazy_import
+from functions.tracing import span
+
+dbapi = lazy_import("adbc_driver_manager.dbapi")
+
+# Statement options of the ADBC PostgreSQL driver
+BATCH_SIZE_HINT_OPTION = "adbc.postgresql.batch_size_hint_bytes"
+USE_COPY_OPTION = "adbc.postgresql.use_copy"
+
+MB = 1024 * 1024
+# The driver's own default batch size hint
+DEFAULT_BATCH_SIZE_HINT_BYTES = 16 * MB
+MIN_BATCH_SIZE_HINT_BYTES = 1 * MB
+MAX_BATCH_SIZE_HINT_BYTES = 256 * MB
+# Adaptive mode never shrinks batches below this many rows, however wide they are
+MIN_BATCH_ROWS = 8192
+
+
+########################
+# Statement options
+########################
+
+def configure_statement(cursor, batch_size_hint_bytes: int | None = None, use_copy: bool = True):
+    """
+    Set the Postgres transfer options on a cursor before execute().
+
+    Args:
+        cursor: ADBC PostgreSQL cursor
+        batch_size_hint_bytes (int): Target size of each Arrow batch read from the
+            COPY stream; None keeps the driver default (16 MB)
+        use_copy (bool): Read results with COPY ... TO STDOUT (BINARY). The driver
+            falls back to row-by-row transfer when this is off or the query has
+            bound parameters.
+    """
+    options = {USE_COPY_OPTION: "true" if use_copy else "false"}
+    if batch_size_hint_bytes:
+        options[BATCH_SIZE_HINT_OPTION] = str(int(batch_size_hint_bytes))
+    cursor.adbc_statement.set_options(**options)
+
+
+def verify_copy_transfer(uri: str, query: str, use_copy: bool = True) -> bool:
+    """
+    Check on the server whether a query's result is transferred with COPY.
+
+    Runs the query on one connection and reads that backend's last statement
+    from pg_stat_activity on a second one; the driver wraps the query in
+    COPY (...) TO STDOUT when it uses the binary COPY path.
+
+    Returns:
+        bool: True if the server executed the query as a COPY
+    """
+    with (
+        dbapi.connect(driver="postgresql", db_kwargs={"uri": uri}) as conn,
+        conn.cursor() as cursor,
+        dbapi.connect(driver="postgresql", db_kwargs={"uri": uri}) as monitor,
+        monitor.cursor() as monitor_cursor,
+    ):
+        cursor.execute("SELECT pg_backend_pid()")
+        pid = cursor.fetchone()[0]
+        configure_statement(cursor, use_copy=use_copy)
+        cursor.execute(query)
+        for _ in cursor.fetch_record_batch():
+            pass
+        monitor_cursor.execute(f"SELECT query FROM pg_stat_activity WHERE pid = {int(pid)}")
+        row = monitor_cursor.fetchone()
+    return bool(row) and row[0].lstrip().upper().startswith("COPY")
+
+
+########################
+# Adaptive batch sizing
+########################
+
+@dataclass
+class FetchStats:
+    """What one read of a result stream moved and how fast."""
+    batch_size_hint_bytes: int
+    rows: int = 0
+    batches: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def row_width(self) -> float:
+        return self.bytes / self.rows if self.rows else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+
+@dataclass
+class _TableState:
+    hint: int
+    best_hint: int
+    best_throughput: float = 0.0
+    # Factor applied to the hint for the next probe: 2 grows batches, 0.5 shrinks them
+    step: float = 2.0
+    settled: bool = False
+    tried: set[int] = field(default_factory=set)
+
+
+class BatchSizeTuner:
+    """
+    Tunes the Postgres batch size hint per table from observed reads.
+
+    Each read of a table reports its row width and end-to-end throughput (as
+    seen by the consumer, e.g. DuckDB ingest). The tuner probes doubling the
+    hint while throughput improves, then halving from the best hint, and
+    settles on the best one it found. Reads that fit in a single batch tell
+    nothing about batch size and are ignored.
+    """
+
+    def __init__(
+        self,
+        initial: int = DEFAULT_BATCH_SIZE_HINT_BYTES,
+        minimum: int = MIN_BATCH_SIZE_HINT_BYTES,
+        maximum: int = MAX_BATCH_SIZE_HINT_BYTES,
+    ):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self._tables: dict[str, _TableState] = {}
+        self._lock = threading.Lock()
+
+    def hint(self, key: str, initial: int | None = None) -> int:
+        """Batch size hint to use for the next read of `key`."""
+        with self._lock:
+            state = self._tables.get(key)
+            if state is None:
+                start = self._clamp(initial or self.initial)
+                state = self._tables[key] = _TableState(start, start)
+            return state.hint
+
+    def observe(self, key: str, stats: FetchStats):
+        """Record one read of `key` and pick the hint for the next one."""
+        if stats.batches <= 1 or not stats.seconds:
+            return
+        with self._lock:
+            state = self._tables.setdefault(key, _TableState(stats.batch_size_hint_bytes, stats.batch_size_hint_bytes))
+            throughput = stats.bytes_per_second
+            state.tried.add(stats.batch_size_hint_bytes)
+            if throughput > state.best_throughput:
+                state.best_throughput, state.best_hint = throughput, stats.batch_size_hint_bytes
+            elif state.step > 1:
+                # Growing stopped paying off: probe smaller batches from the best hint
+                state.step = 0.5
+            else:
+                state.settled = True
+            if state.settled:
+                state.hint = state.best_hint
+                return
+
+            # Never go below MIN_BATCH_ROWS rows per batch or above the whole result
+            lower = max(self.minimum, int(stats.row_width * MIN_BATCH_ROWS))
+            upper = max(lower, min(self.maximum, stats.bytes))
+            proposed = int(state.best_hint * state.step)
+            if not lower <= proposed <= upper:
+                if state.step > 1:
+                    state.step = 0.5
+                    proposed = int(state.best_hint * state.step)
+            if not lower <= proposed <= upper or proposed in state.tried:
+                state.settled, proposed = True, state.best_hint
+            state.hint = proposed
+
+    def observe_reader(self, key: str, batch_size_hint_bytes: int, reader):
+        """Wrap a RecordBatchReader so its read is reported to observe() when it finishes."""
+        import pyarrow as pa
+
+        stats = FetchStats(batch_size_hint_bytes)
+
+        def batches():
+            started = time.perf_counter()
+            for batch in reader:
+                stats.rows += batch.num_rows
+                stats.bytes += batch.nbytes
+                stats.batches += 1
+                yield batch
+            stats.seconds = time.perf_counter() - started
+            self.observe(key, stats)
+
+        return pa.RecordBatchReader.from_batches(reader.schema, batches())
+
+    def state(self) -> dict:
+        """Current hint per table, e.g. for display or a benchmark report."""
+        with self._lock:
+            return {
+                key: {"hint_bytes": s.hint, "best_hint_bytes": s.best_hint, "settled": s.settled}
+                for key, s in self._tables.items()
+            }
+
+    def _clamp(self, hint: int) -> int:
+        return max(self.minimum, min(self.maximum, int(hint)))
+
+
+# Shared by every session in the process, so tuning carries over between reruns
+TUNER = BatchSizeTuner()
+
+
+def postgres_reader(
+    cursor,
+    query: str,
+    key: str,
+    batch_size_hint_bytes: int | None = None,
+    use_copy: bool = True,
+    adaptive: bool = False,
+):
+    """
+    Execute a query on a Postgres cursor with the given transfer options and
+    return its RecordBatchReader.
+
+    Args:
+        cursor: ADBC PostgreSQL cursor
+        query (str): Query to run
+        key (str): What adaptive mode tunes for, usually the table name
+        batch_size_hint_bytes (int): Batch size hint; in adaptive mode only the starting point
+        use_copy (bool): Transfer the result with binary COPY
+        adaptive (bool): Let TUNER pick the batch size hint from earlier reads of `key`
+
+    Returns:
+        pyarrow.RecordBatchReader: The result stream
+    """
+    hint = TUNER.hint(key, batch_size_hint_bytes) if adaptive else batch_size_hint_bytes
+    configure_statement(cursor, hint, use_copy)
+    with span("execute", batch_size_hint_bytes=hint or DEFAULT_BATCH_SIZE_HINT_BYTES, use_copy=use_copy):
+        cursor.execute(query)
+    reader = cursor.fetch_record_batch()
+    if adaptive:
+        reader = TUNER.observe_reader(key, hint, reader)
+    return reader
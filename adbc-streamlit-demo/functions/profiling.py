@@ -0,0 +1,387 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+
+from functions.config import get_config
+from functions.duckdb_manager import get_database
+from functions.lazy import lazy_import
+from functions.pg_batching import MAX_BATCH_SIZE_HINT_BYTES, MIN_BATCH_SIZE_HINT_BYTES
+from functions.routing import motherduck_pool, motherduck_table
+from functions.statements import bigquery_table, get_pool, identifier
+from functions.tracing import span, traced
+
+dbapi = lazy_import("adbc_driver_manager.dbapi")
+
+# Rows per Arrow batch a planned Postgres batch size aims for
+TARGET_BATCH_ROWS = 131_072
+# Planned batches are at most 1/8 of the table, so fetching and ingesting overlap
+MIN_BATCHES_PER_TABLE = 8
+# Rows given to each parallel export writer
+ROWS_PER_EXPORT_PARTITION = 1_000_000
+# Bytes given to each parallel BigQuery read stream
+BYTES_PER_READ_STREAM = 256 * 1024 * 1024
+# Profiles kept in the cache; the least recently used are dropped first
+MAX_PROFILES = 256
+
+
+@dataclass
+class ColumnProfile:
+    name: str
+    # Share of rows that are null; None when the database has no statistics for the column
+    null_fraction: float | None = None
+    distinct_estimate: int | None = None
+    # Average stored width in bytes (Postgres statistics)
+    avg_width: int | None = None
+
+
+@dataclass
+class TableProfile:
+    """Size and column statistics of a table, from the database's own statistics or approximate aggregates."""
+    source: str
+    table: str
+    row_estimate: int | None
+    size_bytes: int | None = None
+    # None when only table metadata was gathered
+    columns: list[ColumnProfile] | None = None
+    # Where the numbers came from, e.g. "pg_class + pg_stats"
+    method: str = ""
+    # Share of rows the column statistics were computed from, when sampled
+    sample_fraction: float | None = None
+    profiled_at: float = field(default_factory=time.time)
+
+    @property
+    def row_width(self) -> float | None:
+        """Bytes per row, from the column widths or else the table size."""
+        if self.columns and all(c.avg_width is not None for c in self.columns):
+            return float(sum(c.avg_width for c in self.columns))
+        if self.size_bytes and self.row_estimate:
+            return self.size_bytes / self.row_estimate
+        return None
+
+    def column_rows(self) -> list[dict]:
+        """Column statistics for display, e.g. in st.dataframe."""
+        return [asdict(c) for c in self.columns or []]
+
+
+########################
+# Cache
+########################
+
+_profiles: "OrderedDict[tuple, TableProfile]" = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def _cached(key: tuple, columns: bool, refresh: bool, gather) -> TableProfile:
+    """
+    Return the cached profile for `key` while it is younger than
+    [profiling] cache_ttl_seconds (and has column statistics if asked
+    for), else gather and cache a new one.
+    """
+    ttl = get_config(required=False).profiling.cache_ttl_seconds
+    with _profiles_lock:
+        profile = _profiles.get(key)
+        fresh = (
+            profile is not None
+            and not refresh
+            and time.time() - profile.profiled_at <= ttl
+            and (profile.columns is not None or not columns)
+        )
+        if fresh:
+            _profiles.move_to_end(key)
+    with span("profile", cached=fresh):
+        if not fresh:
+            profile = gather()
+            with _profiles_lock:
+                _profiles[key] = profile
+                while len(_profiles) > MAX_PROFILES:
+                    _profiles.popitem(last=False)
+    return profile
+
+
+def clear_profiles():
+    with _profiles_lock:
+        _profiles.clear()
+
+
+########################
+# Gathering profiles
+########################
+
+@traced
+def profile_postgres(table_name: str, secret: str = "postgres_connection_string", refresh: bool = False) -> TableProfile:
+    """
+    Profile a Postgres table from the planner statistics, without scanning it.
+
+    The row estimate is pg_class.reltuples and the size pg_table_size; null
+    fractions, distinct counts and widths come from pg_stats. They are as
+    fresh as the table's last ANALYZE (or autovacuum), and None for a table
+    that was never analyzed.
+
+    Args:
+        table_name (str): Table, optionally schema-qualified
+        secret (str): Key of the Postgres connection string in secrets.toml
+        refresh (bool): Gather the statistics again even if cached
+    """
+    table_name = identifier(table_name)
+
+    def gather():
+        with get_pool("postgresql", get_config().postgres_db_kwargs(secret)).connection() as pooled:
+            with span("table_stats"):
+                row = pooled.execute(
+                    "SELECT c.reltuples::bigint, pg_table_size(c.oid) FROM pg_class c WHERE c.oid = to_regclass($1)",
+                    [table_name],
+                ).fetchone()
+            if row is None:
+                raise ValueError(f"Table '{table_name}' not found in Postgres")
+            with span("column_stats"):
+                stats = pooled.execute(
+                    "SELECT a.attname, s.null_frac, s.n_distinct, s.avg_width FROM pg_class c "
+                    "JOIN pg_namespace n ON n.oid = c.relnamespace "
+                    "JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped "
+                    "LEFT JOIN pg_stats s ON s.schemaname = n.nspname AND s.tablename = c.relname "
+                    "AND s.attname = a.attname AND s.inherited = (c.relkind = 'p') "
+                    "WHERE c.oid = to_regclass($1) ORDER BY a.attnum",
+                    [table_name],
+                ).fetchall()
+        # -1 (or 0 before Postgres 14) until the table is first analyzed
+        rows = row[0] if row[0] and row[0] > 0 else None
+        columns = []
+        for name, null_frac, n_distinct, avg_width in stats:
+            # Negative n_distinct is a fraction of the rows, for columns that grow with the table
+            if n_distinct is not None and n_distinct < 0:
+                n_distinct = round(-n_distinct * rows) if rows else None
+            columns.append(ColumnProfile(name, null_frac, int(n_distinct) if n_distinct else None, avg_width))
+        return TableProfile("postgres", table_name, rows, row[1], columns, "pg_class + pg_stats")
+
+    return _cached(("postgres", secret, table_name), True, refresh, gather)
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _profile_duckdb_table(query, source: str, table_ref: str, table_name: str, columns: bool) -> TableProfile:
+    """
+    Profile a table on a DuckDB connection (local or MotherDuck) with
+    `query(sql, parameters) -> rows`. The row estimate comes from
+    duckdb_tables(); column statistics, if asked for, from one pass of
+    count() and approx_count_distinct() per column run by the database.
+    """
+    parts = table_name.split(".")
+    conditions, parameters = ["table_name = $1", "database_name = current_database()"], [parts[-1]]
+    if len(parts) > 1:
+        conditions.append("schema_name = $2")
+        parameters.append(parts[-2])
+    with span("table_stats"):
+        found = query(f"SELECT estimated_size FROM duckdb_tables() WHERE {' AND '.join(conditions)}", parameters)
+    if not found:
+        raise ValueError(f"Table '{table_name}' not found in {source}")
+    rows = found[0][0]
+    if not columns:
+        return TableProfile(source, table_ref, rows, method="duckdb_tables")
+
+    names = [row[0] for row in query(f"DESCRIBE {table_ref}", [])]
+    aggregates = ", ".join(f"count({_quote(n)}), approx_count_distinct({_quote(n)})" for n in names)
+    with span("column_stats", columns=len(names)):
+        values = query(f"SELECT count(*), {aggregates} FROM {table_ref}", [])[0]
+    rows = values[0]
+    column_profiles = [
+        ColumnProfile(name, 1 - values[1 + 2 * i] / rows if rows else None, values[2 + 2 * i])
+        for i, name in enumerate(names)
+    ]
+    return TableProfile(source, table_ref, rows, None, column_profiles, "duckdb_tables + approx_count_distinct")
+
+
+@traced
+def profile_duckdb(db_path: str, table_name: str, columns: bool = True, refresh: bool = False) -> TableProfile:
+    """
+    Profile a table of the local DuckDB file. Cached profiles are only
+    reused until the next write to the file.
+
+    Args:
+        db_path (str): Path to the local DuckDB database file
+        table_name (str): Table to profile
+        columns (bool): Also scan for null fractions and distinct estimates
+        refresh (bool): Gather the statistics again even if cached
+    """
+    table_name = identifier(table_name)
+    database = get_database(db_path)
+
+    def query(sql, parameters):
+        return database.cursor().execute(sql, parameters).fetchall()
+
+    return _cached(
+        ("duckdb", os.path.abspath(db_path), table_name, database.version),
+        columns,
+        refresh,
+        lambda: _profile_duckdb_table(query, "duckdb", table_name, table_name, columns),
+    )
+
+
+@traced
+def profile_motherduck(database_name: str, table_name: str, columns: bool = True, refresh: bool = False) -> TableProfile:
+    """
+    Profile a MotherDuck table; the approximate aggregates run on MotherDuck,
+    so only one row of statistics comes back.
+
+    Args:
+        database_name (str): MotherDuck database; empty for the default database
+        table_name (str): Table to profile
+        columns (bool): Also scan for null fractions and distinct estimates
+        refresh (bool): Gather the statistics again even if cached
+    """
+    table_ref = motherduck_table(database_name, table_name)
+
+    def gather():
+        with motherduck_pool(database_name).connection() as pooled:
+            return _profile_duckdb_table(
+                lambda sql, parameters: pooled.execute(sql, parameters or None).fetchall(),
+                "motherduck",
+                table_ref,
+                table_name,
+                columns,
+            )
+
+    return _cached(("motherduck", table_ref), columns, refresh, gather)
+
+
+@traced
+def profile_bigquery(
+    project_id: str | None = None,
+    dataset_id: str | None = None,
+    table_id: str | None = None,
+    columns: bool = False,
+    refresh: bool = False,
+) -> TableProfile:
+    """
+    Profile a BigQuery table. Row count and size come from the dataset's
+    __TABLES__ metadata, which isn't billed as a scan. Column statistics
+    (COUNTIF/APPROX_COUNT_DISTINCT) are computed on a TABLESAMPLE of about
+    [profiling] sample_rows rows, so distinct estimates are for the sample.
+
+    Args:
+        project_id, dataset_id, table_id (str): Table; None uses the [bigquery] section
+        columns (bool): Also gather sampled column statistics (a billed query)
+        refresh (bool): Gather the statistics again even if cached
+    """
+    config = get_config()
+    project_id = project_id or config.bigquery.project_id
+    dataset_id = dataset_id or config.bigquery.dataset_id
+    table_id = table_id or config.bigquery.table_id
+    table_ref = bigquery_table(project_id, dataset_id, table_id)
+
+    def gather():
+        db_kwargs = {"adbc.bigquery.sql.project_id": project_id, "adbc.bigquery.sql.dataset_id": dataset_id}
+        with (
+            span("connect", driver="bigquery"),
+            dbapi.connect(driver="bigquery", db_kwargs=db_kwargs) as conn,
+            conn.cursor() as cursor,
+        ):
+            with span("table_stats"):
+                # table_id was validated by bigquery_table(), so it is safe as a literal
+                cursor.execute(f"SELECT row_count, size_bytes FROM `{project_id}.{dataset_id}.__TABLES__` WHERE table_id = '{table_id}'")
+                row = cursor.fetchone()
+            if row is None:
+                raise ValueError(f"Table {table_ref} not found in BigQuery")
+            rows, size = row
+            profile = TableProfile("bigquery", f"{project_id}.{dataset_id}.{table_id}", rows, size, method="__TABLES__")
+            if not columns:
+                return profile
+
+            schema = conn.adbc_get_table_schema(table_id, db_schema_filter=dataset_id)
+            # APPROX_COUNT_DISTINCT doesn't take arrays or structs
+            names = [f.name for f in schema if not f.type.num_fields]
+            percent = min(100.0, 100.0 * config.profiling.sample_rows / rows) if rows else 100.0
+            aggregates = ", ".join(f"COUNTIF(`{n}` IS NULL), APPROX_COUNT_DISTINCT(`{n}`)" for n in names)
+            with span("column_stats", columns=len(names), sample_percent=round(percent, 4)):
+                cursor.execute(f"SELECT COUNT(*), {aggregates} FROM {table_ref} TABLESAMPLE SYSTEM ({percent} PERCENT)")
+                values = cursor.fetchone()
+        sampled = values[0]
+        profile.columns = [
+            ColumnProfile(name, values[1 + 2 * i] / sampled if sampled else None, values[2 + 2 * i])
+            for i, name in enumerate(names)
+        ]
+        profile.method = "__TABLES__ + TABLESAMPLE"
+        profile.sample_fraction = sampled / rows if rows else None
+        return profile
+
+    return _cached(("bigquery", table_ref), columns, refresh, gather)
+
+
+########################
+# Planning transfers
+########################
+
+def plan_batch_size(profile: TableProfile) -> int | None:
+    """
+    Postgres batch size hint for streaming the profiled table: about
+    TARGET_BATCH_ROWS rows per batch, but at least MIN_BATCHES_PER_TABLE
+    batches so the DuckDB ingest overlaps the transfer.
+    """
+    width = profile.row_width
+    if not width:
+        return None
+    hint = width * TARGET_BATCH_ROWS
+    if profile.row_estimate:
+        hint = min(hint, width * profile.row_estimate / MIN_BATCHES_PER_TABLE)
+    return int(max(MIN_BATCH_SIZE_HINT_BYTES, min(MAX_BATCH_SIZE_HINT_BYTES, hint)))
+
+
+def plan_partitions(rows: int | None, maximum: int) -> int:
+    """Parallel writers for exporting `rows` rows: one per ROWS_PER_EXPORT_PARTITION, up to `maximum`."""
+    if not rows:
+        return 1
+    return max(1, min(maximum, math.ceil(rows / ROWS_PER_EXPORT_PARTITION)))
+
+
+def plan_streams(profile: TableProfile, maximum: int) -> int:
+    """Parallel BigQuery read streams: one per BYTES_PER_READ_STREAM, up to `maximum`."""
+    if not profile.size_bytes:
+        return 1
+    return max(1, min(maximum, math.ceil(profile.size_bytes / BYTES_PER_READ_STREAM)))
+
+
+def plan_transfer(profile: TableProfile) -> dict:
+    """The transfer settings the profile leads to, for display."""
+    config = get_config(required=False)
+    plan = {"rows": profile.row_estimate, "row_width": round(profile.row_width, 1) if profile.row_width else None}
+    if profile.source == "postgres":
+        plan["batch_size_hint_bytes"] = plan_batch_size(profile)
+    if profile.source == "bigquery":
+        plan["read_streams"] = plan_streams(profile, config.bigquery.max_streams)
+    if profile.source == "duckdb":
+        plan["export_partitions"] = plan_partitions(profile.row_estimate, config.postgres.export_partitions)
+    return plan
+
+
+def planned_postgres_batch_size(table_name: str) -> int | None:
+    """
+    Batch size hint for streaming a Postgres table, from its cached profile;
+    None when [profiling] auto_plan is off or the statistics can't be read.
+    """
+    if not get_config(required=False).profiling.auto_plan:
+        return None
+    try:
+        return plan_batch_size(profile_postgres(table_name))
+    except (ValueError, dbapi.Error):
+        return None
+
+
+def planned_bigquery_streams(maximum: int) -> int | None:
+    """Read streams for the configured BigQuery table, or None when not planned."""
+    if not get_config(required=False).profiling.auto_plan:
+        return None
+    try:
+        return plan_streams(profile_bigquery(), maximum)
+    except (ValueError, dbapi.Error):
+        return None
+
+
+def planned_export_partitions(db_path: str, table_name: str, maximum: int) -> int:
+    """Export writers for a local table, up to `maximum` (all of them when auto_plan is off)."""
+    if not get_config(required=False).profiling.auto_plan:
+        return maximum
+    return plan_partitions(profile_duckdb(db_path, table_name, columns=False).row_estimate, maximum)
@@ -0,0 +1,305 @@
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import pyarrow as pa
+
+from functions.config import get_config
+from functions.duckdb_manager import get_database
+from functions.lazy import lazy_import
+from functions.routing import forget_mirror
+from functions.tracing import span, traced
+
+# The driver manager is loaded on the first replication, not when a page imports this module
+dbapi = lazy_import("adbc_driver_manager.dbapi")
+
+_DONE = object()
+
+
+########################
+# Sources
+########################
+
+def _source_connection(source: str):
+    """Driver and db_kwargs for a replication source configured in secrets.toml."""
+    config = get_config()
+    if source == "postgres":
+        return "postgresql", config.postgres_db_kwargs()
+    if source == "motherduck":
+        return "duckdb", {"path": f"md:{config.motherduck.db_name}"}
+    raise ValueError(f"Unknown replication source '{source}', expected 'postgres' or 'motherduck'")
+
+
+def _quote(name: str) -> str:
+    # Catalog names may need quoting: mixed case ("Orders"), spaces, keywords
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _size_query(source: str) -> str:
+    """Table name and size for every table of the schema bound as $1 in the database bound as $2."""
+    if source == "postgres":
+        return (
+            "SELECT c.relname, pg_total_relation_size(c.oid) FROM pg_class c "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = $1 AND current_database() = $2 AND c.relkind IN ('r', 'p')"
+        )
+    return "SELECT table_name, estimated_size FROM duckdb_tables() WHERE schema_name = $1 AND database_name = $2"
+
+
+# What a source's catalog size measures: Postgres reports bytes, DuckDB an estimated row count
+_SIZE_KEYS = {"postgres": "size_bytes", "motherduck": "estimated_rows"}
+
+
+@dataclass
+class TableSpec:
+    catalog: str
+    db_schema: str
+    name: str
+    local_name: str
+    # Bytes on Postgres, estimated rows on DuckDB (see _SIZE_KEYS)
+    size: int = 0
+
+    @property
+    def qualified_name(self) -> str:
+        return f"{_quote(self.catalog)}.{_quote(self.db_schema)}.{_quote(self.name)}"
+
+
+def discover_tables(conn, source: str, db_schema: str, table_prefix: str = "") -> list[TableSpec]:
+    """
+    List the base tables of a schema in the connection's current database
+    with adbc_get_objects, largest first.
+
+    A MotherDuck connection has every database of the account attached, so
+    the listing is limited to the current one. Sizes come from the catalog
+    (pg_total_relation_size or DuckDB's estimated_size); tables without one
+    sort last.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT current_database()")
+        catalog = cursor.fetchone()[0]
+    with span("get_objects", catalog=catalog, db_schema=db_schema):
+        objects = conn.adbc_get_objects(
+            depth="tables", catalog_filter=catalog, db_schema_filter=db_schema
+        ).read_all().to_pylist()
+    # The filters are LIKE patterns, where _ matches any character
+    specs = [
+        TableSpec(catalog, db_schema, table["table_name"], f"{table_prefix}{table['table_name']}")
+        for entry in objects
+        if entry["catalog_name"] == catalog
+        for schema in entry["catalog_db_schemas"] or []
+        if schema["db_schema_name"] == db_schema
+        for table in schema["db_schema_tables"] or []
+        if table["table_type"].lower() in ("table", "base table")
+    ]
+    with span("table_sizes"), conn.cursor() as cursor:
+        cursor.execute(_size_query(source), parameters=(db_schema, catalog))
+        sizes = dict(cursor.fetchall())
+    for spec in specs:
+        spec.size = int(sizes.get(spec.name) or 0)
+    return sorted(specs, key=lambda s: s.size, reverse=True)
+
+
+########################
+# Producer / writer
+########################
+
+@dataclass
+class _TableStream:
+    """Batches of one table, read by a worker and handed to the single writer."""
+    spec: TableSpec
+    attempt: int
+    batches: queue.Queue
+    schema: pa.Schema | None = None
+    error: BaseException | None = None
+    cancelled: threading.Event = field(default_factory=threading.Event)
+
+    def put(self, item):
+        # Block while the writer is busy, but give up once the writer cancels this table
+        while not self.cancelled.is_set():
+            try:
+                self.batches.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                pass
+        raise _Cancelled()
+
+    def reader(self) -> pa.RecordBatchReader:
+        def batches():
+            while True:
+                item = self.batches.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        return pa.RecordBatchReader.from_batches(self.schema, batches())
+
+
+class _Cancelled(Exception):
+    pass
+
+
+def _produce(stream: _TableStream, source: str, ready: queue.Queue):
+    """
+    Worker: read one table on its own source connection into the stream's
+    bounded queue, announcing it on `ready` once the schema is known.
+    """
+    announced = False
+    try:
+        driver, db_kwargs = _source_connection(source)
+        with dbapi.connect(driver=driver, db_kwargs=db_kwargs) as conn, conn.cursor() as cursor:
+            cursor.execute(f"SELECT * FROM {stream.spec.qualified_name}")
+            reader = cursor.fetch_record_batch()
+            stream.schema = reader.schema
+            ready.put(stream)
+            announced = True
+            for batch in reader:
+                stream.put(batch)
+        stream.put(_DONE)
+    except _Cancelled:
+        pass
+    except Exception as e:
+        if announced:
+            # The writer sees the failure wrapped by DuckDB, so keep the original for retry decisions
+            stream.error = e
+            try:
+                stream.put(e)
+            except _Cancelled:
+                pass
+        else:
+            stream.error = e
+            ready.put(stream)
+
+
+########################
+# Replication job
+########################
+
+@traced
+def replicate_schema(
+    db_path: str,
+    source: str = "postgres",
+    db_schema: str = "public",
+    tables: list[str] | None = None,
+    workers: int | None = None,
+    retries: int | None = None,
+    retry_delay: float | None = None,
+    table_prefix: str = "",
+    buffer_batches: int | None = None,
+) -> dict:
+    """
+    Mirror every table of a source schema into one local DuckDB file.
+
+    Tables are discovered with adbc_get_objects and scheduled largest first
+    on a pool of `workers` threads, each reading one table on its own source
+    connection. Reads run ahead by up to `buffer_batches` batches per table
+    while a single writer (the calling thread) replaces the local tables one
+    at a time. A table that fails with a transient error is retried from
+    scratch, up to `retries` times with exponential backoff.
+
+    Args:
+        db_path (str): Path to the local DuckDB database file
+        source (str): "postgres" or "motherduck"
+        db_schema (str): Schema of the source's database to mirror, e.g. "public" (Postgres) or
+            "main" (MotherDuck, in the [motherduck] db_name database)
+        tables (list[str]): Only mirror these tables; all base tables if None
+        workers (int): Tables read concurrently
+        retries (int): Extra attempts per table after a transient error
+        retry_delay (float): Seconds before the first retry, doubled for each further one
+        table_prefix (str): Prefix for the local table names
+        buffer_batches (int): Batches a worker may read ahead of the writer
+
+        workers, retries, retry_delay and buffer_batches default to the
+        [replication] section of secrets.toml.
+
+    Returns:
+        dict: Totals and a per-table report (rows, bytes, seconds, attempts,
+            status, error, and the catalog size: size_bytes on Postgres,
+            estimated_rows on MotherDuck)
+    """
+    started = time.perf_counter()
+    settings = get_config().replication
+    workers = settings.workers if workers is None else workers
+    retries = settings.retries if retries is None else retries
+    retry_delay = settings.retry_delay if retry_delay is None else retry_delay
+    buffer_batches = settings.buffer_batches if buffer_batches is None else buffer_batches
+    driver, db_kwargs = _source_connection(source)
+    # Errors worth retrying: dropped connections, timeouts, server restarts
+    transient_errors = (dbapi.OperationalError, ConnectionError, TimeoutError)
+    with span("connect", driver=driver), dbapi.connect(driver=driver, db_kwargs=db_kwargs) as conn:
+        specs = discover_tables(conn, source, db_schema, table_prefix)
+    missing = []
+    if tables is not None:
+        missing = sorted(set(tables) - {s.name for s in specs})
+        specs = [s for s in specs if s.name in tables]
+
+    database = get_database(db_path)
+    ready: queue.Queue = queue.Queue()
+    reports = {
+        s.qualified_name: {"table": s.name, "catalog": s.catalog, "local_table": s.local_name, _SIZE_KEYS[source]: s.size}
+        for s in specs
+    }
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="replicate") as pool:
+        def submit(spec: TableSpec, attempt: int):
+            stream = _TableStream(spec, attempt, queue.Queue(maxsize=buffer_batches))
+            pool.submit(_produce, stream, source, ready)
+
+        for spec in specs:
+            submit(spec, 1)
+
+        remaining = len(specs)
+        while remaining:
+            stream = ready.get()
+            report = reports[stream.spec.qualified_name]
+            report["attempts"] = stream.attempt
+            table_started = time.perf_counter()
+            error = stream.error
+            if error is None:
+                counts = {"rows": 0, "bytes": 0}
+
+                def counted(reader):
+                    for batch in reader:
+                        counts["rows"] += batch.num_rows
+                        counts["bytes"] += batch.nbytes
+                        yield batch
+
+                try:
+                    with span("ingest", table=stream.spec.local_name):
+                        database.ingest(
+                            _quote(stream.spec.local_name),
+                            pa.RecordBatchReader.from_batches(stream.schema, counted(stream.reader())),
+                            mode="replace",
+                            before_write=lambda cursor: forget_mirror(cursor, stream.spec.local_name),
+                        )
+                    report.update(counts, seconds=round(time.perf_counter() - table_started, 3), status="ok", error=None)
+                    remaining -= 1
+                    continue
+                except Exception as e:
+                    stream.cancelled.set()
+                    error = stream.error or e
+
+            if isinstance(error, transient_errors) and stream.attempt <= retries:
+                delay = retry_delay * 2 ** (stream.attempt - 1) * (1 + random.random() / 4)
+                report["last_error"] = repr(error)
+                threading.Timer(delay, submit, (stream.spec, stream.attempt + 1)).start()
+                continue
+            report.update(rows=0, bytes=0, seconds=round(time.perf_counter() - table_started, 3), status="failed", error=repr(error))
+            remaining -= 1
+
+    table_reports = [reports[s.qualified_name] for s in specs] + [
+        {"table": name, "status": "failed", "error": f"Table '{name}' not found in schema '{db_schema}'"}
+        for name in missing
+    ]
+    return {
+        "source": source,
+        "db_schema": db_schema,
+        "tables": len(table_reports),
+        "failed": sum(1 for r in table_reports if r["status"] == "failed"),
+        "rows": sum(r.get("rows", 0) for r in table_reports),
+        "seconds": round(time.perf_counter() - started, 3),
+        "table_reports": table_reports,
+    }
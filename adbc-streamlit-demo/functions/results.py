@@ -0,0 +1,83 @@
+import pyarrow as pa
+
+
+class QueryResult:
+    """
+    Result of a select function, kept as the Arrow table the driver produced.
+
+    The table is handed to the UI as is (st.dataframe and st.write render
+    Arrow natively), so no copies or dtype coercions happen on the way to
+    rendering. Polars and pandas conversions only run when a consumer asks
+    for them and are cached.
+    """
+
+    def __init__(self, table: pa.Table, source: str | None = None, optimization: dict | None = None):
+        self.table = table
+        self.source = source
+        # Report from functions.optimize when the table was shrunk after fetching
+        self.optimization = optimization
+        self._polars = None
+        self._pandas = None
+
+    @property
+    def column_names(self) -> list[str]:
+        return self.table.column_names
+
+    @property
+    def schema(self) -> pa.Schema:
+        return self.table.schema
+
+    @property
+    def num_rows(self) -> int:
+        return self.table.num_rows
+
+    @property
+    def nbytes(self) -> int:
+        return self.table.nbytes
+
+    def to_arrow(self) -> pa.Table:
+        """The underlying Arrow table, without copying."""
+        return self.table
+
+    def to_polars(self):
+        """
+        Polars view of the result, built on first use.
+
+        Fixed-width columns share the Arrow buffers; Polars re-encodes string
+        columns to its own layout, so only call this when Polars is needed.
+        """
+        if self._polars is None:
+            import polars as pl
+
+            self._polars = pl.from_arrow(self.table, rechunk=False)
+        return self._polars
+
+    def to_pandas(self):
+        """pandas view of the result using Arrow-backed dtypes, built on first use."""
+        if self._pandas is None:
+            import pandas as pd
+
+            self._pandas = self.table.to_pandas(types_mapper=pd.ArrowDtype)
+        return self._pandas
+
+    def __arrow_c_stream__(self, requested_schema=None):
+        # Lets Arrow PyCapsule consumers (polars, duckdb, ...) read the table directly
+        return self.table.__arrow_c_stream__(requested_schema)
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __repr__(self) -> str:
+        source = f" from {self.source}" if self.source else ""
+        return f"QueryResult({self.num_rows} rows x {self.table.num_columns} columns{source})"
+
+
+def buffer_addresses(table: pa.Table) -> list[int]:
+    """Addresses of every buffer backing a table, to check two tables share memory."""
+    return [
+        buf.address
+        for column in table.columns
+        for chunk in column.chunks
+        for buf in chunk.buffers()
+        if buf is not None
+    ]
@@ -0,0 +1,206 @@
+import collections
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+
+from functions.config import ROUTING_MODES, get_config
+from functions.duckdb_manager import get_database, table_exists
+from functions.results import QueryResult
+from functions.statements import get_pool, identifier
+from functions.tracing import span, timed_reader, traced
+
+# Which local tables mirror which source tables, and when they were last refreshed
+MIRRORS_TABLE = "_mirrors"
+# Decisions kept for recent_routes()
+MAX_ROUTES = 200
+
+
+########################
+# MotherDuck tables
+########################
+
+def motherduck_pool(database_name: str):
+    """
+    Pooled connections to a MotherDuck database (the default one if empty).
+    Each connection authenticates once, when it is opened, and is then
+    reused by every query against that database.
+    """
+    return get_pool("duckdb", {"path": f"md:{database_name}"})
+
+
+def motherduck_table(database_name: str, table_name: str) -> str:
+    """The validated name of a MotherDuck table, qualified with its database if given."""
+    return identifier(f"{database_name}.{table_name}" if database_name else table_name)
+
+
+########################
+# Mirror metadata
+########################
+
+def record_mirror(db_path: str, local_table: str, source: str, source_table: str, rows: int, refreshed_at: float | None = None):
+    """
+    Note that `local_table` now holds a complete copy of `source_table`.
+
+    Called after the copy is committed, so a crash in between leaves the
+    previous refresh time and the router errs towards the remote.
+
+    Args:
+        refreshed_at (float): Epoch seconds when the copy started reading the
+            source; a long copy holds data as of its start, not its end.
+            None uses the current time
+    """
+    with get_database(db_path).writer() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {MIRRORS_TABLE} "
+            "(local_table VARCHAR PRIMARY KEY, source VARCHAR, source_table VARCHAR, refreshed_at TIMESTAMP, rows BIGINT)"
+        )
+        # Converted like now()::TIMESTAMP, which mirror_info measures the age against
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {MIRRORS_TABLE} VALUES (?, ?, ?, coalesce(to_timestamp(?), now())::TIMESTAMP, ?)",
+            [local_table, source, source_table, refreshed_at, rows],
+        )
+
+
+def forget_mirror(cursor, local_table: str):
+    """
+    Drop the mirror record of `local_table`, with a cursor from an open
+    writer() block, so the router stops serving it as soon as the write
+    that changes the table commits.
+    """
+    if table_exists(cursor, MIRRORS_TABLE):
+        cursor.execute(f"DELETE FROM {MIRRORS_TABLE} WHERE local_table = ?", [local_table])
+
+
+def mirror_info(db_path: str, source: str, source_table: str) -> dict | None:
+    """
+    The most recently refreshed local copy of a source table.
+
+    Returns:
+        dict | None: local_table, rows, refreshed_at and age_seconds, or None
+            if the file or a mirror of the table doesn't exist
+    """
+    if not os.path.exists(db_path):
+        # Don't create the file just to find it empty
+        return None
+    cursor = get_database(db_path).cursor()
+    if not table_exists(cursor, MIRRORS_TABLE):
+        return None
+    candidates = cursor.execute(
+        f"SELECT local_table, rows, refreshed_at, epoch(now()::TIMESTAMP - refreshed_at) FROM {MIRRORS_TABLE} "
+        "WHERE source = ? AND source_table = ? ORDER BY refreshed_at DESC",
+        [source, source_table],
+    ).fetchall()
+    # Local names may be qualified or quoted ("main.orders"), so resolve them as a query would
+    for local_table, rows, refreshed_at, age in candidates:
+        if table_exists(cursor, local_table):
+            return {"local_table": local_table, "rows": rows, "refreshed_at": refreshed_at, "age_seconds": age}
+    return None
+
+
+########################
+# Routing
+########################
+
+@dataclass
+class RouteDecision:
+    """Which path served one query, why, and how long it took."""
+    source_table: str
+    served_by: str
+    reason: str
+    mirror_age_seconds: float | None = None
+    seconds: float = 0.0
+
+
+_routes: "collections.deque[RouteDecision]" = collections.deque(maxlen=MAX_ROUTES)
+_routes_lock = threading.Lock()
+
+
+def recent_routes() -> list[dict]:
+    """The latest routing decisions, newest first, e.g. for st.dataframe."""
+    with _routes_lock:
+        return [asdict(decision) for decision in reversed(_routes)]
+
+
+def _choose(mirror: dict | None, mode: str, max_age_seconds: float) -> tuple[str, str]:
+    if mode == "remote":
+        return "remote", "routing mode is remote"
+    if mirror is None:
+        return "remote", "no local mirror"
+    age = mirror["age_seconds"]
+    if age <= max_age_seconds:
+        return "local", f"mirror refreshed {age:,.0f}s ago"
+    if mode == "local":
+        return "local", f"routing mode is local (mirror {age:,.0f}s old)"
+    return "remote", f"mirror is {age:,.0f}s old, over the {max_age_seconds:,.0f}s limit"
+
+
+@traced
+def md_routed_query(
+    database_name: str,
+    table_name: str,
+    sql: str = "SELECT * FROM {table}",
+    parameters: list | None = None,
+    mode: str | None = None,
+    max_age_seconds: float | None = None,
+    db_path: str | None = None,
+) -> QueryResult:
+    """
+    Run a query against a MotherDuck table on the local DuckDB mirror when
+    a fresh enough copy exists, and on MotherDuck otherwise.
+
+    The mirror is the table stream_motherduck_to_duckdb last copied the
+    MotherDuck table into. If the local query fails (e.g. the mirror was
+    dropped), the query is retried on MotherDuck. Each decision is recorded
+    as a 'route' span and in recent_routes().
+
+    Args:
+        database_name (str): MotherDuck database; empty for the default database
+        table_name (str): MotherDuck table the query reads
+        sql (str): Query with {table} where the table goes and $1, $2, ... parameters
+        parameters (list): Values bound to the parameters
+        mode (str): "auto", "local" (mirror even if stale) or "remote"; None uses [routing] mode
+        max_age_seconds (float): Oldest mirror served in auto mode; None uses [routing] max_age_seconds
+        db_path (str): Local DuckDB file; None uses [duckdb] database
+
+    Returns:
+        QueryResult: With source "duckdb_mirror" or "motherduck"
+    """
+    config = get_config()
+    mode = mode or config.routing.mode
+    if mode not in ROUTING_MODES:
+        raise ValueError(f"Unknown routing mode '{mode}', expected one of {ROUTING_MODES}")
+    max_age_seconds = config.routing.max_age_seconds if max_age_seconds is None else max_age_seconds
+    db_path = db_path or config.duckdb.database
+    source_table = motherduck_table(database_name, table_name)
+
+    started = time.perf_counter()
+    mirror = mirror_info(db_path, "motherduck", source_table) if mode != "remote" else None
+    served_by, reason = _choose(mirror, mode, max_age_seconds)
+    decision = RouteDecision(source_table, served_by, reason, mirror["age_seconds"] if mirror else None)
+
+    with span("route", served_by=served_by, reason=reason) as route_span:
+        table = None
+        if served_by == "local":
+            try:
+                cursor = get_database(db_path).cursor()
+                cursor.execute(sql.replace("{table}", mirror["local_table"]), parameters or [])
+                table = timed_reader(cursor.fetch_record_batch()).read_all()
+            except Exception as e:
+                decision.served_by, decision.reason = "remote", f"local query failed: {e}"
+        if table is None:
+            with motherduck_pool(database_name).connection() as pooled:
+                cursor = pooled.execute(sql.replace("{table}", source_table), parameters or None)
+                table = timed_reader(cursor.fetch_record_batch()).read_all()
+        if route_span is not None:
+            route_span.attributes.update(served_by=decision.served_by, reason=decision.reason)
+
+    decision.seconds = round(time.perf_counter() - started, 4)
+    with _routes_lock:
+        _routes.append(decision)
+    return QueryResult(table, source="duckdb_mirror" if decision.served_by == "local" else "motherduck")
+
+
+def md_routed_select(database_name: str, table_name: str, row_limit: int, **options) -> QueryResult:
+    """md_select_data, served from the local mirror when fresh; options as for md_routed_query."""
+    return md_routed_query(database_name, table_name, "SELECT * FROM {table} LIMIT $1", [int(row_limit)], **options)
@@ -0,0 +1,247 @@
+import threading
+import time
+from dataclasses import dataclass, field
+
+from functions.config import get_config
+from functions.ingestion import stream_bigquery_to_duckdb, stream_motherduck_to_duckdb, stream_postgres_to_duckdb
+from functions.tracing import capture
+
+# Longest the scheduler thread sleeps before re-checking its jobs
+MAX_SLEEP_SECONDS = 60.0
+
+
+@dataclass(frozen=True)
+class RefreshJob:
+    """One local table kept up to date from a source table."""
+    name: str
+    source: str
+    local_table: str
+    # Source table; empty uses the table configured for the source in secrets.toml
+    table: str = ""
+    # MotherDuck database; empty uses [motherduck] db_name
+    database: str = ""
+    # None runs the job once
+    interval_seconds: float | None = 3600
+
+    @classmethod
+    def from_config(cls, job: dict) -> "RefreshJob":
+        """A job from a validated [[scheduler.jobs]] entry."""
+        return cls(
+            name=job.get("name") or job["local_table"],
+            source=job["source"],
+            local_table=job["local_table"],
+            table=job.get("table", ""),
+            database=job.get("database", ""),
+            interval_seconds=job.get("interval_seconds", 3600),
+        )
+
+
+@dataclass
+class JobStatus:
+    job: RefreshJob
+    # scheduled, running, succeeded or failed
+    state: str = "scheduled"
+    runs: int = 0
+    next_run: float | None = 0.0
+    last_started: float | None = None
+    last_seconds: float | None = None
+    last_rows: int | None = None
+    last_error: str | None = None
+    # Traces of the last run, for render_trace_panel
+    last_traces: list = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "job": self.job.name,
+            "source": self.job.source,
+            "local_table": self.job.local_table,
+            "state": self.state,
+            "runs": self.runs,
+            "last_started": time.strftime("%H:%M:%S", time.localtime(self.last_started)) if self.last_started else None,
+            "last_seconds": self.last_seconds,
+            "last_rows": self.last_rows,
+            "next_run_in_s": max(0, round(self.next_run - time.time())) if self.next_run is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+def run_job(job: RefreshJob, db_path: str) -> int:
+    """
+    Stream one job's source table into the local file in swap mode: the copy
+    is built in a shadow table and renamed over the local table only once
+    complete, so readers never see a missing or half-written table and a
+    failed run leaves the previous copy in place.
+
+    Returns:
+        int: Rows in the refreshed local table
+    """
+    config = get_config()
+    if job.source == "postgres":
+        return stream_postgres_to_duckdb(db_path, job.table or config.postgres.table_name, job.local_table, mode="swap")
+    if job.source == "motherduck":
+        return stream_motherduck_to_duckdb(
+            db_path,
+            job.database or config.motherduck.db_name,
+            job.table or config.motherduck.table_name,
+            job.local_table,
+            mode="swap",
+        )
+    if job.source == "bigquery":
+        return stream_bigquery_to_duckdb(db_path, job.local_table, mode="swap")
+    raise ValueError(f"Unknown job source '{job.source}'")
+
+
+class RefreshScheduler:
+    """
+    Runs refresh jobs on a background thread, outside any Streamlit script run.
+
+    Jobs run one at a time (the local file has a single writer anyway), each
+    when its interval has passed since it last finished. Pages submit
+    one-off jobs or trigger runs and poll status() instead of streaming on
+    their own script thread. A thread, not a separate process, because a
+    DuckDB file can only be opened for writing by one process, which is the
+    app serving the readers.
+    """
+
+    def __init__(self, db_path: str, jobs: list[RefreshJob] | tuple = ()):
+        self.db_path = db_path
+        self._jobs: dict[str, JobStatus] = {job.name: JobStatus(job) for job in jobs}
+        self._configured: tuple = ()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="duckdb-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None):
+        """Stop after the job in progress, if any, finishes."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, job: RefreshJob):
+        """Add or replace a job and run it as soon as the scheduler is free."""
+        with self._lock:
+            current = self._jobs.get(job.name)
+            if current is not None and current.state == "running":
+                raise RuntimeError(f"Job '{job.name}' is running")
+            self._jobs[job.name] = JobStatus(job)
+        self._wake.set()
+
+    def run_now(self, name: str):
+        """Run a job as soon as the scheduler is free; raises ValueError for an unknown job."""
+        with self._lock:
+            status = self._jobs.get(name)
+            if status is None:
+                raise ValueError(f"Unknown job '{name}'")
+            status.next_run = 0.0
+        self._wake.set()
+
+    def remove(self, name: str):
+        with self._lock:
+            self._jobs.pop(name, None)
+
+    def configure(self, jobs: list[RefreshJob]):
+        """Replace the jobs that came from secrets.toml, keeping submitted ones and running jobs."""
+        jobs = tuple(jobs)
+        with self._lock:
+            if jobs == self._configured:
+                return
+            wanted = {job.name: job for job in jobs}
+            for job in self._configured:
+                status = self._jobs.get(job.name)
+                if job.name not in wanted and status is not None and status.state != "running":
+                    del self._jobs[job.name]
+            for name, job in wanted.items():
+                status = self._jobs.get(name)
+                if status is None or (status.job != job and status.state != "running"):
+                    self._jobs[name] = JobStatus(job)
+            self._configured = jobs
+        self._wake.set()
+
+    def status(self, name: str | None = None) -> list[dict]:
+        """Job states for display; poll this from the page."""
+        with self._lock:
+            return [s.to_dict() for s in self._jobs.values() if name is None or s.job.name == name]
+
+    def traces(self, name: str) -> list:
+        with self._lock:
+            status = self._jobs.get(name)
+            return list(status.last_traces) if status else []
+
+    def _next_due(self) -> tuple[JobStatus | None, float]:
+        now = time.time()
+        with self._lock:
+            pending = [s for s in self._jobs.values() if s.next_run is not None]
+            due = min(pending, key=lambda s: s.next_run, default=None)
+            if due is None:
+                return None, MAX_SLEEP_SECONDS
+            if due.next_run > now:
+                return None, min(due.next_run - now, MAX_SLEEP_SECONDS)
+            due.state, due.last_started, due.last_error = "running", now, None
+            return due, 0.0
+
+    def _loop(self):
+        while not self._stop.is_set():
+            status, wait = self._next_due()
+            if status is None:
+                self._wake.wait(wait)
+                self._wake.clear()
+                continue
+            self._run(status)
+
+    def _run(self, status: JobStatus):
+        started = time.perf_counter()
+        with capture() as traces:
+            try:
+                rows = run_job(status.job, self.db_path)
+                state, error = "succeeded", None
+            except Exception as e:
+                rows, state, error = None, "failed", repr(e)
+        with self._lock:
+            status.state, status.last_error = state, error
+            status.last_rows = rows if rows is not None else status.last_rows
+            status.last_seconds = round(time.perf_counter() - started, 2)
+            status.last_traces = traces
+            status.runs += 1
+            interval = status.job.interval_seconds
+            status.next_run = time.time() + interval if interval else None
+
+
+_scheduler: RefreshScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(db_path: str | None = None) -> RefreshScheduler:
+    """
+    Return the process-wide scheduler, creating it on first use.
+
+    Its jobs follow [[scheduler.jobs]] in secrets.toml (re-read on every
+    call, so edits apply without a restart), and it starts by itself when
+    [scheduler] enabled is true.
+
+    Args:
+        db_path (str): Local DuckDB file; None uses [duckdb] database. Only
+            used when the scheduler is created.
+    """
+    global _scheduler
+    config = get_config(required=False)
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RefreshScheduler(db_path or config.duckdb.database)
+        scheduler = _scheduler
+    scheduler.configure([RefreshJob.from_config(job) for job in config.scheduler.jobs])
+    if config.scheduler.enabled:
+        scheduler.start()
+    return scheduler
@@ -0,0 +1,256 @@
+from dataclasses import dataclass, field
+
+import pyarrow as pa
+
+from functions.duckdb_manager import table_exists
+from functions.lazy import lazy_import
+
+pc = lazy_import("pyarrow.compute")
+
+# Decimal digits needed for every value of an integer type
+_INT_DIGITS = {8: 3, 16: 5, 32: 10, 64: 20}
+_TIMESTAMP_UNITS = ["s", "ms", "us", "ns"]
+
+
+class SchemaMismatchError(ValueError):
+    """The source stream cannot be written into the existing target table."""
+
+    def __init__(self, table_name: str, problems: list[str]):
+        self.table_name = table_name
+        self.problems = problems
+        super().__init__(f"Schema of '{table_name}' is incompatible with the source:\n  " + "\n  ".join(problems))
+
+
+########################
+# Type rules
+########################
+
+def normalize_type(data_type: pa.DataType) -> pa.DataType:
+    """
+    Default mapping from source driver types to types DuckDB stores well.
+
+    - decimals wider than DuckDB's 38 digits become float64
+    - extension types (e.g. BigQuery JSON, Postgres opaque types) use their storage type
+    """
+    if isinstance(data_type, pa.ExtensionType):
+        return normalize_type(data_type.storage_type)
+    if pa.types.is_decimal(data_type) and data_type.precision > 38:
+        return pa.float64()
+    return data_type
+
+
+def _is_string(t: pa.DataType) -> bool:
+    return pa.types.is_string(t) or pa.types.is_large_string(t) or pa.types.is_string_view(t)
+
+
+def _is_binary(t: pa.DataType) -> bool:
+    return pa.types.is_binary(t) or pa.types.is_large_binary(t) or pa.types.is_binary_view(t)
+
+
+def same_family(source: pa.DataType, target: pa.DataType) -> bool:
+    """Types DuckDB treats as one (string vs large_string vs string_view, ...), so no cast is needed."""
+    return (
+        source == target
+        or (_is_string(source) and _is_string(target))
+        or (_is_binary(source) and _is_binary(target))
+    )
+
+
+def can_widen(source: pa.DataType, target: pa.DataType) -> bool:
+    """True if every value of `source` converts to `target` without loss or overflow."""
+    if same_family(source, target) or pa.types.is_null(source):
+        return True
+    if pa.types.is_integer(source) and pa.types.is_integer(target):
+        if pa.types.is_signed_integer(target):
+            return target.bit_width > source.bit_width or (
+                target.bit_width == source.bit_width and pa.types.is_signed_integer(source)
+            )
+        return pa.types.is_unsigned_integer(source) and target.bit_width >= source.bit_width
+    if pa.types.is_integer(source) and pa.types.is_floating(target):
+        # float32 holds 24-bit integers exactly, float64 53-bit ones
+        return source.bit_width <= (16 if target.bit_width == 32 else 32)
+    if pa.types.is_floating(source) and pa.types.is_floating(target):
+        return target.bit_width >= source.bit_width
+    if pa.types.is_integer(source) and pa.types.is_decimal(target):
+        return target.precision - target.scale >= _INT_DIGITS[source.bit_width]
+    if pa.types.is_decimal(source) and pa.types.is_decimal(target):
+        return target.scale >= source.scale and target.precision - target.scale >= source.precision - source.scale
+    if pa.types.is_date(source) and pa.types.is_timestamp(target):
+        return True
+    if pa.types.is_timestamp(source) and pa.types.is_timestamp(target):
+        # Zone-aware and naive timestamps mean different things; units may only get finer
+        return (source.tz is None) == (target.tz is None) and (
+            _TIMESTAMP_UNITS.index(target.unit) >= _TIMESTAMP_UNITS.index(source.unit)
+        )
+    if pa.types.is_list(source) and pa.types.is_list(target):
+        return can_widen(source.value_type, target.value_type)
+    return False
+
+
+########################
+# Plan
+########################
+
+@dataclass
+class SchemaPlan:
+    """What has to happen for a source stream to be written into a target table."""
+    table_name: str
+    # Column -> type every batch is cast to
+    casts: dict[str, pa.DataType] = field(default_factory=dict)
+    # Columns added to / widened in the target, as DuckDB types
+    add_columns: dict[str, str] = field(default_factory=dict)
+    widen_columns: dict[str, str] = field(default_factory=dict)
+    # Target columns the source no longer has (filled with NULL)
+    missing_columns: list[str] = field(default_factory=list)
+    schema: pa.Schema | None = None
+
+    @property
+    def changes_target(self) -> bool:
+        return bool(self.add_columns or self.widen_columns)
+
+    def alter_target(self, cursor):
+        """
+        Add and widen the target's columns as planned, with a cursor from the
+        writer() block that writes the stream, so a failed write rolls the
+        ALTERs back with it.
+        """
+        for name, duckdb_type in self.add_columns.items():
+            cursor.execute(f'ALTER TABLE {self.table_name} ADD COLUMN "{name}" {duckdb_type}')
+        for name, duckdb_type in self.widen_columns.items():
+            cursor.execute(f'ALTER TABLE {self.table_name} ALTER COLUMN "{name}" TYPE {duckdb_type}')
+
+    def cast_reader(self, reader: pa.RecordBatchReader) -> pa.RecordBatchReader:
+        """Apply the planned casts to every batch of a stream (vectorized, safe casts)."""
+        if not self.casts:
+            return reader
+        schema = self.schema
+
+        def cast(column, data_type):
+            if isinstance(column.type, pa.ExtensionType):
+                column = column.storage
+            return column if column.type == data_type else pc.cast(column, data_type)
+
+        def batches():
+            for batch in reader:
+                columns = [
+                    cast(batch.column(i), schema.field(i).type) if name in self.casts else batch.column(i)
+                    for i, name in enumerate(batch.schema.names)
+                ]
+                yield pa.RecordBatch.from_arrays(columns, schema=schema)
+
+        return pa.RecordBatchReader.from_batches(schema, batches())
+
+    def summary(self) -> dict:
+        return {
+            "casts": {name: str(t) for name, t in self.casts.items()},
+            "added": dict(self.add_columns),
+            "widened": dict(self.widen_columns),
+            "missing": list(self.missing_columns),
+        }
+
+
+def duckdb_types(cursor, schema: pa.Schema) -> dict[str, str]:
+    """DuckDB column types for an Arrow schema, as DuckDB itself maps them."""
+    cursor.register("_schema_probe", schema.empty_table())
+    try:
+        return {row[0]: row[1] for row in cursor.execute("DESCRIBE SELECT * FROM _schema_probe").fetchall()}
+    finally:
+        cursor.unregister("_schema_probe")
+
+
+def plan_schema(
+    cursor,
+    table_name: str,
+    source: pa.Schema,
+    target: pa.Schema | None,
+    casts: dict[str, pa.DataType] | None = None,
+    type_map=normalize_type,
+    evolve: bool = True,
+) -> SchemaPlan:
+    """
+    Work out how to write a source stream into a target table, before any data moves.
+
+    Args:
+        cursor: DuckDB cursor, used to map Arrow types to DuckDB types
+        table_name (str): Target table
+        source (pa.Schema): Schema of the source stream (or adbc_get_table_schema)
+        target (pa.Schema): Schema of the existing target table; None if it doesn't exist
+        casts (dict): Column -> Arrow type overrides applied to the stream
+        type_map: Default source type mapping, see normalize_type
+        evolve (bool): Add new columns and widen narrower target columns
+
+    Returns:
+        SchemaPlan: Casts for the stream and ALTERs for the target
+
+    Raises:
+        SchemaMismatchError: If any column cannot be reconciled
+    """
+    casts = casts or {}
+    plan = SchemaPlan(table_name)
+    fields, problems = [], []
+    target_types = {f.name: f.type for f in target} if target is not None else {}
+
+    for source_field in source:
+        name = source_field.name
+        wanted = casts.get(name) or type_map(source_field.type)
+        current = target_types.get(name)
+        if current is None or same_family(wanted, current):
+            out = wanted
+        elif can_widen(wanted, current):
+            out = current
+        elif evolve and can_widen(current, wanted):
+            out = wanted
+            plan.widen_columns[name] = None
+        else:
+            problems.append(f"{name}: source {source_field.type} cannot be written to {current}")
+            continue
+        if current is None and target is not None:
+            if not evolve:
+                problems.append(f"{name}: new column not in the target (evolve=False)")
+                continue
+            plan.add_columns[name] = None
+        if out != source_field.type:
+            plan.casts[name] = out
+        fields.append(pa.field(name, out, nullable=True, metadata=source_field.metadata))
+
+    if problems:
+        raise SchemaMismatchError(table_name, problems)
+
+    plan.schema = pa.schema(fields)
+    plan.missing_columns = [name for name in target_types if name not in plan.schema.names]
+    if plan.changes_target:
+        types = duckdb_types(cursor, plan.schema)
+        plan.add_columns = {name: types[name] for name in plan.add_columns}
+        plan.widen_columns = {name: types[name] for name in plan.widen_columns}
+    return plan
+
+
+def target_schema(cursor, table_name: str) -> pa.Schema | None:
+    """Arrow schema of an existing DuckDB table, or None if there is no such table."""
+    if not table_exists(cursor, table_name):
+        return None
+    return cursor.execute(f"SELECT * FROM {table_name} LIMIT 0").fetch_arrow_table().schema
+
+
+def reconcile(
+    database,
+    table_name: str,
+    source: pa.Schema,
+    mode: str = "append",
+    casts: dict[str, pa.DataType] | None = None,
+    evolve: bool = True,
+) -> SchemaPlan:
+    """
+    Plan the write of a source stream into a DuckDB table: the stream's
+    casts, and the table's ADD COLUMN / widening ALTER COLUMN TYPE, so the
+    write cannot fail halfway on a type error.
+
+    create and replace modes only get stream casts; append and merge also
+    reconcile against the existing table. Nothing is changed here; the
+    ingest applies the ALTERs with plan.alter_target() in its own
+    transaction. On its own, e.g. against adbc_get_table_schema before
+    running the query, it only checks that the write can succeed.
+    """
+    cursor = database.cursor()
+    target = target_schema(cursor, table_name) if mode in ("append", "merge") else None
+    return plan_schema(cursor, table_name, source, target, casts, evolve=evolve)
@@ -0,0 +1,276 @@
+import os
+import sys
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from functions.config import MB, get_config
+from functions.optimize import ipc_write_options
+from functions.results import QueryResult
+
+# One lock for every store so global eviction can safely touch other sessions
+_lock = threading.RLock()
+_stores: "weakref.WeakValueDictionary[str, SessionDataStore]" = weakref.WeakValueDictionary()
+
+
+def data_nbytes(value) -> int:
+    """
+    Memory held by a stored value: Arrow buffers for Arrow tables/batches and
+    QueryResults, the estimated size for Polars frames and sys.getsizeof otherwise.
+    """
+    if isinstance(value, (pa.Table, pa.RecordBatch, pa.Array, pa.ChunkedArray)):
+        return value.nbytes
+    if hasattr(value, "estimated_size"):
+        return int(value.estimated_size())
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+@dataclass
+class _Entry:
+    value: object
+    nbytes: int
+    last_used: float
+    spill_path: str | None = None
+    # What to rebuild from the spilled Arrow file: "arrow", "polars" or "result"
+    kind: str = "arrow"
+    source: str | None = None
+    optimization: dict | None = None
+    # Size of the spill file, after compression
+    spill_bytes: int = 0
+    # A compressed spill can't be memory-mapped, only read back into memory
+    spill_compressed: bool = False
+
+    @property
+    def resident(self) -> bool:
+        return self.spill_path is None
+
+
+class SessionDataStore:
+    """
+    Holds the query results of one Streamlit session and keeps them within
+    a per-session and a process-wide memory budget.
+
+    When a budget is exceeded the least recently used entries are spilled to
+    Arrow IPC files on disk (and memory-mapped back on access) or, with
+    spilling disabled or for non-Arrow values, dropped with a notice. An
+    entry whose access allocates memory (a compressed spill, or a Polars
+    frame) becomes resident again, counted against the budgets.
+
+    Budgets, spilling and the spill codec come from the [session] section of
+    secrets.toml and follow edits to it; arguments passed here override it.
+    """
+
+    def __init__(
+        self,
+        session_id: str,
+        budget_bytes: int | None = None,
+        spill: bool | None = None,
+        spill_dir: str | None = None,
+        compression: str | None = None,
+    ):
+        self.session_id = session_id
+        self._budget_bytes = budget_bytes
+        self._spill = spill
+        self._compression = compression
+        self.spill_dir = os.path.join(spill_dir or _settings().spill_path, session_id)
+        self._entries: dict[str, _Entry] = {}
+        with _lock:
+            _stores[session_id] = self
+        weakref.finalize(self, _remove_spill_files, self.spill_dir)
+
+    ########################
+    # Access
+    ########################
+
+    def put(self, key: str, value) -> list[str]:
+        """
+        Store a value, evicting older entries if a budget is exceeded.
+
+        Returns:
+            list[str]: Notices describing anything that was spilled or dropped.
+        """
+        with _lock:
+            self._discard(key)
+            self._entries[key] = _Entry(value, data_nbytes(value), time.monotonic())
+            notices = self._enforce(protect=key)
+            notices += _enforce_global(protect=(self, key))
+            return notices
+
+    def get(self, key: str, default=None):
+        """Return a stored value, memory-mapping it back from disk if it was spilled."""
+        with _lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            entry.last_used = time.monotonic()
+            if entry.resident:
+                return entry.value
+            with pa.memory_map(entry.spill_path) as source:
+                table = ipc.open_file(source).read_all()
+            value = _rebuild(entry, table)
+            if entry.spill_compressed or entry.kind == "polars":
+                # The value is real memory rather than a mapping: hold it as a resident
+                # entry so the budgets see it and it isn't rebuilt on every rerun
+                os.remove(entry.spill_path)
+                entry.value, entry.spill_path, entry.spill_bytes = value, None, 0
+                entry.nbytes = data_nbytes(value)
+                self._enforce(protect=key)
+                _enforce_global(protect=(self, key))
+            return value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def keys(self, prefix: str = "") -> list[str]:
+        return [k for k in self._entries if k.startswith(prefix)]
+
+    def items(self, prefix: str = ""):
+        for key in self.keys(prefix):
+            yield key, self.get(key)
+
+    def delete(self, key: str):
+        with _lock:
+            self._discard(key)
+
+    def clear(self, prefix: str = ""):
+        with _lock:
+            for key in self.keys(prefix):
+                self._discard(key)
+
+    ########################
+    # Accounting
+    ########################
+
+    @property
+    def budget_bytes(self) -> int:
+        return _settings().budget_bytes if self._budget_bytes is None else self._budget_bytes
+
+    @property
+    def spill(self) -> bool:
+        return _settings().spill if self._spill is None else self._spill
+
+    @property
+    def write_options(self) -> ipc.IpcWriteOptions:
+        return ipc_write_options(self._compression or _settings().spill_compression)
+
+    def resident_bytes(self) -> int:
+        return sum(e.nbytes for e in self._entries.values() if e.resident)
+
+    def usage(self) -> dict:
+        """Current memory usage of this session and of all sessions in the process."""
+        with _lock:
+            return {
+                "session_bytes": self.resident_bytes(),
+                "session_budget_bytes": self.budget_bytes,
+                "entries": len(self._entries),
+                "spilled": sum(1 for e in self._entries.values() if not e.resident),
+                "spilled_bytes": sum(e.spill_bytes for e in self._entries.values() if not e.resident),
+                "global_bytes": global_resident_bytes(),
+                "global_budget_bytes": _settings().global_budget_bytes,
+                "sessions": len(_stores),
+            }
+
+    ########################
+    # Eviction
+    ########################
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry.spill_path and os.path.exists(entry.spill_path):
+            os.remove(entry.spill_path)
+
+    def _evict(self, key: str, scope: str) -> str:
+        entry = self._entries[key]
+        size = f"{entry.nbytes / MB:.1f} MB"
+        value = entry.value
+        if isinstance(value, QueryResult):
+            kind, table, entry.source, entry.optimization = "result", value.to_arrow(), value.source, value.optimization
+        elif isinstance(value, pa.Table):
+            kind, table = "arrow", value
+        elif type(value).__module__.startswith("polars"):
+            kind, table = "polars", value.to_arrow()
+        else:
+            kind, table = None, None
+        if self.spill and table is not None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, f"{abs(hash(key))}.arrow")
+            options = self.write_options
+            with pa.OSFile(path, "wb") as sink, ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+            entry.value, entry.spill_path, entry.kind = None, path, kind
+            entry.spill_compressed = options.compression is not None
+            entry.spill_bytes = os.path.getsize(path)
+            return (
+                f"'{key}' ({size}) moved to disk ({entry.spill_bytes / MB:.1f} MB on disk) "
+                f"to stay within the {scope} memory budget."
+            )
+        del self._entries[key]
+        return f"'{key}' ({size}) was dropped to stay within the {scope} memory budget; pull it again to view it."
+
+    def _enforce(self, protect: str) -> list[str]:
+        """Evict this session's least recently used entries until under its budget."""
+        notices = []
+        resident = sorted(
+            (k for k, e in self._entries.items() if e.resident and k != protect),
+            key=lambda k: self._entries[k].last_used,
+        )
+        while self.resident_bytes() > self.budget_bytes and resident:
+            notices.append(self._evict(resident.pop(0), "session"))
+        return notices
+
+
+def _rebuild(entry: _Entry, table: pa.Table):
+    """The stored value, from its spilled Arrow table."""
+    if entry.kind == "result":
+        return QueryResult(table, source=entry.source, optimization=entry.optimization)
+    if entry.kind == "polars":
+        import polars as pl
+
+        return pl.from_arrow(table)
+    return table
+
+
+def _settings():
+    # secrets.toml is optional for the store; without it the defaults apply
+    return get_config(required=False).session
+
+
+def _remove_spill_files(spill_dir: str):
+    if os.path.isdir(spill_dir):
+        for name in os.listdir(spill_dir):
+            os.remove(os.path.join(spill_dir, name))
+        os.rmdir(spill_dir)
+
+
+def global_resident_bytes() -> int:
+    with _lock:
+        return sum(store.resident_bytes() for store in list(_stores.values()))
+
+
+def _enforce_global(protect) -> list[str]:
+    """Evict the least recently used entries across all sessions until under the global budget."""
+    notices = []
+    with _lock:
+        candidates = sorted(
+            (
+                (entry.last_used, store, key)
+                for store in list(_stores.values())
+                for key, entry in store._entries.items()
+                if entry.resident and (store, key) != protect
+            ),
+            key=lambda c: c[0],
+        )
+        budget = _settings().global_budget_bytes
+        while global_resident_bytes() > budget and candidates:
+            _, store, key = candidates.pop(0)
+            notice = store._evict(key, "global")
+            # Only report evictions from the calling session; others see the result on their next rerun
+            if store is protect[0]:
+                notices.append(notice)
+    return notices
@@ -0,0 +1,290 @@
+import atexit
+import contextlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from functions.config import get_config
+from functions.lazy import lazy_import
+from functions.tracing import span, timed_reader
+
+dbapi = lazy_import("adbc_driver_manager.dbapi")
+
+# Prepared statements kept per pooled connection; the least recently used are closed first
+MAX_PREPARED_STATEMENTS = 32
+# Idle connections older than this are closed instead of reused, before a server or proxy drops them
+MAX_IDLE_SECONDS = 300.0
+
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_$]*")
+# BigQuery project ids may contain hyphens
+_BIGQUERY_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_-]*")
+
+
+########################
+# Identifiers
+########################
+
+def identifier(name: str, max_parts: int = 3) -> str:
+    """
+    Validate a table or column name before it is placed into SQL text.
+
+    Values are bound as parameters, but identifiers can't be, so names from
+    secrets.toml or the UI must be plain (optionally dotted) SQL identifiers.
+    The name is returned unchanged, so unquoted names keep their usual case
+    folding on Postgres.
+
+    Args:
+        name (str): e.g. "streaming_data", "public.orders" or "my_db.main.events"
+        max_parts (int): Most dot-separated parts allowed
+
+    Raises:
+        ValueError: If the name is empty, has too many parts or any other character
+    """
+    parts = name.split(".") if isinstance(name, str) else []
+    if not 1 <= len(parts) <= max_parts or not all(_IDENTIFIER.fullmatch(part) for part in parts):
+        raise ValueError(f"Invalid SQL identifier {name!r}: expected up to {max_parts} dot-separated names of letters, digits, _ and $")
+    return name
+
+
+def bigquery_table(project_id: str, dataset_id: str, table_id: str) -> str:
+    """The backquoted `project.dataset.table` reference, with each part validated."""
+    for part in (project_id, dataset_id, table_id):
+        if not isinstance(part, str) or not _BIGQUERY_IDENTIFIER.fullmatch(part):
+            raise ValueError(f"Invalid BigQuery identifier {part!r}")
+    return f"`{project_id}.{dataset_id}.{table_id}`"
+
+
+########################
+# Pooled connections
+########################
+
+class PooledConnection:
+    """An ADBC connection checked out of a ConnectionPool, with its prepared statements."""
+
+    def __init__(self, pool: "ConnectionPool", conn):
+        self.pool = pool
+        self.conn = conn
+        self.last_used = time.monotonic()
+        # SQL text -> cursor that prepared it; an ADBC cursor re-executing its last query skips prepare
+        self._statements: "OrderedDict[str, object]" = OrderedDict()
+
+    def prepared(self, sql: str):
+        """
+        Return a cursor with `sql` prepared on this connection, preparing it
+        only the first time (timed as the 'prepare' span).
+        """
+        cursor = self._statements.get(sql)
+        hit = cursor is not None
+        self.pool._count(hit)
+        with span("prepare", cached=hit):
+            if not hit:
+                cursor = self.conn.cursor()
+                cursor.adbc_prepare(sql)
+                self._statements[sql] = cursor
+                while len(self._statements) > self.pool.max_statements:
+                    self._statements.popitem(last=False)[1].close()
+            else:
+                self._statements.move_to_end(sql)
+        return cursor
+
+    def execute(self, sql: str, parameters=None):
+        """
+        Execute `sql` with bound parameters on its prepared cursor and return
+        the cursor. Read the result before leaving the pool's connection()
+        block; the cursor is reused by the next caller.
+        """
+        cursor = self.prepared(sql)
+        with span("execute"):
+            cursor.execute(sql, parameters)
+        return cursor
+
+    @property
+    def prepared_count(self) -> int:
+        return len(self._statements)
+
+    def close(self):
+        for cursor in self._statements.values():
+            with contextlib.suppress(Exception):
+                cursor.close()
+        self._statements.clear()
+        with contextlib.suppress(Exception):
+            self.conn.close()
+
+
+class ConnectionPool:
+    """
+    A fixed number of ADBC connections to one database, reused across calls.
+
+    Opening a Postgres or MotherDuck connection costs a network handshake
+    and authentication on every query; a pool pays it once per connection.
+    Connections run in autocommit mode, so an idle one never holds a
+    transaction open on the server. A connection only goes back to the pool
+    when its block exits cleanly. After any exception (a driver error, or a
+    pyarrow error or KeyboardInterrupt halfway through reading a result) it
+    is closed, since it may be broken, in an aborted transaction or still
+    holding an open statement or half-read result stream.
+    """
+
+    def __init__(self, driver: str, db_kwargs: dict, size: int = 4, max_statements: int = MAX_PREPARED_STATEMENTS):
+        self.driver = driver
+        self.db_kwargs = dict(db_kwargs)
+        self.size = size
+        self.max_statements = max_statements
+        self._idle: list[PooledConnection] = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._open = 0
+        self._hits = 0
+        self._misses = 0
+        self._closed = False
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Check out a connection for the duration of the block, waiting while
+        all `size` connections are in use.
+
+        Usage:
+            with pool.connection() as pooled:
+                table = pooled.execute("SELECT * FROM t WHERE id = $1", [42]).fetch_arrow_table()
+        """
+        self._slots.acquire()
+        pooled = None
+        try:
+            pooled = self._checkout()
+            yield pooled
+        except BaseException:
+            if pooled is not None:
+                self._discard(pooled)
+                pooled = None
+            raise
+        finally:
+            if pooled is not None:
+                self._checkin(pooled)
+            self._slots.release()
+
+    def stats(self) -> dict:
+        """Connections and prepared statement reuse, e.g. for display or a benchmark report."""
+        with self._lock:
+            return {
+                "driver": self.driver,
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "prepared": sum(p.prepared_count for p in self._idle),
+                "statement_hits": self._hits,
+                "statement_misses": self._misses,
+            }
+
+    def close(self):
+        """Close the idle connections; connections in use are closed when returned."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._discard(pooled)
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+    def _checkout(self) -> PooledConnection:
+        stale = []
+        pooled = None
+        with self._lock:
+            now = time.monotonic()
+            while self._idle:
+                candidate = self._idle.pop()
+                if now - candidate.last_used > MAX_IDLE_SECONDS:
+                    stale.append(candidate)
+                else:
+                    pooled = candidate
+                    break
+        for candidate in stale:
+            self._discard(candidate)
+        if pooled is None:
+            with span("connect", driver=self.driver, pooled=True):
+                conn = dbapi.connect(driver=self.driver, db_kwargs=self.db_kwargs, autocommit=True)
+            pooled = PooledConnection(self, conn)
+            with self._lock:
+                self._open += 1
+        return pooled
+
+    def _checkin(self, pooled: PooledConnection):
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            if not self._closed:
+                # Most recently used last, so the warmest connection is handed out next
+                self._idle.append(pooled)
+                return
+        self._discard(pooled)
+
+    def _discard(self, pooled: PooledConnection):
+        pooled.close()
+        with self._lock:
+            self._open -= 1
+
+
+# One pool per (driver, db_kwargs) for the whole process
+_pools: dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(driver: str, db_kwargs: dict, size: int | None = None) -> ConnectionPool:
+    """
+    Return the process-wide pool for a database, creating it on first use.
+
+    Args:
+        driver (str): ADBC driver, e.g. "postgresql" or "duckdb"
+        db_kwargs (dict): Connection options; each distinct set gets its own pool
+        size (int): Connections in a new pool; None uses pool_size from the
+            [postgres] or [motherduck] section of secrets.toml
+
+    Returns:
+        ConnectionPool: The shared pool
+    """
+    key = (driver, tuple(sorted(db_kwargs.items())))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            if size is None:
+                config = get_config(required=False)
+                size = config.postgres.pool_size if driver == "postgresql" else config.motherduck.pool_size
+            pool = _pools[key] = ConnectionPool(driver, db_kwargs, size)
+        return pool
+
+
+def pool_stats() -> list[dict]:
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+def close_pools():
+    """Close every pool, e.g. after secrets.toml changed credentials or before exit."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+# Close cursors before their connections; left to garbage collection at exit, ADBC refuses to close
+# a connection that still has open statements
+atexit.register(close_pools)
+
+
+def fetch_table(driver: str, db_kwargs: dict, sql: str, parameters=None):
+    """
+    Run a query on a pooled connection with bound parameters and return its
+    Arrow table. Repeating the same SQL text with new parameters reuses the
+    prepared statement, so the server skips parsing and planning.
+    Use $1, $2, ... placeholders; Postgres and DuckDB both accept them.
+    """
+    with get_pool(driver, db_kwargs).connection() as pooled:
+        cursor = pooled.execute(sql, parameters)
+        return timed_reader(cursor.fetch_record_batch()).read_all()
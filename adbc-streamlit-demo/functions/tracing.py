@@ -0,0 +1,197 @@
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # OpenTelemetry export is optional
+    otel_trace = None
+
+# Set to a file path to append every finished trace as one JSON line
+TRACE_FILE_ENV = "ADBC_TRACE_FILE"
+
+_local = threading.local()
+_sink_lock = threading.Lock()
+
+
+########################
+# Trace data
+########################
+
+@dataclass
+class Span:
+    name: str
+    offset: float
+    seconds: float = 0.0
+    attributes: dict = field(default_factory=dict)
+    error: str | None = None
+
+
+@dataclass
+class Trace:
+    name: str
+    started_at: str
+    seconds: float = 0.0
+    attributes: dict = field(default_factory=dict)
+    spans: list[Span] = field(default_factory=list)
+    error: str | None = None
+
+    def breakdown(self) -> list[dict]:
+        """
+        Per-span timings for display, e.g. in st.dataframe.
+
+        Returns:
+            list[dict]: One row per span with its duration and share of the total.
+        """
+        return [
+            {
+                "step": s.name,
+                "start_ms": round(s.offset * 1000, 2),
+                "ms": round(s.seconds * 1000, 2),
+                "share": f"{s.seconds / self.seconds:.0%}" if self.seconds else "",
+                **s.attributes,
+            }
+            for s in sorted(self.spans, key=lambda s: s.offset)
+        ]
+
+
+########################
+# Recording
+########################
+
+def _tracer():
+    return otel_trace.get_tracer("adbc-streamlit-demo") if otel_trace else None
+
+
+def _write_sink(finished: Trace):
+    path = os.environ.get(TRACE_FILE_ENV)
+    if not path:
+        return
+    with _sink_lock, open(path, "a") as f:
+        f.write(json.dumps(asdict(finished), default=str) + "\n")
+
+
+@contextlib.contextmanager
+def trace(name: str, **attributes):
+    """
+    Record one source-function call as a trace made up of spans.
+
+    Nested calls (e.g. a page helper calling a source function) record their
+    spans into the outermost trace.
+    """
+    current = getattr(_local, "trace", None)
+    if current is not None:
+        with span(name, **attributes):
+            yield current
+        return
+
+    started = time.perf_counter()
+    current = Trace(name, datetime.now(timezone.utc).isoformat(), attributes=dict(attributes))
+    # Span offsets are relative to this; kept off the dataclass fields so it isn't exported
+    current.perf_start = started
+    _local.trace = current
+    tracer = _tracer()
+    otel_span = tracer.start_as_current_span(name, attributes=attributes) if tracer else contextlib.nullcontext()
+    try:
+        with otel_span:
+            yield current
+    except Exception as e:
+        current.error = repr(e)
+        raise
+    finally:
+        _local.trace = None
+        current.seconds = time.perf_counter() - started
+        _write_sink(current)
+        for captured in getattr(_local, "captures", []):
+            captured.append(current)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """Time one step (connect, execute, first_batch, fetch, ingest, commit) of the current trace."""
+    current = getattr(_local, "trace", None)
+    if current is None:
+        yield None
+        return
+
+    started = time.perf_counter()
+    recorded = Span(name, started - current.perf_start, attributes=dict(attributes))
+    tracer = _tracer()
+    otel_span = tracer.start_as_current_span(name, attributes=attributes) if tracer else contextlib.nullcontext()
+    try:
+        with otel_span:
+            yield recorded
+    except Exception as e:
+        recorded.error = repr(e)
+        raise
+    finally:
+        recorded.seconds = time.perf_counter() - started
+        add_span(recorded)
+
+
+def add_span(recorded: Span):
+    """Attach an already measured span to the current trace, if any."""
+    current = getattr(_local, "trace", None)
+    if current is not None:
+        current.spans.append(recorded)
+
+
+def traced(fn):
+    """Decorator that wraps every call of a source function in a trace."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with trace(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def timed_reader(reader):
+    """
+    Wrap a RecordBatchReader so the wait for its first batch is recorded as
+    a 'first_batch' span and the full read (with rows/batches) as 'fetch'.
+    """
+    import pyarrow as pa
+
+    current = getattr(_local, "trace", None)
+    if current is None:
+        return reader
+
+    def batches():
+        started = time.perf_counter()
+        rows = count = 0
+        offset = started - current.perf_start
+        for batch in reader:
+            if count == 0:
+                current.spans.append(Span("first_batch", offset, time.perf_counter() - started))
+            rows += batch.num_rows
+            count += 1
+            yield batch
+        current.spans.append(Span("fetch", offset, time.perf_counter() - started, {"rows": rows, "batches": count}))
+
+    return pa.RecordBatchReader.from_batches(reader.schema, batches())
+
+
+@contextlib.contextmanager
+def capture():
+    """
+    Collect the traces finished in this thread while the block runs.
+
+    Usage:
+        with capture() as traces:
+            data = pg_select_data(...)
+        render_trace_panel(traces)
+    """
+    traces: list[Trace] = []
+    captures = getattr(_local, "captures", None)
+    if captures is None:
+        captures = _local.captures = []
+    captures.append(traces)
+    try:
+        yield traces
+    finally:
+        captures.remove(traces)
@@ -0,0 +1,54 @@
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from functions.session_data import MB, SessionDataStore
+
+
+def render_trace_panel(traces, title: str = "Query Timing"):
+    """
+    Show a per-query timing breakdown for traces collected with
+    functions.tracing.capture(), so slowness can be attributed to the
+    connection handshake, server execution or data transfer.
+
+    Args:
+        traces (list[Trace]): Traces captured while the queries ran
+        title (str): Expander title
+    """
+    if not traces:
+        return
+
+    with st.expander(title, expanded=False):
+        for trace in traces:
+            status = f" - failed: {trace.error}" if trace.error else ""
+            st.markdown(f"**{trace.name}**: {trace.seconds * 1000:,.0f} ms{status}")
+            st.dataframe(trace.breakdown(), hide_index=True, use_container_width=True)
+
+
+def session_data_store() -> SessionDataStore:
+    """
+    Return this session's data store, creating it on first use.
+
+    Pages keep fetched tables here instead of directly in st.session_state so
+    their memory is accounted for and kept within the configured budgets.
+    """
+    if "data_store" not in st.session_state:
+        ctx = get_script_run_ctx()
+        session_id = ctx.session_id if ctx else "default"
+        st.session_state.data_store = SessionDataStore(session_id)
+    return st.session_state.data_store
+
+
+def show_notices(notices: list[str]):
+    """Tell the user about data that was spilled or dropped to stay within budget."""
+    for notice in notices:
+        st.warning(notice)
+
+
+def render_data_usage(store: SessionDataStore):
+    """Show how much memory this session's data and all sessions' data are using."""
+    usage = store.usage()
+    st.caption(
+        f"Session data: {usage['session_bytes'] / MB:,.1f} MB of {usage['session_budget_bytes'] / MB:,.0f} MB "
+        f"({usage['entries']} tables, {usage['spilled']} on disk, {usage['spilled_bytes'] / MB:,.1f} MB) | "
+        f"All sessions: {usage['global_bytes'] / MB:,.1f} MB of {usage['global_budget_bytes'] / MB:,.0f} MB"
+    )
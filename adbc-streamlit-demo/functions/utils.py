@@ -1,11 +1,9 @@
-from adbc_driver_manager import dbapi
-import tomllib
+from functions.config import get_config
+from functions.statements import get_pool
+from functions.tracing import span, traced
 
-# Load connection string from secrets.toml
-with open("secrets.toml","rb") as f:
-    secrets = tomllib.load(f)
-    
 
+@traced
 def pg_discover(secret: str) -> str:
     """
     Discover information about the connected PostgreSQL database.
@@ -16,19 +14,17 @@ def pg_discover(secret: str) -> str:
     Returns:
         str: A summary string containing vendor name, driver name, and table info.
     """
-    with (
-        dbapi.connect(
-            driver="postgresql",
-            db_kwargs={"uri": secrets[secret]},
-        ) as postgres_conn,
-        postgres_conn.cursor() as pg_cursor
-    ):
-        vendor_name = postgres_conn.adbc_get_info()["vendor_name"]
-        driver_name = postgres_conn.adbc_get_info()['driver_name']
+    with get_pool("postgresql", get_config().postgres_db_kwargs(secret)).connection() as pooled:
+        postgres_conn = pooled.conn
+        with span("get_info"):
+            info = postgres_conn.adbc_get_info()
+        vendor_name = info["vendor_name"]
+        driver_name = info['driver_name']
         
         result = (f"Vendor name: {vendor_name}\nDriver name: {driver_name}\n")
     return result
 
+@traced
 def pg_schema(secret: str, table_name: str) -> str:
     """
     Returns the schema of the 'streaming_data' table in the PostgreSQL database
@@ -41,14 +37,10 @@ def pg_schema(secret: str, table_name: str) -> str:
     Returns:
         str: The schema information as a human-readable string.
     """
-    with (
-        dbapi.connect(
-            driver="postgresql",
-            db_kwargs={"uri": secrets[secret]},
-        ) as postgres_conn,
-        postgres_conn.cursor() as pg_cursor
-    ):
-        schema = postgres_conn.adbc_get_table_schema(table_name)
+    with get_pool("postgresql", get_config().postgres_db_kwargs(secret)).connection() as pooled:
+        postgres_conn = pooled.conn
+        with span("get_table_schema"):
+            schema = postgres_conn.adbc_get_table_schema(table_name)
         
         result = (f"Schema:\n{schema}")
     return result
\ No newline at end of file
@@ -0,0 +1,376 @@
+import math
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Smallest hashes kept per unique column. Distinct estimates are within
+# about 1/sqrt(k) (1.6%), and a column with 0.1% of its values repeated shows
+# a repeat among the kept hashes 98% of the time
+SKETCH_SIZE = 4096
+
+# Small batches (DuckDB hands out 2048 rows) are validated together, up to
+# this many rows at a time, so per-call overhead doesn't dominate
+VALIDATE_ROWS = 65_536
+
+# Polynomial hash of string bytes, and its inverse for prefix differences (mod 2**64)
+_PRIME = 0x100000001B3
+_PRIME_INVERSE = pow(_PRIME, -1, 2**64)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+class ValidationError(ValueError):
+    """The streamed data broke a validation rule; the write was rolled back."""
+
+    def __init__(self, report: "ValidationReport"):
+        self.report = report
+        super().__init__("Validation failed:\n  " + "\n  ".join(report.problems))
+
+
+########################
+# Hashing
+########################
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, so nearby keys get unrelated hashes. Mixes `h` in place."""
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(0x94D049BB133111EB)
+    h ^= h >> np.uint64(31)
+    return h
+
+
+# Powers of _PRIME and _PRIME_INVERSE, kept between batches up to this many
+# bytes; longer string columns compute theirs per call
+POWERS_CACHED = 1 << 20
+_powers_cache: dict[int, np.ndarray] = {}
+
+
+def _powers(base: int, n: int) -> np.ndarray:
+    powers = _powers_cache.get(base)
+    if powers is not None and len(powers) > n:
+        return powers[:n + 1]
+    powers = np.ones(n + 1, dtype=np.uint64)
+    if n:
+        powers[1:] = np.cumprod(np.full(n, base, dtype=np.uint64))
+    if n < POWERS_CACHED:
+        # Replaced whole, so a concurrent reader keeps a complete (shorter) array
+        _powers_cache[base] = powers
+    return powers
+
+
+def _hash_binary(array: pa.Array) -> np.ndarray:
+    """
+    Hash every string in one vectorized pass over the bytes buffer: a
+    polynomial hash per value from the differences of one prefix sum. Two
+    uint64 arrays per string byte; the powers come from a cache.
+    """
+    array = pc.cast(array, pa.large_binary())
+    offsets = np.frombuffer(array.buffers()[1], dtype=np.int64)[array.offset:array.offset + len(array) + 1]
+    first, last = int(offsets[0]), int(offsets[-1])
+    data = array.buffers()[2]
+    size = last - first
+    prefix = np.zeros(size + 1, dtype=np.uint64)
+    if size:
+        values = np.frombuffer(data, dtype=np.uint8)[first:last].astype(np.uint64)
+        np.multiply(values, _powers(_PRIME_INVERSE, size)[:size], out=values)
+        np.cumsum(values, out=prefix[1:])
+    starts, ends = offsets[:-1] - first, offsets[1:] - first
+    h = (prefix[ends] - prefix[starts]) * _powers(_PRIME, size)[ends]
+    h ^= (ends - starts).astype(np.uint64) * _GOLDEN
+    return _mix(h)
+
+
+def hash_values(array: pa.Array) -> np.ndarray:
+    """
+    64-bit hashes of the non-null values of an Arrow array.
+
+    Equal values hash equally within a column type. Numbers, dates, times,
+    booleans and strings are hashed without leaving numpy; decimals and
+    other types are hashed through their string form.
+    """
+    if array.null_count:
+        array = pc.drop_null(array)
+    kind = array.type
+    if pa.types.is_integer(kind) or pa.types.is_temporal(kind):
+        if not pa.types.is_integer(kind):
+            storage = pa.int32() if kind.bit_width == 32 else pa.int64()
+            if isinstance(array, pa.ChunkedArray):
+                array = pa.chunked_array([chunk.view(storage) for chunk in array.chunks], storage)
+            else:
+                array = array.view(storage)
+        values = array.to_numpy(zero_copy_only=False).astype(np.int64, copy=False)
+        # _mix works in place; copy only a read-only view of an Arrow buffer
+        return _mix((values if values.flags.writeable else values.copy()).view(np.uint64))
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    if pa.types.is_floating(kind):
+        # + 0.0 folds -0.0 into 0.0 (and makes the array _mix works in)
+        values = pc.cast(array, pa.float64()).to_numpy(zero_copy_only=False) + 0.0
+        return _mix(values.view(np.uint64))
+    if pa.types.is_boolean(kind):
+        return _mix(pc.cast(array, pa.uint8()).to_numpy(zero_copy_only=False).astype(np.uint64))
+    if not (pa.types.is_string(kind) or pa.types.is_large_string(kind) or pa.types.is_binary(kind) or pa.types.is_large_binary(kind)):
+        array = pc.cast(array, pa.large_string())
+    return _hash_binary(array)
+
+
+def _bounds(column) -> tuple:
+    """
+    Smallest and largest non-null value of a column, (None, None) if it has
+    none. Floating point columns are reduced in numpy: pc.min_max handles
+    NaN on a slow path, several times the cost of np.min/np.max. Those
+    return NaN if there is any (nulls become NaN in to_numpy), and then
+    np.fmin/np.fmax skip them the way pc.min_max does.
+    """
+    if not pa.types.is_floating(column.type):
+        bounds = pc.min_max(column)
+        return bounds["min"].as_py(), bounds["max"].as_py()
+    if column.null_count == len(column):
+        return None, None
+    if isinstance(column, pa.ChunkedArray):
+        # One array per validated block, not one numpy call per driver batch
+        column = column.combine_chunks()
+    values = column.to_numpy(zero_copy_only=False)
+    low = values.min()
+    if np.isnan(low):
+        low = np.fmin.reduce(values)
+        if np.isnan(low):
+            return None, None
+        return float(low), float(np.fmax.reduce(values))
+    return float(low), float(values.max())
+
+
+class UniqueSketch:
+    """
+    K minimum values sketch of a column: the SKETCH_SIZE smallest distinct
+    hashes seen, with how often each was seen.
+
+    The kept hashes are a uniform sample of the distinct values, so a repeat
+    among them is a certain duplicate, and the largest kept hash estimates
+    the number of distinct values. After the first batches, only the few
+    hashes below the current k-th smallest are merged in.
+    """
+
+    def __init__(self, size: int = SKETCH_SIZE):
+        self.size = size
+        self.values = 0
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    def add(self, hashes: np.ndarray):
+        self.values += len(hashes)
+        if len(self.hashes) == self.size:
+            hashes = hashes[hashes <= self.hashes[-1]]
+        if not len(hashes):
+            return
+        hashes, counts = self._smallest(hashes)
+        if not len(self.hashes):
+            self.hashes, self.counts = hashes, counts
+            return
+        # Merge with the sorted sketch, summing the counts of hashes in both
+        merged = np.concatenate([self.hashes, hashes])
+        order = np.argsort(merged, kind="stable")
+        merged, merged_counts = merged[order], np.concatenate([self.counts, counts])[order]
+        first = np.ones(len(merged), dtype=bool)
+        first[1:] = merged[1:] != merged[:-1]
+        starts = np.flatnonzero(first)
+        self.hashes = merged[starts][:self.size]
+        self.counts = np.add.reduceat(merged_counts, starts)[:self.size]
+
+    def _smallest(self, hashes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """The `size` smallest distinct hashes of a batch, sorted, with their counts."""
+        if len(hashes) > 4 * self.size:
+            # Every copy of the size-th smallest hash and below; if those are
+            # `size` distinct hashes they are the smallest, without sorting the rest
+            below = hashes[hashes <= np.partition(hashes, self.size - 1)[self.size - 1]]
+            unique, counts = np.unique(below, return_counts=True)
+            if len(unique) == self.size:
+                return unique, counts
+        unique, counts = np.unique(hashes, return_counts=True)
+        return unique[:self.size], counts[:self.size]
+
+    @property
+    def distinct_estimate(self) -> int:
+        if len(self.hashes) < self.size:
+            return len(self.hashes)
+        return min(self.values, round((self.size - 1) / ((float(self.hashes[-1]) + 1) / 2**64)))
+
+    @property
+    def sampled_duplicates(self) -> int:
+        """Values kept in the sketch that occurred more than once."""
+        return int((self.counts > 1).sum())
+
+
+########################
+# Rules and reports
+########################
+
+@dataclass(frozen=True)
+class ValidationRules:
+    """What a stream must satisfy; every rule is optional."""
+    # Column -> highest allowed fraction of nulls, e.g. {"email": 0.01}
+    max_null_rate: dict = field(default_factory=dict)
+    # Column -> (min, max) allowed values; None leaves that side open
+    ranges: dict = field(default_factory=dict)
+    # Columns whose non-null values must be distinct
+    unique: tuple = ()
+    # Compare the rows streamed with the source table's COUNT(*)
+    reconcile_count: bool = False
+    # Fail the write on a broken rule; False only reports
+    strict: bool = True
+
+    def columns(self) -> set[str]:
+        return set(self.max_null_rate) | set(self.ranges) | set(self.unique)
+
+
+@dataclass
+class ValidationReport:
+    rows: int
+    # Source COUNT(*) when reconcile_count is set
+    expected_rows: int | None
+    # Time spent validating, to compare with the ingest
+    seconds: float
+    # Column -> nulls, null_rate, min, max, out_of_range, distinct_estimate, sampled_duplicates
+    columns: dict
+    problems: list[str]
+    # Findings that don't fail the stream, e.g. a count taken outside the read's snapshot
+    warnings: list[str] = field(default_factory=list)
+    # CPU time of the validating thread; `seconds` also counts other threads (the
+    # database ingesting earlier batches) that ran on the core in between
+    cpu_seconds: float = 0.0
+
+    @property
+    def passed(self) -> bool:
+        return not self.problems
+
+    def summary(self) -> dict:
+        """Totals for a trace span."""
+        return {
+            "rows": self.rows,
+            "validation_ms": round(self.seconds * 1000, 2),
+            "validation_cpu_ms": round(self.cpu_seconds * 1000, 2),
+            "problems": len(self.problems),
+        }
+
+
+########################
+# Validating a stream
+########################
+
+class StreamValidator:
+    """
+    Checks a record batch stream against ValidationRules as it flows into
+    the local database, with one pyarrow.compute pass per rule per batch.
+
+    Pass it to a stream_*_to_duckdb function (validator=...). When the
+    stream ends, `report` holds the aggregated results. In strict mode a
+    broken rule raises ValidationError from the end of the stream, so the
+    ingest (or swap) is rolled back and the local table keeps its old data.
+    """
+
+    def __init__(self, rules: ValidationRules, sketch_size: int = SKETCH_SIZE):
+        self.rules = rules
+        self.sketch_size = sketch_size
+        # Set by the stream function when rules.reconcile_count is on
+        self.expected_rows: int | None = None
+        # Whether the count saw the same snapshot as the stream; a mismatch
+        # with a count taken separately is only a warning, since the source
+        # may have changed in between
+        self.count_consistent = False
+        self.report: ValidationReport | None = None
+        # The ValidationError raised from the stream, if any
+        self.error: ValidationError | None = None
+
+    def wrap(self, reader) -> pa.RecordBatchReader:
+        """Return the stream with every batch observed on its way through."""
+        missing = self.rules.columns() - set(reader.schema.names)
+        if missing:
+            raise ValueError(f"Validation rules name columns not in the stream: {sorted(missing)}")
+        self.report = self.error = None
+        self._rows = 0
+        self._seconds = 0.0
+        self._cpu_seconds = 0.0
+        self._nulls = dict.fromkeys(self.rules.max_null_rate, 0)
+        self._ranges = {name: {"min": None, "max": None, "out_of_range": 0} for name in self.rules.ranges}
+        self._sketches = {name: UniqueSketch(self.sketch_size) for name in self.rules.unique}
+
+        def batches():
+            pending, pending_rows = [], 0
+            for batch in reader:
+                pending.append(batch)
+                pending_rows += batch.num_rows
+                if pending_rows >= VALIDATE_ROWS:
+                    self.observe(pa.Table.from_batches(pending, reader.schema))
+                    pending, pending_rows = [], 0
+                yield batch
+            if pending:
+                self.observe(pa.Table.from_batches(pending, reader.schema))
+            self.report = self.finish()
+            if self.rules.strict and not self.report.passed:
+                self.error = ValidationError(self.report)
+                raise self.error
+
+        return pa.RecordBatchReader.from_batches(reader.schema, batches())
+
+    def observe(self, batch):
+        """Fold a record batch (or a table of several) into the running results."""
+        started, cpu_started = time.perf_counter(), time.thread_time()
+        self._rows += batch.num_rows
+        for name in self._nulls:
+            self._nulls[name] += batch.column(name).null_count
+        for name, (low, high) in self.rules.ranges.items():
+            column, seen = batch.column(name), self._ranges[name]
+            batch_min, batch_max = _bounds(column)
+            if batch_min is None:
+                continue
+            seen["min"] = batch_min if seen["min"] is None else min(seen["min"], batch_min)
+            seen["max"] = batch_max if seen["max"] is None else max(seen["max"], batch_max)
+            # Only count offending rows in the rare batches that have some
+            if (low is not None and batch_min < low) or (high is not None and batch_max > high):
+                outside = pc.less(column, low) if low is not None else None
+                if high is not None:
+                    above = pc.greater(column, high)
+                    outside = above if outside is None else pc.or_(outside, above)
+                seen["out_of_range"] += pc.sum(outside).as_py() or 0
+        for name, sketch in self._sketches.items():
+            sketch.add(hash_values(batch.column(name)))
+        self._seconds += time.perf_counter() - started
+        self._cpu_seconds += time.thread_time() - cpu_started
+
+    def finish(self) -> ValidationReport:
+        """Aggregate the observed batches and apply the rules."""
+        rows, problems = self._rows, []
+        columns = {}
+        for name, nulls in self._nulls.items():
+            rate = nulls / rows if rows else 0.0
+            columns.setdefault(name, {}).update(nulls=nulls, null_rate=round(rate, 6))
+            if rate > self.rules.max_null_rate[name]:
+                problems.append(f"{name}: {rate:.2%} nulls, over the {self.rules.max_null_rate[name]:.2%} limit")
+        for name, seen in self._ranges.items():
+            columns.setdefault(name, {}).update(seen)
+            if seen["out_of_range"]:
+                low, high = self.rules.ranges[name]
+                problems.append(f"{name}: {seen['out_of_range']:,} values outside [{low}, {high}] (min {seen['min']}, max {seen['max']})")
+        for name, sketch in self._sketches.items():
+            distinct = sketch.distinct_estimate
+            columns.setdefault(name, {}).update(distinct_estimate=distinct, sampled_duplicates=sketch.sampled_duplicates)
+            # Allow three standard errors of the estimate before calling a shortfall duplicates
+            tolerance = 0 if len(sketch.hashes) < sketch.size else 3 / math.sqrt(sketch.size)
+            if sketch.sampled_duplicates:
+                problems.append(f"{name}: not unique, {sketch.sampled_duplicates:,} of the sampled values repeat")
+            elif distinct < sketch.values * (1 - tolerance):
+                problems.append(f"{name}: not unique, about {distinct:,} distinct among {sketch.values:,} values")
+        warnings = []
+        if self.expected_rows is not None and rows != self.expected_rows:
+            if self.count_consistent:
+                problems.append(f"streamed {rows:,} rows but the source counted {self.expected_rows:,}")
+            else:
+                warnings.append(
+                    f"streamed {rows:,} rows but the source counted {self.expected_rows:,} just before; "
+                    "it may have changed in between"
+                )
+        return ValidationReport(rows, self.expected_rows, self._seconds, columns, problems, warnings, self._cpu_seconds)
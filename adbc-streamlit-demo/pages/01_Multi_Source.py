@@ -1,7 +1,9 @@
 import streamlit as st
-from functions.ingestion import pg_select_data, md_select_data, duckdb_select_data, bigquery_select_data
-import polars as pl
-import tomllib
+from functions.ingestion import pg_select_data, duckdb_select_data, bigquery_select_data
+from functions.routing import md_routed_select
+from functions.tracing import capture
+from functions.ui import render_data_usage, render_trace_panel, session_data_store, show_notices
+from functions.config import get_config
 
 # ============================================================================
 # PAGE CONFIGURATION
@@ -16,9 +18,8 @@ st.set_page_config(
 st.title("Multi Source Connection")
 st.markdown("---")
 
-# Load secrets
-with open("secrets.toml", "rb") as f:
-    secrets = tomllib.load(f)
+# Load settings (re-read when secrets.toml changes)
+config = get_config()
 
 #
 #  Instructions
@@ -74,66 +75,73 @@ with col1:
 with col2:
     row_limit = st.number_input("Row Limit", min_value=1, max_value=100000, value=10, step=1)
 
-# Initialize session state for storing results
-if "dashboard_data" not in st.session_state:
-    st.session_state.dashboard_data = {}
+# Fetched tables live in the session data store so their memory is budgeted
+store = session_data_store()
+if "dashboard_traces" not in st.session_state:
+    st.session_state.dashboard_traces = []
 
 # Only run when button is pressed
 if st.button("Pull Data"):
     # Clear session state first
-    st.session_state.dashboard_data = {}
+    store.clear("multi_source/")
+    st.session_state.dashboard_traces = []
     
     # Validate that at least one data source is selected
     if not data_sources:
         st.error("Please select at least one data source.")
     else:
-        # Fetch data for each selected source
-        for source in data_sources:
-            try:
-                if source == "Postgres":
-                    table_name = secrets.get("postgres_table_name", "streaming_data")
-                    column_names, data = pg_select_data("postgres_connection_string", table_name, row_limit)
-                    st.session_state.dashboard_data[source] = data
+        # Fetch data for each selected source, timing every query
+        with capture() as traces:
+            for source in data_sources:
+                try:
+                    if source == "Postgres":
+                        table_name = config.postgres.table_name
+                        result = pg_select_data("postgres_connection_string", table_name, row_limit)
+                        show_notices(store.put(f"multi_source/{source}", result))
                 
-                elif source == "MotherDuck":
-                    database_name = secrets.get("motherduck_db_name")
-                    table_name = secrets.get("motherduck_table_name")
-                    if not database_name or not table_name:
-                        st.error(f"Skipping {source}: motherduck_db_name or motherduck_table_name not found in secrets.toml")
-                        continue
-                    token_result, data = md_select_data(database_name, table_name, row_limit)
-                    st.session_state.dashboard_data[source] = pl.from_arrow(data)
+                    elif source == "MotherDuck":
+                        database_name = config.motherduck.db_name
+                        table_name = config.motherduck.table_name
+                        if not database_name or not table_name:
+                            st.error(f"Skipping {source}: motherduck_db_name or motherduck_table_name not found in secrets.toml")
+                            continue
+                        # Served from the local mirror when it is fresh enough ([routing] in secrets.toml)
+                        result = md_routed_select(database_name, table_name, row_limit)
+                        show_notices(store.put(f"multi_source/{source}", result))
                 
-                elif source == "DuckDB":
-                    duckdb_db_path = secrets.get("duckdb_database", "streaming_data.duckdb")
-                    table_name = secrets.get("duckdb_table_name", "default_table")
-                    try:
-                        # Try to connect to the DuckDB file
-                        import duckdb
-                        conn = duckdb.connect(duckdb_db_path)
-                        result = conn.execute(f"SELECT * FROM {table_name} LIMIT {row_limit}").fetch_arrow_table()
-                        st.session_state.dashboard_data[source] = pl.from_arrow(result)
-                        conn.close()
-                    except Exception as e:
-                        st.error(f"[DuckDB] Could not access {duckdb_db_path}: {e}")
-                        st.info(f"Use the 'Stream to DuckDB' page to create and populate a local DuckDB database.")
+                    elif source == "DuckDB":
+                        duckdb_db_path = config.duckdb.database
+                        table_name = config.duckdb.table_name
+                        try:
+                            # Read through the process-wide DuckDB database shared with the Stream page
+                            result = duckdb_select_data(table_name, row_limit, duckdb_db_path)
+                            show_notices(store.put(f"multi_source/{source}", result))
+                        except Exception as e:
+                            st.error(f"[DuckDB] Could not access {duckdb_db_path}: {e}")
+                            st.info(f"Use the 'Stream to DuckDB' page to create and populate a local DuckDB database.")
                 
-                elif source == "BigQuery":
-                    data = bigquery_select_data(row_limit)
-                    st.session_state.dashboard_data[source] = pl.from_arrow(data)
+                    elif source == "BigQuery":
+                        result = bigquery_select_data(row_limit)
+                        show_notices(store.put(f"multi_source/{source}", result))
                 
-            except Exception as e:
-                if "does not exist" in str(e) or ("relation" in str(e) and "does not exist" in str(e)):
-                    st.error(f"[{source}] Table not found. Please check the table name in secrets.toml and try again.")
-                else:
-                    st.error(f"[{source}] Error retrieving data: {e}")
+                except Exception as e:
+                    if "does not exist" in str(e) or ("relation" in str(e) and "does not exist" in str(e)):
+                        st.error(f"[{source}] Table not found. Please check the table name in secrets.toml and try again.")
+                    else:
+                        st.error(f"[{source}] Error retrieving data: {e}")
+        st.session_state.dashboard_traces = traces
 
 # ============================================================================
 # DISPLAY RESULTS
 # ============================================================================
-if st.session_state.dashboard_data:
+if store.keys("multi_source/"):
     st.markdown("---")
     
-    for source, data in st.session_state.dashboard_data.items():
-        with st.expander(f"{source}"):
-            st.dataframe(data)
+    for key, result in store.items("multi_source/"):
+        with st.expander(key.removeprefix("multi_source/")):
+            # Render the Arrow table directly; no Polars/pandas round trip
+            st.dataframe(result.to_arrow())
+
+render_data_usage(store)
+
+render_trace_panel(st.session_state.dashboard_traces)
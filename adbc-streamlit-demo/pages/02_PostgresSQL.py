@@ -1,6 +1,9 @@
 import streamlit as st
 from functions.ingestion import pg_select_data
+from functions.profiling import plan_transfer, profile_postgres
 from functions.utils import pg_discover,pg_schema
+from functions.tracing import capture
+from functions.ui import render_data_usage, render_trace_panel, session_data_store, show_notices
 
 # ============================================================================
 # PAGE CONFIGURATION
@@ -28,6 +31,7 @@ with st.expander("Instructions", expanded=True):
     3. **Select Data Options**:
        - **Info**: Displays connection and database information
        - **Schema**: Shows the table structure and column definitions
+       - **Profile**: Estimated rows, size and per-column statistics from Postgres' own statistics (no table scan), and the transfer settings they lead to
        - **Data**: Retrieves the actual table data
     4. **Click "Pull Postgres with ADBC"**: Executes the query and displays results
     
@@ -45,59 +49,79 @@ with col2:
     row_limit = st.number_input("Row Limit", min_value=1, max_value=100000, value=10, step=1)
 
 
-options = ["Info", "Schema", "Data"]
+options = ["Info", "Schema", "Profile", "Data"]
 selection = st.segmented_control(
     "Select Data to Get", options, selection_mode="multi"
 )
+optimize = st.checkbox(
+    "Optimize memory",
+    value=False,
+    help="Dictionary-encode low-cardinality text columns and downcast integer columns after fetching",
+)
 
 # Initialize session state for storing results
 if "pg_info" not in st.session_state:
     st.session_state.pg_info = None
 if "pg_schema" not in st.session_state:
     st.session_state.pg_schema = None
-if "pg_data" not in st.session_state:
-    st.session_state.pg_data = None
+if "pg_profile" not in st.session_state:
+    st.session_state.pg_profile = None
+store = session_data_store()
+if "pg_traces" not in st.session_state:
+    st.session_state.pg_traces = []
 
 # Only run when button is pressed
 if st.button("Pull Postgres with ADBC"):
     # Clear all session state first
     st.session_state.pg_info = None
     st.session_state.pg_schema = None
-    st.session_state.pg_data = None
+    st.session_state.pg_profile = None
+    store.delete("postgres/data")
+    st.session_state.pg_traces = []
     
     # Check if a selection was made
     if not selection:
         st.error("Please select at least one option from 'Select Data to Get' before submitting.")
     # Only fetch data for selected options
     elif selection:
-        if "Info" in selection:
-            st.session_state.pg_info = pg_discover("postgres_connection_string")
-        if "Schema" in selection:
-            if not table_name.strip():
-                st.session_state.pg_schema = None
-                st.error("Please specify a table name before fetching schema.")
-            else:
-                try:
-                    st.session_state.pg_schema = pg_schema("postgres_connection_string", table_name)
-                except Exception as e:
+        with capture() as traces:
+            if "Info" in selection:
+                st.session_state.pg_info = pg_discover("postgres_connection_string")
+            if "Schema" in selection:
+                if not table_name.strip():
                     st.session_state.pg_schema = None
-                    if "does not exist" in str(e) or ("relation" in str(e) and "does not exist" in str(e)):
-                        st.error(f"Table '{table_name}' not found in the database. Please check the table name and try again.")
-                    else:
-                        st.error(f"Error retrieving schema: {e}")
-        if "Data" in selection:
-            if not table_name.strip():
-                st.error("Please specify a table name before fetching data.")
-            else:
-                try:
-                    column_names, data = pg_select_data("postgres_connection_string", table_name, row_limit)
-                    st.session_state.pg_data = data
-                except Exception as e:
-                    # Gracefully handle if table does not exist
-                    if "does not exist" in str(e) or ("relation" in str(e) and "does not exist" in str(e)):
-                        st.error(f"Table '{table_name}' not found in the database. Please check the table name and try again.")
-                    else:
-                        st.error(f"Error retrieving data: {e}")
+                    st.error("Please specify a table name before fetching schema.")
+                else:
+                    try:
+                        st.session_state.pg_schema = pg_schema("postgres_connection_string", table_name)
+                    except Exception as e:
+                        st.session_state.pg_schema = None
+                        if "does not exist" in str(e) or ("relation" in str(e) and "does not exist" in str(e)):
+                            st.error(f"Table '{table_name}' not found in the database. Please check the table name and try again.")
+                        else:
+                            st.error(f"Error retrieving schema: {e}")
+            if "Profile" in selection:
+                if not table_name.strip():
+                    st.error("Please specify a table name before profiling.")
+                else:
+                    try:
+                        st.session_state.pg_profile = profile_postgres(table_name, refresh=True)
+                    except Exception as e:
+                        st.error(f"Error profiling table: {e}")
+            if "Data" in selection:
+                if not table_name.strip():
+                    st.error("Please specify a table name before fetching data.")
+                else:
+                    try:
+                        result = pg_select_data("postgres_connection_string", table_name, row_limit, optimize=optimize)
+                        show_notices(store.put("postgres/data", result))
+                    except Exception as e:
+                        # Gracefully handle if table does not exist
+                        if "does not exist" in str(e) or ("relation" in str(e) and "does not exist" in str(e)):
+                            st.error(f"Table '{table_name}' not found in the database. Please check the table name and try again.")
+                        else:
+                            st.error(f"Error retrieving data: {e}")
+        st.session_state.pg_traces = traces
 
 # Display results if they exist in session state
 if st.session_state.pg_info is not None:
@@ -108,8 +132,29 @@ if st.session_state.pg_schema is not None:
     st.subheader("Table Schema")
     st.code(st.session_state.pg_schema, language="text")
 
-if st.session_state.pg_data is not None:
+if st.session_state.pg_profile is not None:
+    profile = st.session_state.pg_profile
+    st.subheader("Table Profile")
+    col1, col2 = st.columns(2)
+    col1.metric("Estimated rows", f"{profile.row_estimate:,}" if profile.row_estimate is not None else "not analyzed")
+    col2.metric("Size", f"{profile.size_bytes / 1024 / 1024:,.2f} MB" if profile.size_bytes is not None else "unknown")
+    st.dataframe(profile.column_rows())
+    st.caption(f"From {profile.method}; as fresh as the table's last ANALYZE")
+    st.json(plan_transfer(profile), expanded=False)
+
+if "postgres/data" in store:
     st.subheader("streaming_data Table")
-    st.write(st.session_state.pg_data)
+    result = store.get("postgres/data")
+    st.dataframe(result.to_arrow())
+    if result.optimization:
+        report = result.optimization
+        st.caption(
+            f"Optimized: {report['before_bytes'] / 1024 / 1024:,.2f} MB -> {report['after_bytes'] / 1024 / 1024:,.2f} MB "
+            f"({report['saved_ratio']:.0%} smaller)"
+        )
+        if report["columns"]:
+            st.json(report["columns"], expanded=False)
+    render_data_usage(store)
+
 
-    
\ No newline at end of file
+render_trace_panel(st.session_state.pg_traces)
@@ -1,6 +1,8 @@
 import streamlit as st
-from functions.ingestion import md_select_data
-import polars as pl
+from functions.ingestion import md_select_data, md_token_status
+from functions.routing import md_routed_select
+from functions.tracing import capture
+from functions.ui import render_data_usage, render_trace_panel, session_data_store, show_notices
 
 # ============================================================================
 # PAGE CONFIGURATION
@@ -28,7 +30,11 @@ with st.expander("Instructions", expanded=True):
     3. **Set Row Limit**: Choose how many rows to fetch (1-100,000)
     4. **Click "Pull MotherDuck with ADBC"**: Executes the query and displays results
 
-    Note: Make sure you have a MotherDuck account so you can auth in
+    Note: Make sure you have a MotherDuck account so you can auth in.
+    The session is opened and authenticated once per database and reused by
+    later queries; use "Check MotherDuck login" to confirm the token.
+    With "Use local mirror" ticked, tables copied by the Stream to DuckDB page
+    are read from the local file while the copy is fresh enough.
     """)
 
 st.markdown("---")
@@ -44,22 +50,31 @@ with col2:
 with col3:
     row_limit = st.number_input("Row Limit", min_value=1, max_value=100000, value=10, step=1)
 
+use_mirror = st.checkbox("Use local mirror when fresh", value=True, help="Serve from the local DuckDB copy if it is within [routing] max_age_seconds")
+
 # Initialize session state for storing results
-if "md_data" not in st.session_state:
-    st.session_state.md_data = None
+store = session_data_store()
+if "md_traces" not in st.session_state:
+    st.session_state.md_traces = []
 
 # Only run when button is pressed
 if st.button("Pull MotherDuck with ADBC"):
     # Clear session state first
-    st.session_state.md_data = None
+    store.delete("motherduck/data")
+    st.session_state.md_traces = []
     
     # Validate inputs
     if not table_name.strip():
         st.error("Please specify a table name before fetching data.")
     else:
         try:
-            data = md_select_data(database_name, table_name, row_limit)
-            st.session_state.md_data = pl.from_arrow(data)
+            with capture() as traces:
+                if use_mirror:
+                    result = md_routed_select(database_name, table_name, row_limit)
+                else:
+                    result = md_select_data(database_name, table_name, row_limit)
+            st.session_state.md_traces = traces
+            show_notices(store.put("motherduck/data", result))
         except Exception as e:
             # Gracefully handle if table does not exist
             if "does not exist" in str(e) or ("relation" in str(e) and "does not exist" in str(e)):
@@ -67,7 +82,26 @@ if st.button("Pull MotherDuck with ADBC"):
             else:
                 st.error(f"Error retrieving data: {e}")
 
+# Token lookup is a separate diagnostic, never part of a query
+with st.expander("Connection diagnostics"):
+    if st.button("Check MotherDuck login"):
+        try:
+            status = md_token_status(database_name)
+            if status["authenticated"]:
+                st.success(f"Authenticated with token {status['token']}")
+            else:
+                st.warning("Connected, but no MotherDuck token is set for this session.")
+        except Exception as e:
+            st.error(f"Could not open a MotherDuck session: {e}")
+
 # Display results if they exist in session state
-if st.session_state.md_data is not None:
+if "motherduck/data" in store:
     st.subheader("MotherDuck Table Data")
-    st.dataframe(st.session_state.md_data)
+    # Which path served the query, from the 'route' span of its trace
+    for trace in st.session_state.md_traces:
+        for route in (s for s in trace.spans if s.name == "route"):
+            st.caption(f"Served by {route.attributes['served_by']} ({route.attributes['reason']}) in {trace.seconds * 1000:,.0f} ms")
+    st.dataframe(store.get("motherduck/data").to_arrow())
+    render_data_usage(store)
+
+render_trace_panel(st.session_state.md_traces)
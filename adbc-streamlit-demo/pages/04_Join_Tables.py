@@ -1,6 +1,8 @@
 import streamlit as st
 from functions.ingestion import pg_select_data, bigquery_select_data, md_select_data, duckdb_select_data
-import tomllib
+from functions.config import get_config
+from functions.tracing import capture
+from functions.ui import render_data_usage, render_trace_panel, session_data_store, show_notices
 
 # ============================================================================
 # PAGE CONFIGURATION
@@ -35,9 +37,8 @@ with st.expander("Instructions", expanded=True):
 
 st.markdown("---")
 
-# Load secrets
-with open("secrets.toml", "rb") as f:
-    secrets = tomllib.load(f)
+# Load settings (re-read when secrets.toml changes)
+config = get_config()
 
 # ============================================================================
 # DATABASE SELECTION
@@ -63,27 +64,25 @@ with col_db2:
 # HELPER FUNCTION TO FETCH DATA
 # ============================================================================
 def fetch_data_from_source(source: str, row_limit: int = 1000):
-    """Fetch data from the specified data source and return PyArrow table."""
+    """Fetch data from the specified data source and return a QueryResult."""
     try:
         if source == "Postgres":
-            table_name = secrets.get("postgres_table_name", "streaming_data")
-            column_names, data = pg_select_data("postgres_connection_string", table_name, row_limit)
-            return data
+            table_name = config.postgres.table_name
+            return pg_select_data("postgres_connection_string", table_name, row_limit)
         
         elif source == "BigQuery":
             return bigquery_select_data(row_limit)
         
         elif source == "MotherDuck":
-            database_name = secrets.get("motherduck_db_name")
-            table_name = secrets.get("motherduck_table_name")
+            database_name = config.motherduck.db_name
+            table_name = config.motherduck.table_name
             if not database_name or not table_name:
                 st.error(f"Skipping {source}: motherduck_db_name or motherduck_table_name not found in secrets.toml")
                 return None
-            token_result, data = md_select_data(database_name, table_name, row_limit)
-            return data
+            return md_select_data(database_name, table_name, row_limit)
         
         elif source == "DuckDB":
-            table_name = secrets.get("duckdb_table_name", "default_table")
+            table_name = config.duckdb.table_name
             return duckdb_select_data(table_name, row_limit)
     
     except Exception as e:
@@ -98,50 +97,56 @@ def fetch_data_from_source(source: str, row_limit: int = 1000):
 # GET DATA BUTTON
 # ============================================================================
 
-# Initialize session state for storing results
-if "dashboard_data" not in st.session_state:
-    st.session_state.dashboard_data = {}
+# Fetched tables live in the session data store so their memory is budgeted
+store = session_data_store()
+if "join_traces" not in st.session_state:
+    st.session_state.join_traces = []
 
 if st.button("Get Data", key="get_data_button"):
     # Clear session state first
-    st.session_state.dashboard_data = {}
+    store.clear("join/")
     
-    # Fetch data from Database 1
-    arrow_table_1 = fetch_data_from_source(database_1, 1000)
-    if arrow_table_1 is not None:
-        st.session_state.dashboard_data["db1_arrow"] = arrow_table_1
-    
-    # Fetch data from Database 2
-    arrow_table_2 = fetch_data_from_source(database_2, 1000)
-    if arrow_table_2 is not None:
-        st.session_state.dashboard_data["db2_arrow"] = arrow_table_2
+    with capture() as traces:
+        # Fetch data from Database 1
+        arrow_table_1 = fetch_data_from_source(database_1, 1000)
+        if arrow_table_1 is not None:
+            show_notices(store.put("join/db1_arrow", arrow_table_1))
+        
+        # Fetch data from Database 2
+        arrow_table_2 = fetch_data_from_source(database_2, 1000)
+        if arrow_table_2 is not None:
+            show_notices(store.put("join/db2_arrow", arrow_table_2))
+    st.session_state.join_traces = traces
 
 # ============================================================================
 # DISPLAY RESULTS
 # ============================================================================
-if st.session_state.dashboard_data:
+if store.keys("join/"):
     st.markdown("---")
     
     # Show individual tables side by side
     col1, col2 = st.columns(2)
     
     with col1:
-        if "db1_arrow" in st.session_state.dashboard_data:
+        if "join/db1_arrow" in store:
             st.subheader(f"{database_1} Data")
-            st.write(st.session_state.dashboard_data["db1_arrow"])
+            st.dataframe(store.get("join/db1_arrow").to_arrow())
     
     with col2:
-        if "db2_arrow" in st.session_state.dashboard_data:
+        if "join/db2_arrow" in store:
             st.subheader(f"{database_2} Data")
-            st.write(st.session_state.dashboard_data["db2_arrow"])
+            st.dataframe(store.get("join/db2_arrow").to_arrow())
+
+    render_data_usage(store)
+    render_trace_panel(st.session_state.join_traces)
     
     # Join tables section
     st.markdown("---")
     st.subheader("Join Tables")
     
-    if "db1_arrow" in st.session_state.dashboard_data and "db2_arrow" in st.session_state.dashboard_data:
-        table_1 = st.session_state.dashboard_data["db1_arrow"]
-        table_2 = st.session_state.dashboard_data["db2_arrow"]
+    if "join/db1_arrow" in store and "join/db2_arrow" in store:
+        table_1 = store.get("join/db1_arrow").to_arrow()
+        table_2 = store.get("join/db2_arrow").to_arrow()
         
         # Get column names from both tables
         columns_1 = table_1.column_names
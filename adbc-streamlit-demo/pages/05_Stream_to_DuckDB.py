@@ -1,12 +1,19 @@
 import streamlit as st
 import os
-import tomllib
-import duckdb
+from functions.config import get_config
+from functions.dashboard import AGGREGATES, SAMPLE_METHODS, aggregate, column_types, histogram, numeric_columns, preview, sample
+from functions.duckdb_manager import get_database
+from functions.export import EXPORT_MODES, duckdb_to_postgres
 from functions.ingestion import (
     stream_postgres_to_duckdb,
     stream_motherduck_to_duckdb,
     stream_bigquery_to_duckdb,
 )
+from functions.profiling import planned_export_partitions
+from functions.scheduler import RefreshJob, get_scheduler
+from functions.tracing import capture
+from functions.ui import render_trace_panel
+from functions.validation import StreamValidator, ValidationError, ValidationRules
 
 # ============================================================================
 # PAGE CONFIGURATION
@@ -20,9 +27,8 @@ st.set_page_config(
 st.title("Stream Cloud DB to Local DuckDB")
 st.markdown("---")
 
-# Load secrets
-with open("secrets.toml", "rb") as f:
-    secrets = tomllib.load(f)
+# Load settings (re-read when secrets.toml changes)
+config = get_config()
 
 # ============================================================================
 # CONSTANTS
@@ -43,7 +49,7 @@ with st.expander("Instructions", expanded=True):
         1. Select your data source (BigQuery, MotherDuck, or Postgres)
         2. The table name will be read from your secrets.toml configuration
         3. Click 'Stream Data' to begin streaming the data
-        4. A local DuckDB database will be created in your working directory
+        4. A local DuckDB database will be created in your working directory (a rebuild replaces the table only once the new copy is complete)
         5. You can query the resulting DuckDB table and view the results
         6. This local DuckDB database will also be read in the Multi Source Page
         """
@@ -71,6 +77,35 @@ with col3:
     st.write("**DuckDB File Name**")
     st.write("streaming_data.duckdb")
 
+# Rebuild the local copy from scratch, or merge the new pull into it on a key.
+# A rebuild is written next to the current table and swapped in once verified,
+# so other pages keep reading the old copy meanwhile and a failed stream keeps it
+refresh_mode = st.radio("Refresh Mode", ["Rebuild", "Merge"], horizontal=True)
+write_options = {"mode": "swap"}
+if refresh_mode == "Merge":
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        primary_key = st.text_input("Primary key column(s), comma separated", value="id")
+    with col2:
+        delete_missing = st.checkbox("Delete rows missing from the source", value=False)
+    write_options = {
+        "mode": "merge",
+        "primary_key": [c.strip() for c in primary_key.split(",") if c.strip()],
+        "delete_missing": delete_missing,
+    }
+
+# Optional checks on the stream while it is written; a failed check keeps the previous table
+with st.expander("Validation", expanded=False):
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        unique_columns = st.text_input("Columns that must be unique, comma separated", value="")
+    with col2:
+        reconcile_count = st.checkbox("Compare row count with the source", value=False)
+    validation_rules = ValidationRules(
+        unique=tuple(c.strip() for c in unique_columns.split(",") if c.strip()),
+        reconcile_count=reconcile_count,
+    )
+
 # Initialize session state for storing results
 if "streaming_complete" not in st.session_state:
     st.session_state.streaming_complete = False
@@ -84,6 +119,12 @@ if "db_path" not in st.session_state:
 if "local_table_name" not in st.session_state:
     st.session_state.local_table_name = None
 
+if "stream_traces" not in st.session_state:
+    st.session_state.stream_traces = []
+
+if "validation_report" not in st.session_state:
+    st.session_state.validation_report = None
+
 # ============================================================================
 # STREAMING LOGIC
 # ============================================================================
@@ -94,41 +135,39 @@ if st.button("Stream Data", type="primary"):
     else:
         db_path = os.path.join(os.getcwd(), DB_FILENAME)
         
-        # Check if DuckDB file exists and delete it
-        if os.path.exists(db_path):
-            try:
-                os.remove(db_path)
-                st.info(f"Existing DuckDB file deleted: {DB_FILENAME}")
-            except Exception as e:
-                st.error(f"Failed to delete existing DuckDB file: {e}")
-                st.stop()
-        
         progress_bar = st.progress(0)
         status_text = st.empty()
         
         try:
             status_text.text(f"Starting stream from {data_source}...")
             
-            # Stream based on selected data source
-            if data_source == "Postgres":
-                table_name = secrets.get("postgres_table_name", "streaming_data")
-                status_text.text(f"Streaming from Postgres table: {table_name}")
-                total_rows = stream_postgres_to_duckdb(db_path, table_name, LOCAL_TABLE_NAME)
+            validator = StreamValidator(validation_rules) if validation_rules.columns() or validation_rules.reconcile_count else None
+            st.session_state.validation_report = None
             
-            elif data_source == "MotherDuck":
-                database_name = secrets.get("motherduck_db_name")
-                table_name = secrets.get("motherduck_table_name")
+            # Stream based on selected data source, timing each step
+            with capture() as traces:
+                if data_source == "Postgres":
+                    table_name = config.postgres.table_name
+                    status_text.text(f"Streaming from Postgres table: {table_name}")
+                    total_rows = stream_postgres_to_duckdb(db_path, table_name, LOCAL_TABLE_NAME, adaptive=True, validator=validator, **write_options)
+            
+                elif data_source == "MotherDuck":
+                    database_name = config.motherduck.db_name
+                    table_name = config.motherduck.table_name
                 
-                if not database_name or not table_name:
-                    st.error("MotherDuck configuration not found in secrets.toml")
-                    st.stop()
+                    if not database_name or not table_name:
+                        st.error("MotherDuck configuration not found in secrets.toml")
+                        st.stop()
                 
-                status_text.text(f"Streaming from MotherDuck: {database_name}.{table_name}")
-                total_rows = stream_motherduck_to_duckdb(db_path, database_name, table_name, LOCAL_TABLE_NAME)
+                    status_text.text(f"Streaming from MotherDuck: {database_name}.{table_name}")
+                    total_rows = stream_motherduck_to_duckdb(db_path, database_name, table_name, LOCAL_TABLE_NAME, validator=validator, **write_options)
+            
+                elif data_source == "BigQuery":
+                    status_text.text(f"Streaming from BigQuery")
+                    total_rows = stream_bigquery_to_duckdb(db_path, LOCAL_TABLE_NAME, validator=validator, **write_options)
             
-            elif data_source == "BigQuery":
-                status_text.text(f"Streaming from BigQuery")
-                total_rows = stream_bigquery_to_duckdb(db_path, LOCAL_TABLE_NAME)
+            st.session_state.stream_traces = traces
+            st.session_state.validation_report = validator.report if validator else None
             
             # Update session state
             st.session_state.streaming_complete = True
@@ -139,10 +178,69 @@ if st.button("Stream Data", type="primary"):
             status_text.text(f"Streaming complete! {total_rows:,} rows written to {LOCAL_TABLE_NAME}")
             progress_bar.progress(100)
             
+        except ValidationError as e:
+            st.error(f"Validation failed, the previous table was kept: {'; '.join(e.report.problems)}")
+            st.dataframe([{"column": name, **stats} for name, stats in e.report.columns.items()])
         except Exception as e:
             st.error(f"Error during streaming: {e}")
             st.session_state.streaming_complete = False
 
+# ============================================================================
+# BACKGROUND REFRESH
+# ============================================================================
+
+# Jobs run on the app's scheduler thread, so this page stays responsive and
+# readers keep the old table until the rebuilt copy is swapped in
+scheduler = get_scheduler(os.path.join(os.getcwd(), DB_FILENAME))
+page_job = f"{data_source.lower()} -> {LOCAL_TABLE_NAME}" if data_source else None
+
+with st.expander("Background Refresh", expanded=False):
+    if st.button("Run in Background", disabled=page_job is None):
+        try:
+            scheduler.submit(RefreshJob(page_job, data_source.lower(), LOCAL_TABLE_NAME, interval_seconds=None))
+            scheduler.start()
+            st.session_state.background_job = page_job
+            st.session_state.background_runs = 0
+        except Exception as e:
+            st.error(f"Could not submit job: {e}")
+
+    configured = [job["job"] for job in scheduler.status() if job["job"] != page_job]
+    if configured:
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            job_name = st.selectbox("Configured job", configured)
+        with col2:
+            if st.button("Run Now"):
+                try:
+                    scheduler.run_now(job_name)
+                    scheduler.start()
+                except ValueError as e:
+                    # The job list follows secrets.toml and may have changed since the rerun
+                    st.error(f"Could not run job: {e}")
+
+    @st.fragment(run_every=5)
+    def job_status():
+        jobs = scheduler.status()
+        if not jobs:
+            st.caption("No jobs. Add [[scheduler.jobs]] to secrets.toml or run the selected source in the background.")
+            return
+        st.dataframe(jobs, hide_index=True)
+        if not scheduler.running:
+            st.caption("Scheduler stopped; set [scheduler] enabled = true to run configured jobs on their intervals.")
+        # Show the table of this page's background job once it has finished
+        name = st.session_state.get("background_job")
+        mine = scheduler.status(name) if name else []
+        if mine and mine[0]["state"] == "succeeded" and mine[0]["runs"] > st.session_state.background_runs:
+            st.session_state.background_runs = mine[0]["runs"]
+            st.session_state.streaming_complete = True
+            st.session_state.total_rows = mine[0]["last_rows"]
+            st.session_state.db_path = scheduler.db_path
+            st.session_state.local_table_name = LOCAL_TABLE_NAME
+            st.session_state.stream_traces = scheduler.traces(name)
+            st.rerun(scope="app")
+
+    job_status()
+
 # ============================================================================
 # DISPLAY RESULTS
 # ============================================================================
@@ -159,10 +257,21 @@ if st.session_state.streaming_complete and st.session_state.db_path:
         db_size = os.path.getsize(st.session_state.db_path) / (1024 * 1024)
         st.metric("DuckDB File Size", f"{db_size:.2f} MB")
     
+    render_trace_panel(st.session_state.stream_traces, "Stream Timing")
+    
+    if st.session_state.validation_report is not None:
+        report = st.session_state.validation_report
+        with st.expander(f"Validation passed ({report.seconds * 1000:,.0f} ms)", expanded=False):
+            if report.expected_rows is not None:
+                st.write(f"Source count: {report.expected_rows:,} rows, streamed: {report.rows:,}")
+            for warning in report.warnings:
+                st.warning(warning)
+            st.dataframe([{"column": name, **stats} for name, stats in report.columns.items()])
+    
     st.markdown("---")
     
-    # Query the local DuckDB instance
-    conn = duckdb.connect(st.session_state.db_path)
+    # Query the local DuckDB instance through this thread's cursor on the shared database
+    conn = get_database(st.session_state.db_path).cursor()
     
     try:
         # Display table schema
@@ -200,16 +309,108 @@ if st.session_state.streaming_complete and st.session_state.db_path:
         
         if st.button("Execute Query"):
             try:
-                result = conn.execute(custom_query).fetch_arrow_table()
+                # Only the first rows are read into memory, however large the result
+                result, truncated = preview(st.session_state.db_path, custom_query)
                 st.dataframe(result)
-                st.success(f"Query returned {result.num_rows} rows")
+                if truncated:
+                    st.warning(f"Showing the first {result.num_rows:,} rows; use the charts below to summarize the whole table")
+                else:
+                    st.success(f"Query returned {result.num_rows} rows")
             except Exception as e:
                 st.error(f"Query error: {e}")
     
     except Exception as e:
         st.error(f"Error accessing table: {e}")
-    finally:
-        conn.close()
+
+    # Charts reduce the table inside DuckDB, so only small results reach the browser
+    st.markdown("---")
+    st.subheader("Charts")
+    
+    try:
+        db_path, table = st.session_state.db_path, st.session_state.local_table_name
+        columns = list(column_types(db_path, table))
+        numeric = numeric_columns(db_path, table)
+        histogram_tab, aggregate_tab, sample_tab = st.tabs(["Histogram", "Group By", "Sample"])
+        
+        with histogram_tab:
+            if not numeric:
+                st.info("No numeric columns to plot.")
+            else:
+                col1, col2 = st.columns([2, 1])
+                with col1:
+                    histogram_column = st.selectbox("Column", numeric, key="histogram_column")
+                with col2:
+                    bins = st.slider("Bins", min_value=5, max_value=200, value=30)
+                bars = histogram(db_path, table, histogram_column, bins)
+                st.bar_chart(bars.select(["bin_start", "count"]), x="bin_start", y="count")
+        
+        with aggregate_tab:
+            col1, col2, col3 = st.columns([2, 2, 1])
+            with col1:
+                group_column = st.selectbox("Group by", columns, key="group_column")
+            with col2:
+                measure_column = st.selectbox("Measure", numeric or columns, key="measure_column")
+            with col3:
+                function = st.selectbox("Aggregate", AGGREGATES, index=AGGREGATES.index("avg") if numeric else 0)
+            groups = aggregate(db_path, table, [group_column], {measure_column: function}, limit=50)
+            st.bar_chart(groups, x=group_column, y=f"{function}_{measure_column}")
+            st.caption(f"Largest {groups.num_rows} groups by row count")
+        
+        with sample_tab:
+            if len(numeric) < 2:
+                st.info("Need two numeric columns for a scatter plot.")
+            else:
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    x_column = st.selectbox("X", numeric, key="sample_x")
+                with col2:
+                    y_column = st.selectbox("Y", numeric, index=1, key="sample_y")
+                with col3:
+                    sample_rows = st.number_input("Rows", min_value=100, max_value=10_000, value=2_000, step=100)
+                with col4:
+                    sample_method = st.selectbox("Method", SAMPLE_METHODS)
+                points = sample(db_path, table, int(sample_rows), sample_method, list(dict.fromkeys([x_column, y_column])))
+                st.scatter_chart(points, x=x_column, y=y_column)
+    except Exception as e:
+        st.error(f"Chart error: {e}")
+
+    # Push the local table back into Postgres
+    st.markdown("---")
+    st.subheader("Export to Postgres")
+    
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        target_table = st.text_input("Postgres table", value=st.session_state.local_table_name)
+    with col2:
+        export_mode = st.selectbox("Mode", EXPORT_MODES, index=EXPORT_MODES.index("replace"))
+    with col3:
+        planned = planned_export_partitions(st.session_state.db_path, st.session_state.local_table_name, config.postgres.export_partitions)
+        partitions = st.number_input(
+            "Parallel writers",
+            min_value=1,
+            max_value=16,
+            value=min(planned, 16),
+            step=1,
+            help="Planned from the table's row count: one writer per million rows, up to [postgres] export_partitions",
+        )
+    
+    if st.button("Export to Postgres"):
+        try:
+            with st.spinner(f"Writing {st.session_state.local_table_name} to Postgres..."):
+                report = duckdb_to_postgres(
+                    st.session_state.db_path,
+                    st.session_state.local_table_name,
+                    target_table,
+                    mode=export_mode,
+                    partitions=int(partitions),
+                )
+            st.success(
+                f"Wrote {report['rows']:,} rows to {report['target']} in {report['seconds']:.2f}s "
+                f"({report['rows_per_second']:,} rows/s, {report['mb_per_second']} MB/s)"
+            )
+            st.dataframe(report["partition_reports"])
+        except Exception as e:
+            st.error(f"Export error: {e}")
 
     # Display file location
     st.markdown("---")
@@ -0,0 +1,46 @@
+import threading
+import time
+
+import pyarrow as pa
+
+
+class MockStreamOpener:
+    """
+    Local stand-in for the BigQuery Storage Read API streams, for
+    functions.bigquery_streams.read_parallel(opener=...).
+
+    Splits an Arrow table into `streams` contiguous streams of `batch_rows`
+    batches and sleeps `latency` seconds before each batch, like a network
+    read, so parallel reading can be measured and checked without BigQuery.
+    Stream `fail_stream`, if set, raises after its first batch. `opened`
+    counts the streams a reader has started.
+    """
+
+    def __init__(self, table, streams: int = 8, batch_rows: int = 10_000, latency: float = 0.005, fail_stream: int | None = None):
+        self.table = table
+        self.streams = streams
+        self.batch_rows = batch_rows
+        self.latency = latency
+        self.fail_stream = fail_stream
+        self.opened = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, cursor, query: str, max_streams: int):
+        step = max(1, -(-self.table.num_rows // self.streams))
+
+        def opener(index, part):
+            def open_stream():
+                with self._lock:
+                    self.opened += 1
+
+                def batches():
+                    for number, batch in enumerate(part.to_batches(max_chunksize=self.batch_rows)):
+                        if index == self.fail_stream and number == 1:
+                            raise RuntimeError(f"stream {index} failed")
+                        time.sleep(self.latency)
+                        yield batch
+                return pa.RecordBatchReader.from_batches(self.table.schema, batches())
+            return open_stream
+
+        parts = [self.table.slice(offset, step) for offset in range(0, self.table.num_rows, step)]
+        return self.table.schema, [opener(i, part) for i, part in enumerate(parts)]
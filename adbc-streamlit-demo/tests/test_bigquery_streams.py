@@ -0,0 +1,94 @@
+import gc
+import threading
+
+import pyarrow as pa
+import pytest
+
+from functions.bigquery_streams import (
+    PREFETCH_CONCURRENCY_OPTION,
+    RESULT_BUFFER_SIZE_OPTION,
+    read_parallel,
+    storage_streams,
+)
+from tests.mock_streams import MockStreamOpener
+
+TABLE = pa.table({"id": pa.array(range(10_000), pa.int64())})
+
+
+def _stream_threads() -> list[threading.Thread]:
+    return [t for t in threading.enumerate() if t.name.startswith("bigquery-stream-")]
+
+
+@pytest.mark.parametrize("max_streams", [1, 3, 8, 16])
+def test_every_batch_arrives_exactly_once(max_streams):
+    opener = MockStreamOpener(TABLE, streams=8, batch_rows=250, latency=0)
+    merged = read_parallel(None, "", max_streams, buffer_batches=2, opener=opener).read_all()
+    assert merged.schema == TABLE.schema
+    assert sorted(merged.column("id").to_pylist()) == list(range(TABLE.num_rows))
+    assert opener.opened == 8
+
+
+def test_a_failing_stream_fails_the_consumer():
+    opener = MockStreamOpener(TABLE, streams=8, batch_rows=250, latency=0, fail_stream=5)
+    reader = read_parallel(None, "", 4, buffer_batches=2, opener=opener)
+    with pytest.raises(RuntimeError, match="stream 5 failed"):
+        reader.read_all()
+    del reader
+    gc.collect()
+    for thread in _stream_threads():
+        thread.join(timeout=5)
+    assert not _stream_threads()
+
+
+def test_a_consumer_that_stops_early_stops_the_readers():
+    opener = MockStreamOpener(TABLE, streams=40, batch_rows=50, latency=0)
+    reader = read_parallel(None, "", 4, buffer_batches=1, opener=opener)
+    reader.read_next_batch()
+    assert _stream_threads()
+
+    # Releasing the reader cancels the merge; blocked readers give up their put
+    del reader
+    gc.collect()
+    for thread in _stream_threads():
+        thread.join(timeout=5)
+    assert not _stream_threads()
+    assert opener.opened < 40
+
+
+class _Statement:
+    def __init__(self):
+        self.options = {}
+
+    def set_options(self, **options):
+        self.options.update(options)
+
+
+class _UnpartitionedCursor:
+    """A cursor whose driver can't hand out partitions."""
+
+    def __init__(self):
+        self.adbc_statement = _Statement()
+        self.executed = []
+
+    def adbc_execute_partitions(self, query):
+        from adbc_driver_manager import dbapi
+
+        raise dbapi.NotSupportedError("partitions not supported")
+
+    def execute(self, query):
+        self.executed.append(query)
+
+    def fetch_record_batch(self):
+        return pa.RecordBatchReader.from_batches(TABLE.schema, TABLE.to_batches(max_chunksize=1000))
+
+
+def test_drivers_without_partitions_read_one_stream_with_prefetch():
+    pytest.importorskip("adbc_driver_manager.dbapi")
+    cursor = _UnpartitionedCursor()
+    schema, streams = storage_streams(cursor, "SELECT * FROM t", 4)
+    assert schema == TABLE.schema and len(streams) == 1
+    assert cursor.executed == ["SELECT * FROM t"]
+    assert cursor.adbc_statement.options == {PREFETCH_CONCURRENCY_OPTION: "4", RESULT_BUFFER_SIZE_OPTION: "200"}
+
+    merged = read_parallel(_UnpartitionedCursor(), "SELECT * FROM t", 4).read_all()
+    assert merged.column("id").to_pylist() == list(range(TABLE.num_rows))
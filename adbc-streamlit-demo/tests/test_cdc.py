@@ -0,0 +1,203 @@
+import json
+import struct
+
+from functions.cdc import (
+    CHECKPOINT_TABLE,
+    CdcFollower,
+    Change,
+    collapse_changes,
+    decode_pgoutput,
+    decode_wal2json,
+    parse_lsn,
+)
+from functions.duckdb_manager import close_database, get_database
+
+########################
+# pgoutput messages
+########################
+
+def _begin() -> bytes:
+    return b"B" + struct.pack("!qqi", 0, 0, 1)
+
+
+def _commit(end_lsn: int) -> bytes:
+    return b"C" + struct.pack("!bqqq", 0, end_lsn - 8, end_lsn, 0)
+
+
+def _relation(relid: int, namespace: str, name: str, columns: list[str]) -> bytes:
+    data = b"R" + struct.pack("!i", relid) + namespace.encode() + b"\0" + name.encode() + b"\0"
+    data += struct.pack("!bh", ord("d"), len(columns))
+    for column in columns:
+        data += struct.pack("!b", 0) + column.encode() + b"\0" + struct.pack("!ii", 25, -1)
+    return data
+
+
+def _tuple(values: list) -> bytes:
+    data = struct.pack("!h", len(values))
+    for value in values:
+        if value is None:
+            data += b"n"
+        elif value is ...:
+            data += b"u"
+        else:
+            data += b"t" + struct.pack("!i", len(value.encode())) + value.encode()
+    return data
+
+
+def _rows(*messages: bytes) -> list:
+    return [(None, message) for message in messages]
+
+
+def test_decode_pgoutput():
+    relation = _relation(7, "public", "orders", ["id", "note", "body"])
+    transactions = list(decode_pgoutput(_rows(
+        relation,
+        _begin(),
+        b"I" + struct.pack("!i", 7) + b"N" + _tuple(["1", None, "long text"]),
+        b"U" + struct.pack("!i", 7) + b"K" + _tuple(["1", None, None]) + b"N" + _tuple(["2", "x", ...]),
+        b"D" + struct.pack("!i", 7) + b"K" + _tuple(["2", None, None]),
+        _commit(0x100),
+        _begin(),
+        b"T" + struct.pack("!ib", 1, 0) + struct.pack("!i", 7),
+        _commit(0x200),
+    )))
+
+    assert [t.commit_lsn for t in transactions] == [0x100, 0x200]
+    insert, update, delete = transactions[0].changes
+    assert insert == Change("public.orders", "I", {"id": "1", "note": None, "body": "long text"})
+    # The unchanged TOASTed body is left out, so the mirror keeps its value
+    assert update == Change("public.orders", "U", {"id": "2", "note": "x"}, {"id": "1", "note": None, "body": None})
+    assert (delete.action, delete.old["id"], delete.values) == ("D", "2", {})
+    assert transactions[1].changes == [Change("public.orders", "T")]
+
+
+def test_decode_pgoutput_skips_an_unfinished_transaction():
+    relation = _relation(7, "public", "orders", ["id"])
+    insert = b"I" + struct.pack("!i", 7) + b"N" + _tuple(["1"])
+    assert list(decode_pgoutput(_rows(relation, _begin(), insert))) == []
+
+
+def test_decode_wal2json():
+    messages = [
+        ("0/10", {"action": "B"}),
+        ("0/18", {"action": "I", "schema": "public", "table": "orders",
+                  "columns": [{"name": "id", "value": 1}, {"name": "paid", "value": True}, {"name": "tags", "value": ["a"]}]}),
+        ("0/20", {"action": "D", "schema": "public", "table": "orders", "identity": [{"name": "id", "value": 1}]}),
+        ("0/28", {"action": "C"}),
+    ]
+    transactions = list(decode_wal2json([(lsn, json.dumps(message)) for lsn, message in messages]))
+
+    assert [t.commit_lsn for t in transactions] == [parse_lsn("0/28")]
+    insert, delete = transactions[0].changes
+    assert insert.values == {"id": "1", "paid": "true", "tags": '["a"]'}
+    assert (delete.action, delete.old, delete.values) == ("D", {"id": "1"}, {})
+
+
+########################
+# Collapsing changes
+########################
+
+def test_insert_update_delete_collapses_to_a_delete():
+    state, truncated = collapse_changes([
+        Change("public.orders", "I", {"id": "1", "note": "a"}),
+        Change("public.orders", "U", {"id": "1", "note": "b"}),
+        Change("public.orders", "D", old={"id": "1"}),
+    ], ["id"])
+    assert state == {("1",): None}
+    assert not truncated
+
+
+def test_key_change_deletes_the_old_key():
+    state, _ = collapse_changes([
+        Change("public.orders", "I", {"id": "1", "note": "a"}),
+        Change("public.orders", "U", {"id": "2", "note": "b"}, old={"id": "1"}),
+    ], ["id"])
+    assert state == {("1",): None, ("2",): {"id": "2", "note": "b"}}
+
+
+def test_omitted_toast_columns_keep_the_batch_value():
+    state, _ = collapse_changes([
+        Change("public.orders", "I", {"id": "1", "note": "a", "body": "long text"}),
+        Change("public.orders", "U", {"id": "1", "note": "b"}),
+    ], ["id"])
+    assert state == {("1",): {"id": "1", "note": "b", "body": "long text"}}
+
+
+def test_truncate_drops_earlier_changes():
+    state, truncated = collapse_changes([
+        Change("public.orders", "I", {"id": "1"}),
+        Change("public.orders", "T"),
+        Change("public.orders", "I", {"id": "2"}),
+    ], ["id"])
+    assert state == {("2",): {"id": "2"}}
+    assert truncated
+
+
+########################
+# Follower
+########################
+
+def _follower(db_path: str) -> CdcFollower:
+    # No Postgres connection: peek and advance are replaced per test
+    follower = CdcFollower.__new__(CdcFollower)
+    follower.db_path = db_path
+    follower.tables = {"public.orders": ["id"]}
+    follower.slot_name = "duckdb_mirror"
+    follower.plugin = "wal2json"
+    follower.database = get_database(db_path)
+    with follower.database.writer() as cursor:
+        cursor.execute("CREATE TABLE orders (id INTEGER PRIMARY KEY, note VARCHAR, body VARCHAR)")
+        cursor.execute("INSERT INTO orders VALUES (1, 'old', 'kept'), (2, 'gone', NULL), (3, 'moved', NULL)")
+        cursor.execute(
+            f"CREATE TABLE {CHECKPOINT_TABLE} (slot_name VARCHAR PRIMARY KEY, lsn UBIGINT, applied_at TIMESTAMP, changes BIGINT)"
+        )
+    return follower
+
+
+def test_apply_writes_the_final_row_per_key(tmp_path):
+    db_path = str(tmp_path / "local.duckdb")
+    try:
+        follower = _follower(db_path)
+        with follower.database.writer() as cursor:
+            follower._apply(cursor, "public.orders", [
+                Change("public.orders", "U", {"id": "1", "note": "new"}),
+                Change("public.orders", "D", old={"id": "2"}),
+                Change("public.orders", "U", {"id": "4", "note": "moved"}, old={"id": "3"}),
+                Change("public.orders", "I", {"id": "5", "note": "a", "body": None}),
+                Change("public.orders", "U", {"id": "5", "note": "b"}),
+            ])
+        rows = follower.database.cursor().execute("SELECT * FROM orders ORDER BY id").fetchall()
+        assert rows == [(1, "new", "kept"), (4, "moved", None), (5, "b", None)]
+    finally:
+        close_database(db_path)
+
+
+def test_poll_catches_the_slot_up_after_a_crash_before_advancing(tmp_path):
+    db_path = str(tmp_path / "local.duckdb")
+    try:
+        follower = _follower(db_path)
+        batch = [
+            ("0/10", json.dumps({"action": "B"})),
+            ("0/18", json.dumps({"action": "I", "schema": "public", "table": "orders",
+                                 "columns": [{"name": "id", "value": 9}, {"name": "note", "value": "x"}]})),
+            ("0/20", json.dumps({"action": "C"})),
+        ]
+        advanced = []
+        follower._peek = lambda: iter(batch)
+        follower._advance = advanced.append
+
+        assert follower.poll()["transactions"] == 1
+        assert advanced == [parse_lsn("0/20")]
+
+        # The advance never reached Postgres: the same batch comes back, already applied
+        result = follower.poll()
+        assert (result["transactions"], result["changes"]) == (0, 0)
+        assert advanced == [parse_lsn("0/20")] * 2
+        assert follower.database.cursor().execute("SELECT count(*) FROM orders WHERE id = 9").fetchone()[0] == 1
+
+        # An empty slot isn't advanced
+        follower._peek = lambda: iter([])
+        follower.poll()
+        assert len(advanced) == 2
+    finally:
+        close_database(db_path)
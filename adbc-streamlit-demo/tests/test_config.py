@@ -0,0 +1,26 @@
+from urllib.parse import urlsplit
+
+from functions.config import PostgresConfig, libpq_query
+
+
+def test_statement_timeout_round_trips_through_libpq_parsing():
+    config = PostgresConfig(statement_timeout_ms=60000)
+    uri = config.db_kwargs("postgresql://user:pw@host:5432/db?sslmode=require&application_name=a+b")["uri"]
+    query = urlsplit(uri).query
+    assert "+" not in query.replace("a%2Bb", "")
+    assert libpq_query(query) == {
+        "sslmode": "require",
+        "application_name": "a+b",
+        "options": "-c statement_timeout=60000",
+    }
+
+
+def test_statement_timeout_appends_to_existing_options():
+    config = PostgresConfig(statement_timeout_ms=500)
+    uri = config.db_kwargs("postgresql://host/db?options=-c%20search_path%3Dapp")["uri"]
+    assert libpq_query(urlsplit(uri).query)["options"] == "-c search_path=app -c statement_timeout=500"
+
+
+def test_no_timeout_leaves_uri_unchanged():
+    uri = "postgresql://host/db?application_name=a+b"
+    assert PostgresConfig().db_kwargs(uri) == {"uri": uri}
@@ -0,0 +1,91 @@
+import pyarrow as pa
+import pytest
+
+from functions.duckdb_manager import SwapVerificationError, close_database, get_database, table_exists
+
+
+def _reader(ids) -> pa.RecordBatchReader:
+    table = pa.table({"id": pa.array(ids, pa.int64()), "value": pa.array([str(i) for i in ids])})
+    return pa.RecordBatchReader.from_batches(table.schema, table.to_batches())
+
+
+def test_append_and_merge_into_qualified_names(tmp_path):
+    db_path = str(tmp_path / "local.duckdb")
+    try:
+        database = get_database(db_path)
+        database.ingest("main.events", _reader(range(3)), "create")
+        database.ingest("main.events", _reader(range(3, 5)), "append")
+        assert database.ingest('"Main"."EVENTS"', _reader(range(4, 8)), "merge", ["id"]) == {
+            "inserted": 3, "updated": 1, "deleted": 0,
+        }
+        assert database.cursor().execute("SELECT count(*) FROM events").fetchone()[0] == 8
+    finally:
+        close_database(db_path)
+
+
+def _tables(database) -> list[tuple]:
+    return database.cursor().execute(
+        "SELECT schema_name, table_name FROM duckdb_tables() ORDER BY ALL"
+    ).fetchall()
+
+
+def test_swap_into_a_qualified_name(tmp_path):
+    db_path = str(tmp_path / "local.duckdb")
+    try:
+        database = get_database(db_path)
+        database.cursor().execute("CREATE SCHEMA staging")
+        database.ingest("main.events", _reader(range(3)), "create")
+        database.ingest("staging.events", _reader(range(2)), "create")
+
+        assert database.ingest("staging.events", _reader(range(5)), "swap") == {"verified_rows": 5}
+        assert database.cursor().execute("SELECT count(*) FROM staging.events").fetchone()[0] == 5
+        assert _tables(database) == [("main", "events"), ("staging", "events")]
+    finally:
+        close_database(db_path)
+
+
+def test_swap_into_a_quoted_name(tmp_path):
+    db_path = str(tmp_path / "local.duckdb")
+    try:
+        database = get_database(db_path)
+        database.ingest('"Order Events"', _reader(range(3)), "create")
+
+        assert database.ingest('"Main"."Order Events"', _reader(range(4)), "swap") == {"verified_rows": 4}
+        assert database.cursor().execute('SELECT count(*) FROM "Order Events"').fetchone()[0] == 4
+        assert _tables(database) == [("main", "Order Events")]
+    finally:
+        close_database(db_path)
+
+
+def test_failed_swap_drops_the_shadow(tmp_path):
+    db_path = str(tmp_path / "local.duckdb")
+    try:
+        database = get_database(db_path)
+        database.ingest("main.events", _reader(range(3)), "create")
+
+        with pytest.raises(SwapVerificationError):
+            database.ingest("main.events", _reader([]), "swap")
+
+        def fail(cursor):
+            raise RuntimeError("related write failed")
+
+        with pytest.raises(RuntimeError):
+            database.ingest("main.events", _reader(range(5)), "swap", before_write=fail)
+
+        assert database.cursor().execute("SELECT count(*) FROM events").fetchone()[0] == 3
+        assert _tables(database) == [("main", "events")]
+    finally:
+        close_database(db_path)
+
+
+def test_table_exists_resolves_names_like_duckdb(tmp_path):
+    db_path = str(tmp_path / "local.duckdb")
+    try:
+        cursor = get_database(db_path).cursor()
+        cursor.execute('CREATE SCHEMA staging; CREATE TABLE staging."Order Items" (id INTEGER)')
+        assert table_exists(cursor, 'staging."Order Items"')
+        assert table_exists(cursor, 'local.STAGING."order items"')
+        assert not table_exists(cursor, '"Order Items"')
+        assert not table_exists(cursor, 'main."Order Items"')
+    finally:
+        close_database(db_path)
@@ -0,0 +1,109 @@
+from types import SimpleNamespace
+
+import duckdb
+import pytest
+
+from functions import export
+from functions.duckdb_manager import close_database, get_database
+from functions.export import _rowid_ranges
+
+
+def _covered_ids(con, ranges) -> list[int]:
+    ids = []
+    for low, high in ranges:
+        ids += [r[0] for r in con.execute(f"SELECT id FROM t WHERE rowid BETWEEN {low} AND {high}").fetchall()]
+    return sorted(ids)
+
+
+def test_rowid_ranges_of_an_empty_table():
+    con = duckdb.connect()
+    con.execute("CREATE TABLE t (id INTEGER)")
+    assert _rowid_ranges(con, "t", 4) == [(0, -1)]
+
+
+def test_rowid_ranges_with_fewer_rows_than_partitions():
+    con = duckdb.connect()
+    con.execute("CREATE TABLE t AS SELECT range::INTEGER AS id FROM range(3)")
+    ranges = _rowid_ranges(con, "t", 8)
+    assert ranges == [(0, 0), (1, 1), (2, 2)]
+    assert _covered_ids(con, ranges) == [0, 1, 2]
+
+
+def test_rowid_ranges_with_gaps_cover_every_row_once():
+    con = duckdb.connect()
+    con.execute("CREATE TABLE t AS SELECT range::INTEGER AS id FROM range(100)")
+    con.execute("DELETE FROM t WHERE id < 10 OR id BETWEEN 40 AND 69")
+    ranges = _rowid_ranges(con, "t", 4)
+    assert len(ranges) == 4
+    assert all(high >= low for low, high in ranges)
+    assert _covered_ids(con, ranges) == list(range(10, 40)) + list(range(70, 100))
+
+
+########################
+# Failed swap
+########################
+
+class _Postgres:
+    """Just enough of an ADBC Postgres connection to run duckdb_to_postgres; the swap fails."""
+
+    def __init__(self, log: list):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return self
+
+    def execute(self, sql, parameters=None):
+        self.log.append(sql)
+        if sql.startswith(("INSERT INTO", "ALTER TABLE")):
+            raise RuntimeError("swap failed")
+
+    def fetchone(self):
+        return (self.exists,)
+
+    def adbc_ingest(self, name, data, mode, **options):
+        self.log.append(f"ingest {mode} {name}")
+        if hasattr(data, "read_all"):
+            data.read_all()
+
+    def commit(self):
+        self.log.append("COMMIT")
+
+    def rollback(self):
+        self.log.append("ROLLBACK")
+
+
+# A single-writer append ingests straight into the target, with no staging table
+@pytest.mark.parametrize("mode, exists, partitions", [
+    ("create", False, 1),
+    ("replace", True, 1),
+    ("create", False, 3),
+    ("replace", True, 3),
+    ("append", True, 3),
+])
+def test_a_failed_swap_drops_the_staging_table(tmp_path, monkeypatch, mode, exists, partitions):
+    db_path = str(tmp_path / "local.duckdb")
+    log = []
+
+    def connect(driver, db_kwargs):
+        conn = _Postgres(log)
+        conn.exists = exists
+        return conn
+
+    config = SimpleNamespace(postgres_db_kwargs=lambda secret: {"uri": "postgresql://test"})
+    monkeypatch.setattr(export, "get_config", lambda: config)
+    monkeypatch.setattr(export, "dbapi", SimpleNamespace(connect=connect))
+    try:
+        with get_database(db_path).writer() as cursor:
+            cursor.execute("CREATE TABLE orders AS SELECT range AS id FROM range(10)")
+        with pytest.raises(RuntimeError, match="swap failed"):
+            export.duckdb_to_postgres(db_path, "orders", "public.orders", mode=mode, partitions=partitions)
+    finally:
+        close_database(db_path)
+
+    assert log[-3:] == ["ROLLBACK", "DROP TABLE IF EXISTS public.orders__staging", "COMMIT"]
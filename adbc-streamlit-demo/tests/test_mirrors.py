@@ -0,0 +1,56 @@
+import time
+
+import pyarrow as pa
+
+from functions.duckdb_manager import close_database
+from functions.ingestion import _ingest_and_count, _record_copy
+from functions.routing import mirror_info
+
+
+def _reader(rows: int) -> pa.RecordBatchReader:
+    table = pa.table({"id": pa.array(range(rows), pa.int64())})
+    return pa.RecordBatchReader.from_batches(table.schema, table.to_batches())
+
+
+def _copy(db_path, mode, rows=10, local_table="streamed_data", started_at=None, **options):
+    started_at = time.time() if started_at is None else started_at
+    total = _ingest_and_count(db_path, local_table, _reader(rows), mode, **options)
+    _record_copy(db_path, local_table, "motherduck", "orders", total, mode, options.get("delete_missing", False), started_at)
+
+
+def test_append_and_merge_drop_the_mirror_record(tmp_path):
+    db_path = str(tmp_path / "local.duckdb")
+    try:
+        _copy(db_path, "replace")
+        assert mirror_info(db_path, "motherduck", "orders")["rows"] == 10
+
+        _copy(db_path, "append")
+        assert mirror_info(db_path, "motherduck", "orders") is None
+
+        _copy(db_path, "swap")
+        assert mirror_info(db_path, "motherduck", "orders")["rows"] == 10
+
+        _copy(db_path, "merge", rows=20, primary_key=["id"])
+        assert mirror_info(db_path, "motherduck", "orders") is None
+    finally:
+        close_database(db_path)
+
+
+def test_mirror_age_counts_from_the_start_of_the_copy(tmp_path):
+    db_path = str(tmp_path / "local.duckdb")
+    try:
+        # A copy that started reading the source ten minutes ago
+        _copy(db_path, "replace", started_at=time.time() - 600)
+        assert 600 <= mirror_info(db_path, "motherduck", "orders")["age_seconds"] < 660
+    finally:
+        close_database(db_path)
+
+
+def test_qualified_local_tables_are_found(tmp_path):
+    db_path = str(tmp_path / "local.duckdb")
+    try:
+        _copy(db_path, "replace", local_table="main.streamed_data")
+        mirror = mirror_info(db_path, "motherduck", "orders")
+        assert (mirror["local_table"], mirror["rows"]) == ("main.streamed_data", 10)
+    finally:
+        close_database(db_path)
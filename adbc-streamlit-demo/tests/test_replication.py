@@ -0,0 +1,40 @@
+import pytest
+
+from functions.replication import discover_tables
+
+
+@pytest.fixture
+def conn(tmp_path):
+    dbapi = pytest.importorskip("adbc_driver_manager.dbapi")
+    try:
+        conn = dbapi.connect(driver="duckdb", db_kwargs={"path": str(tmp_path / "source.duckdb")}, autocommit=True)
+    except Exception as e:
+        pytest.skip(f"ADBC DuckDB driver not available: {e}")
+    with conn.cursor() as cursor:
+        # Like MotherDuck, which attaches every database of the account
+        cursor.execute(f"ATTACH '{tmp_path / 'other.duckdb'}' AS other")
+        for sql in [
+            "CREATE TABLE other.main.orders (id INTEGER)",
+            "CREATE TABLE main.orders (id INTEGER)",
+            "INSERT INTO main.orders VALUES (1), (2), (3)",
+            "CREATE TABLE main.items (id INTEGER)",
+            "CREATE SCHEMA sales_2024",
+            "CREATE SCHEMA salesX2024",
+            "CREATE TABLE salesX2024.returns (id INTEGER)",
+        ]:
+            cursor.execute(sql)
+    yield conn
+    conn.close()
+
+
+def test_discover_tables_lists_only_the_current_database(conn):
+    specs = discover_tables(conn, "motherduck", "main")
+    assert [(s.catalog, s.name, s.size) for s in specs] == [("source", "orders", 3), ("source", "items", 0)]
+    assert specs[0].qualified_name == '"source"."main"."orders"'
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {specs[0].qualified_name}")
+        assert cursor.fetchone()[0] == 3
+
+
+def test_discover_tables_matches_the_schema_exactly(conn):
+    assert discover_tables(conn, "motherduck", "sales_2024") == []
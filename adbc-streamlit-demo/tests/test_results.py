@@ -0,0 +1,41 @@
+import duckdb
+import pyarrow as pa
+
+import functions.ingestion as ingestion
+from functions.duckdb_manager import close_database
+from functions.results import buffer_addresses
+from functions.session_data import SessionDataStore
+
+
+def test_select_result_shares_the_driver_buffers(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "local.duckdb")
+    with duckdb.connect(db_path) as con:
+        con.execute("CREATE TABLE t AS SELECT i AS id, i * 0.5 AS x, 'row ' || i AS name FROM range(50000) r(i)")
+
+    # Keep the batches exactly as the driver hands them out
+    fetched = []
+    timed_reader = ingestion.timed_reader
+
+    def recording_reader(reader):
+        def batches():
+            for batch in reader:
+                fetched.append(batch)
+                yield batch
+
+        return timed_reader(pa.RecordBatchReader.from_batches(reader.schema, batches()))
+
+    monkeypatch.setattr(ingestion, "timed_reader", recording_reader)
+    try:
+        result = ingestion.duckdb_select_data("t", 50000, db_path=db_path)
+    finally:
+        close_database(db_path)
+
+    expected = buffer_addresses(pa.Table.from_batches(fetched))
+    assert result.num_rows == 50000
+    assert buffer_addresses(result.to_arrow()) == expected
+
+    store = SessionDataStore("zero-copy", budget_bytes=result.nbytes * 2, spill=False)
+    store.put("result", result)
+    rendered = store.get("result").to_arrow()
+    assert buffer_addresses(rendered) == expected
+    assert rendered.schema == result.schema
@@ -0,0 +1,16 @@
+import pytest
+
+from functions.scheduler import RefreshJob, RefreshScheduler
+
+
+def test_run_now_reschedules_a_known_job(tmp_path):
+    scheduler = RefreshScheduler(str(tmp_path / "local.duckdb"), [RefreshJob("orders", "postgres", "orders")])
+    scheduler._jobs["orders"].next_run = None
+    scheduler.run_now("orders")
+    assert scheduler._jobs["orders"].next_run == 0.0
+
+
+def test_run_now_rejects_an_unknown_job(tmp_path):
+    scheduler = RefreshScheduler(str(tmp_path / "local.duckdb"), [RefreshJob("orders", "postgres", "orders")])
+    with pytest.raises(ValueError, match="Unknown job 'events'"):
+        scheduler.run_now("events")
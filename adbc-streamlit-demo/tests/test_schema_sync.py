@@ -0,0 +1,32 @@
+import pyarrow as pa
+import pytest
+
+from functions.duckdb_manager import close_database, get_database
+from functions.ingestion import _ingest_and_count
+from functions.validation import StreamValidator, ValidationError, ValidationRules
+
+
+def _reader(table: pa.Table) -> pa.RecordBatchReader:
+    return pa.RecordBatchReader.from_batches(table.schema, table.to_batches())
+
+
+def _columns(db_path) -> list[tuple]:
+    return [row[:2] for row in get_database(db_path).cursor().execute("DESCRIBE streamed_data").fetchall()]
+
+
+def test_failed_append_leaves_the_schema_unchanged(tmp_path):
+    db_path = str(tmp_path / "local.duckdb")
+    try:
+        _ingest_and_count(db_path, "streamed_data", _reader(pa.table({"id": pa.array([1, 2], pa.int32())})), "create")
+        before = _columns(db_path)
+
+        wider = pa.table({"id": pa.array([3, -4], pa.int64()), "note": ["a", "b"]})
+        validator = StreamValidator(ValidationRules(ranges={"id": (0, None)}))
+        with pytest.raises(ValidationError):
+            _ingest_and_count(db_path, "streamed_data", _reader(wider), "append", validator=validator)
+        assert _columns(db_path) == before
+
+        assert _ingest_and_count(db_path, "streamed_data", _reader(wider), "append") == 4
+        assert _columns(db_path) == [("id", "BIGINT"), ("note", "VARCHAR")]
+    finally:
+        close_database(db_path)
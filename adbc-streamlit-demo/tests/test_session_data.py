@@ -0,0 +1,33 @@
+import pyarrow as pa
+
+from functions.session_data import SessionDataStore
+
+
+def _table(rows: int) -> pa.Table:
+    return pa.table({"id": pa.array(range(rows), pa.int64())})
+
+
+def _store(tmp_path, name, compression):
+    # Room for one 80 KB table per session
+    return SessionDataStore(name, budget_bytes=100_000, spill=True, spill_dir=str(tmp_path), compression=compression)
+
+
+def test_uncompressed_spill_is_mapped_without_counting_memory(tmp_path):
+    store = _store(tmp_path, "mapped", "none")
+    store.put("a", _table(10_000))
+    store.put("b", _table(10_000))
+    assert store.usage()["spilled"] == 1
+    assert store.get("a").num_rows == 10_000
+    assert store.usage()["spilled"] == 1
+    assert store.resident_bytes() == _table(10_000).nbytes
+
+
+def test_compressed_spill_is_resident_and_counted_once_read(tmp_path):
+    store = _store(tmp_path, "compressed", "lz4")
+    store.put("a", _table(10_000))
+    store.put("b", _table(10_000))
+    assert store.get("a").num_rows == 10_000
+    # "a" is held in memory again and "b" made room for it
+    assert store._entries["a"].resident
+    assert not store._entries["b"].resident
+    assert store.resident_bytes() <= store.budget_bytes
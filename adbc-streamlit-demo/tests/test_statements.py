@@ -0,0 +1,32 @@
+import pytest
+
+from functions.statements import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool("duckdb", {"path": str(tmp_path / "pool.duckdb")}, size=1)
+    try:
+        with pool.connection() as pooled:
+            pooled.execute("SELECT 1").fetchall()
+    except Exception as e:
+        pytest.skip(f"ADBC DuckDB driver not available: {e}")
+    yield pool
+    pool.close()
+
+
+@pytest.mark.parametrize("error", [KeyboardInterrupt, ValueError])
+def test_connection_is_discarded_after_any_exception(pool, error):
+    with pytest.raises(error):
+        with pool.connection() as pooled:
+            pooled.execute("SELECT * FROM range(100000)").fetch_record_batch()
+            raise error()
+    assert pool.stats()["open"] == 0 and pool.stats()["idle"] == 0
+
+
+def test_connection_is_reused_after_a_clean_exit(pool):
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    assert pool.stats()["open"] == 1
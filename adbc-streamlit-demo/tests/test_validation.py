@@ -0,0 +1,97 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pytest
+
+from functions.validation import StreamValidator, UniqueSketch, ValidationError, ValidationRules, _bounds, hash_values
+
+
+@pytest.mark.parametrize("column", [
+    pa.array([1.0, None, float("nan"), -2.0]),
+    pa.chunked_array([pa.array([3.0]), pa.array([None], pa.float64()), pa.array([-1.5, 9.0])]),
+    pa.array([0.5, 2.5], pa.float32()),
+    pa.array([4, None, -7]),
+])
+def test_bounds_match_min_max(column):
+    expected = pc.min_max(column)
+    assert _bounds(column) == (expected["min"].as_py(), expected["max"].as_py())
+
+
+@pytest.mark.parametrize("column", [
+    pa.chunked_array([pa.array([1.0, 2.0]), pa.array([float("nan"), -4.0])]),
+    pa.chunked_array([pa.array([None], pa.float64()), pa.array([float("nan"), 3.0])]),
+])
+def test_bounds_skip_nan(column):
+    expected = pc.min_max(column)
+    assert _bounds(column) == (expected["min"].as_py(), expected["max"].as_py())
+
+
+def test_bounds_of_an_all_null_float_column():
+    assert _bounds(pa.array([None, None], pa.float64())) == (None, None)
+
+
+def test_out_of_range_floats_fail_the_stream():
+    table = pa.table({"amount": pa.array([1.0, -3.0, 2.0, None])})
+    validator = StreamValidator(ValidationRules(ranges={"amount": (0.0, None)}))
+    reader = validator.wrap(pa.RecordBatchReader.from_batches(table.schema, table.to_batches()))
+    with pytest.raises(ValidationError):
+        reader.read_all()
+    assert validator.report.columns["amount"] == {"min": -3.0, "max": 2.0, "out_of_range": 1}
+
+
+def _counted_stream(rows: int, expected_rows: int, consistent: bool) -> StreamValidator:
+    table = pa.table({"id": pa.array(range(rows), pa.int64())})
+    validator = StreamValidator(ValidationRules(reconcile_count=True))
+    reader = validator.wrap(pa.RecordBatchReader.from_batches(table.schema, table.to_batches()))
+    validator.expected_rows, validator.count_consistent = expected_rows, consistent
+    try:
+        reader.read_all()
+    except ValidationError:
+        pass
+    return validator
+
+
+def test_count_mismatch_fails_only_within_one_snapshot():
+    assert not _counted_stream(10, 12, consistent=True).report.passed
+    separate = _counted_stream(10, 12, consistent=False).report
+    assert separate.passed and len(separate.warnings) == 1
+
+
+def test_duckdb_snapshot_counts_and_reads_the_same_rows():
+    import duckdb
+
+    from functions.ingestion import _count_source, _duckdb_snapshot
+
+    con = duckdb.connect()
+    con.execute("CREATE TABLE t AS SELECT range AS id FROM range(10)")
+    source, other = con.cursor(), con.cursor()
+    validator = StreamValidator(ValidationRules(reconcile_count=True))
+    with _duckdb_snapshot(source, validator):
+        _count_source(source, "t", validator, consistent=True)
+        other.execute("INSERT INTO t SELECT range FROM range(10, 15)")
+        streamed = source.execute("SELECT * FROM t").fetch_arrow_table().num_rows
+    assert streamed == validator.expected_rows == 10
+    assert validator.count_consistent
+
+
+def test_equal_values_hash_equally_whatever_the_layout():
+    strings = pa.array([f"value_{i}" for i in range(5000)] + [None, "", "ünïcode"])
+    chunked = pa.chunked_array([strings.slice(0, 3), strings.slice(3)])
+    assert np.array_equal(hash_values(strings.slice(2)), hash_values(pa.array(strings.slice(2).to_pylist())))
+    assert np.array_equal(hash_values(chunked), hash_values(strings))
+    ints = pa.array(range(100), pa.int64())
+    assert np.array_equal(hash_values(pa.chunked_array([ints.slice(0, 7), ints.slice(7)])), hash_values(ints))
+    # Hashing works on a copy; the Arrow data is left as it was
+    assert ints.to_pylist() == list(range(100))
+
+
+def test_sketch_keeps_the_smallest_distinct_hashes():
+    rng = np.random.default_rng(0)
+    sketch, seen = UniqueSketch(64), []
+    for size in (10, 1000, 300, 5000):
+        hashes = rng.integers(0, 3000, size).astype(np.uint64)
+        seen.append(hashes)
+        sketch.add(hashes)
+    distinct = np.unique(np.concatenate(seen))
+    assert np.array_equal(sketch.hashes, distinct[:64])
+    assert sketch.values == 6310
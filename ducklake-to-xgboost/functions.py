@@ -2,12 +2,122 @@ import duckdb
 from adbc_driver_manager import dbapi
 import pyarrow as pa
 import random
+import json
 import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Raw penguins data and the categorical columns that get encoded as features
+PENGUINS_CSV = "read_csv('https://blobs.duckdb.org/data/penguins.csv', nullstr = 'NA')"
+PENGUINS_LABEL = ('species', 'species_numeric')
+PENGUINS_CATEGORICALS = ['island', 'sex', 'year']
+PENGUINS_NUMERICS = ['bill_length_mm', 'bill_depth_mm', 'flipper_length_mm', 'body_mass_g']
+CATEGORY_MAPPING_PATH = 'penguins_category_mapping.json'
+ENCODINGS = ('onehot', 'ordinal', 'dictionary')
 
 def is_ducklake_initialized(dir_path):
     return os.path.exists(dir_path) and os.path.isdir(dir_path) and any(os.scandir(dir_path))
 
-def create_penguins_ducklake():
+def _quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _sql_literal(value):
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return str(value)
+
+def discover_categories(con, relation, columns, label=None):
+    """
+    Discover the distinct values of every categorical column in a single scan.
+
+    Returns a mapping dict that can be persisted with save_category_mapping()
+    and handed to build_encoded_projection() at training and inference time.
+    """
+    # One aggregate per column, all evaluated in the same pass over the relation
+    targets = list(columns) + ([label[0]] if label else [])
+    aggregates = ", ".join(
+        f"list(DISTINCT {_quote_identifier(c)} ORDER BY {_quote_identifier(c)}) FILTER (WHERE {_quote_identifier(c)} IS NOT NULL)"
+        for c in targets
+    )
+    row = con.execute(f"SELECT {aggregates} FROM {relation};").fetchone()
+    categories = {c: list(values or []) for c, values in zip(targets, row)}
+
+    mapping = {"columns": {c: categories[c] for c in columns}}
+    if label:
+        mapping["label"] = {"column": label[0], "alias": label[1], "categories": categories[label[0]]}
+    return mapping
+
+def build_encoded_projection(mapping, numerics=(), encoding='onehot'):
+    """
+    Generate the SELECT list that encodes a relation using a category mapping.
+
+    encoding:
+        'onehot'     - one 0/1 column per category (<column>_<category>)
+        'ordinal'    - one integer column holding the category's index
+        'dictionary' - ordinal codes in storage, turned into Arrow dictionary
+                       arrays for XGBoost's native categorical support
+    Values not present in the mapping encode as all zeros / NULL.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding '{encoding}', expected one of {ENCODINGS}")
+
+    expressions = []
+    label = mapping.get("label")
+    if label:
+        # The label is always ordinal so predictions map back to class names
+        values = ", ".join(_sql_literal(v) for v in label["categories"])
+        expressions.append(
+            f"list_position([{values}], {_quote_identifier(label['column'])}) - 1 AS {_quote_identifier(label['alias'])}"
+        )
+
+    for column, categories in mapping["columns"].items():
+        source = _quote_identifier(column)
+        if encoding == 'onehot':
+            for value in categories:
+                alias = _quote_identifier(f"{column}_{value}")
+                expressions.append(f"CASE {source} WHEN {_sql_literal(value)} THEN 1 ELSE 0 END AS {alias}")
+        else:
+            # Dictionary columns are stored as their ordinal codes and become
+            # Arrow dictionary arrays on read (see apply_dictionary_encoding)
+            values = ", ".join(_sql_literal(v) for v in categories)
+            expressions.append(f"list_position([{values}], {source}) - 1 AS {source}")
+
+    for column in numerics:
+        expressions.append(f"CAST({_quote_identifier(column)} AS FLOAT) AS {_quote_identifier(column)}")
+    return expressions
+
+def apply_dictionary_encoding(table, mapping):
+    """
+    Rebuild dictionary-encoded columns from their stored ordinal codes.
+
+    Only touches tables written with encoding='dictionary'. The codes are cast
+    to int32 and wrapped with the category dictionary, so each column's
+    indices are copied once into new arrays.
+    """
+    if mapping.get("encoding") != 'dictionary':
+        return table
+    for column, categories in mapping["columns"].items():
+        if column not in table.column_names:
+            continue
+        index = table.column_names.index(column)
+        dictionary = pa.array([str(v) for v in categories])
+        chunks = [
+            pa.DictionaryArray.from_arrays(chunk.cast(pa.int32()), dictionary)
+            for chunk in table[column].chunks
+        ]
+        table = table.set_column(index, column, pa.chunked_array(chunks, pa.dictionary(pa.int32(), pa.string())))
+    return table
+
+def save_category_mapping(mapping, encoding, path=CATEGORY_MAPPING_PATH):
+    with open(path, 'w') as f:
+        json.dump({**mapping, "encoding": encoding}, f, indent=2)
+
+def load_category_mapping(path=CATEGORY_MAPPING_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+def create_penguins_ducklake(encoding='onehot', mapping_path=CATEGORY_MAPPING_PATH):
     # Connect to DuckDB
     con = duckdb.connect()
     table_name = 'penguins_processed'
@@ -26,24 +136,20 @@ def create_penguins_ducklake():
 
         # Drop table if it exists
         con.execute("DROP TABLE IF EXISTS penguins_processed;")
-        
-        # Create table with penguins data from CSV
+
+        # Stage the raw CSV once so category discovery and encoding don't re-read it
+        con.execute(f"CREATE TEMP TABLE penguins_raw AS SELECT * FROM {PENGUINS_CSV} WHERE sex IS NOT NULL;")
+
+        # Discover categories in one pass and persist them for inference
+        mapping = discover_categories(con, 'penguins_raw', PENGUINS_CATEGORICALS, label=PENGUINS_LABEL)
+        save_category_mapping(mapping, encoding, mapping_path)
+        print(f"✅ Category mapping ({encoding}) saved to '{mapping_path}'")
+
+        # Create table with the generated encoding projection
+        projection = ",\n            ".join(build_encoded_projection(mapping, PENGUINS_NUMERICS, encoding))
         con.execute(f"""CREATE TABLE {table_name} AS SELECT 
-            CASE species WHEN 'Adelie' THEN 0 WHEN 'Chinstrap' THEN 1 WHEN 'Gentoo' THEN 2 ELSE NULL END AS species_numeric, 
-            CASE island WHEN 'Torgersen' THEN 1 ELSE 0 END AS island_Torgersen, 
-            CASE island WHEN 'Biscoe' THEN 1 ELSE 0 END AS island_Biscoe, 
-            CASE island WHEN 'Dream' THEN 1 ELSE 0 END AS island_Dream, 
-            CAST(bill_length_mm AS FLOAT) AS bill_length_mm, 
-            CAST(bill_depth_mm AS FLOAT) AS bill_depth_mm, 
-            CAST(flipper_length_mm AS FLOAT) AS flipper_length_mm, 
-            CAST(body_mass_g AS FLOAT) AS body_mass_g, 
-            CASE sex WHEN 'Male' THEN 1 ELSE 0 END AS sex_Male, 
-            CASE sex WHEN 'Female' THEN 1 ELSE 0 END AS sex_Female, 
-            CASE year WHEN 2007 THEN 1 ELSE 0 END AS year_2007, 
-            CASE year WHEN 2008 THEN 1 ELSE 0 END AS year_2008, 
-            CASE year WHEN 2009 THEN 1 ELSE 0 END AS year_2009 
-        FROM read_csv('https://blobs.duckdb.org/data/penguins.csv', nullstr = 'NA') 
-        WHERE sex IS NOT NULL;""")
+            {projection}
+        FROM penguins_raw;""")
 
         # Test if table was created above
         result = con.execute(f"SELECT COUNT(*) FROM {table_name};").fetchone()
@@ -60,7 +166,7 @@ def create_penguins_ducklake():
         con.close()
         print("\nConnection closed.")
 
-def read_penguins_ducklake():
+def read_penguins_ducklake(mapping_path=CATEGORY_MAPPING_PATH):
     with dbapi.connect(
       driver="duckdb",
       db_kwargs={
@@ -72,6 +178,9 @@ def read_penguins_ducklake():
       # Now run your actual query
       cursor.execute("FROM penguins_processed;")
       table = cursor.fetch_arrow_table()
+      # Restore dictionary columns if the table was encoded that way
+      if os.path.exists(mapping_path):
+          table = apply_dictionary_encoding(table, load_category_mapping(mapping_path))
       print("\nQuery results:")
       print(table)
       return table
@@ -101,4 +210,75 @@ def get_train_test_split(data, seed=42, split_ratio=0.8):
     arrow_test = arrow_shuffled.slice(split_idx)
     return arrow_train, arrow_test
 
+def _predict_batch(booster, batch, mapping):
+    # Score one record batch; the booster's feature order decides the columns
+    features = apply_dictionary_encoding(pa.Table.from_batches([batch]), mapping).select(booster.feature_names)
+    predictions = booster.inplace_predict(features)
+    prediction = pa.array(predictions, pa.float32()).cast(pa.int32())
+    columns = {name: batch.column(name) for name in batch.schema.names}
+    columns['prediction'] = prediction
+    label = mapping.get("label")
+    if label:
+        columns[f"predicted_{label['column']}"] = pa.array(label["categories"]).take(prediction)
+    return pa.RecordBatch.from_pydict(columns)
+
+def score_ducklake_table(
+    model_path,
+    source_table='penguins_processed',
+    target_table='penguin_predictions',
+    workers=1,
+    mapping_path=CATEGORY_MAPPING_PATH,
+):
+    """
+    Batch-score a DuckLake table and append the predictions to another table.
+
+    The model is loaded once, rows are streamed with fetch_record_batch(), each
+    batch is scored with inplace_predict (optionally on a thread pool of
+    `workers` threads) and the scored batches are streamed back with
+    adbc_ingest in append mode. Returns a dict with rows, seconds and rows/s;
+    raises ValueError if `workers` is not a positive integer.
+    """
+    if not isinstance(workers, int) or workers < 1:
+        raise ValueError(f"workers must be a positive integer, got {workers!r}")
+
+    from xgboost import Booster
+
+    booster = Booster(model_file=model_path)
+    mapping = load_category_mapping(mapping_path)
+    total_rows = 0
+    start = time.perf_counter()
+
+    with dbapi.connect(
+        driver="duckdb",
+        db_kwargs={
+            "path": "ducklake:my_ducklake.ducklake"
+        }
+    ) as read_con, read_con.adbc_clone() as write_con, read_con.cursor() as read_cursor, write_con.cursor() as write_cursor:
+        # Both connections share one DuckDB instance, so reads and writes can interleave
+        read_cursor.execute("USE my_ducklake;")
+        write_cursor.execute("USE my_ducklake;")
+
+        read_cursor.execute(f"FROM {source_table};")
+        reader = read_cursor.fetch_record_batch()
+
+        def write(scored):
+            nonlocal total_rows
+            write_cursor.adbc_ingest(target_table, scored, mode="create_append", catalog_name="my_ducklake")
+            total_rows += scored.num_rows
+
+        # Keep a bounded window of in-flight batches and write them back in order
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for batch in reader:
+                pending.append(pool.submit(_predict_batch, booster, batch, mapping))
+                if len(pending) >= workers * 2:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+
+        write_con.commit()
 
+    seconds = time.perf_counter() - start
+    rows_per_second = total_rows / seconds if seconds > 0 else 0.0
+    print(f"✅ Scored {total_rows} rows into '{target_table}' in {seconds:.2f}s ({rows_per_second:,.0f} rows/s)")
+    return {"rows": total_rows, "seconds": seconds, "rows_per_second": rows_per_second}
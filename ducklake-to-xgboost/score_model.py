@@ -0,0 +1,24 @@
+print("📦 Loading dependencies...", flush=True)
+from functions import *
+import argparse
+
+parser = argparse.ArgumentParser(description="Batch-score a DuckLake table with the trained penguin model.")
+parser.add_argument("--model", default="penguin_species_model.json", help="Path to the saved XGBoost model")
+parser.add_argument("--source-table", default="penguins_processed", help="DuckLake table to score")
+parser.add_argument("--target-table", default="penguin_predictions", help="DuckLake table the predictions are appended to")
+parser.add_argument("--workers", type=int, default=1, help="Number of threads scoring batches in parallel")
+args = parser.parse_args()
+
+print("🚀 Starting batch scoring...", flush=True)
+if not os.path.exists(args.model):
+    raise SystemExit(f"Model '{args.model}' not found. Run train_model.py first.")
+
+stats = score_ducklake_table(
+    args.model,
+    source_table=args.source_table,
+    target_table=args.target_table,
+    workers=args.workers,
+)
+print(f"\nRows scored: {stats['rows']}")
+print(f"Throughput: {stats['rows_per_second']:,.0f} rows/s")
+print("✅ Script completed successfully!", flush=True)
@@ -1,16 +1,25 @@
 print("📦 Loading dependencies...", flush=True)
 from functions import *
-from xgboost import DMatrix, train
 import pyarrow.compute as pc
 
 print("🚀 Starting model training script...", flush=True)
 ducklake_files_dir = "my_ducklake.ducklake.files"
 
+# Feature encoding for categorical columns: 'onehot', 'ordinal' or 'dictionary';
+# unset keeps the encoding of an existing table
+encoding = os.environ.get("PENGUINS_ENCODING")
+if encoding is not None and encoding not in ENCODINGS:
+    raise ValueError(f"Unknown PENGUINS_ENCODING '{encoding}', expected one of {ENCODINGS}")
+
 # Create ducklake table only if not already initialized
 print("🔍 Checking DuckLake initialization...", flush=True)
-if not is_ducklake_initialized(ducklake_files_dir):
-    print(f"'{ducklake_files_dir}' folder not found or empty. Creating DuckLake table...", flush=True)
-    create_penguins_ducklake()
+if not is_ducklake_initialized(ducklake_files_dir) or not os.path.exists(CATEGORY_MAPPING_PATH):
+    print(f"'{ducklake_files_dir}' folder or '{CATEGORY_MAPPING_PATH}' not found. Creating DuckLake table...", flush=True)
+    create_penguins_ducklake(encoding=encoding or 'onehot')
+elif encoding is not None and load_category_mapping()["encoding"] != encoding:
+    # The table is stored in the saved mapping's encoding; rebuild it in the requested one
+    print(f"'{CATEGORY_MAPPING_PATH}' uses a different encoding. Rebuilding DuckLake table with '{encoding}'...", flush=True)
+    create_penguins_ducklake(encoding=encoding)
 else:
     print(f"'{ducklake_files_dir}' already exists and is not empty. Skipping DuckLake initialization.", flush=True)
 
@@ -27,8 +36,15 @@ arrow_train, arrow_test = get_train_test_split(arrow)
 
 # Create DMatrix directly from arrow tables with target column
 print("⚙️  Converting to XGBoost DMatrix format...", flush=True)
-dtrain = DMatrix(arrow_train.drop(['species_numeric']), label=arrow_train['species_numeric'])
-dtest = DMatrix(arrow_test.drop(['species_numeric']), label=arrow_test['species_numeric'])
+# xgboost is slow to import, so load it only once the training data is ready
+from xgboost import DMatrix, train
+mapping = load_category_mapping()
+if encoding is not None and mapping["encoding"] != encoding:
+    # create_penguins_ducklake reports errors instead of raising; don't train on the old encoding
+    raise RuntimeError(f"DuckLake table is encoded as '{mapping['encoding']}', not the requested '{encoding}'")
+enable_categorical = mapping["encoding"] == 'dictionary'
+dtrain = DMatrix(arrow_train.drop(['species_numeric']), label=arrow_train['species_numeric'], enable_categorical=enable_categorical)
+dtest = DMatrix(arrow_test.drop(['species_numeric']), label=arrow_test['species_numeric'], enable_categorical=enable_categorical)
 
 print(f"Train dataset shape: {arrow_train.num_rows} rows")
 print(f"Test dataset shape: {arrow_test.num_rows} rows")
@@ -39,7 +55,7 @@ print(f"Target distribution in test set:\n{pc.value_counts(arrow_test['species_n
 # Define XGBoost parameters
 params = {
     'objective': 'multi:softmax',  # for multiclass classification
-    'num_class': 3,  # species: Adelie, Chinstrap, Gentoo
+    'num_class': len(mapping["label"]["categories"]),  # species: Adelie, Chinstrap, Gentoo
     'max_depth': 6,
     'eta': 0.1,  # learning rate
     'subsample': 0.8,